@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+from catalog.lazy import load_movies
+from recommendations.filter_index import build_filter_index, filter_mask, get_filter_index
+from recommendations.similarity_engine import score_movies
+from .harness import DEFAULT_DATA_DIR, _milliseconds
+from .synthetic import catalog_directory
+
+# (star rating, fame level, language, max runtime, years, genres) measured for the filter index change
+FILTERS = (3, "Obscure", "eng", 150, (1980, 2015), ["Drama"])
+
+
+def chained_filter(df, star_rating, fame_level, language_filter, runtime_max, release_year_range, genre_filters):
+    """Sorted positions passing the filters, applied one pandas selection after another as before the filter index."""
+    recommendations = df.assign(position=np.arange(len(df)))
+    recommendations['star_rating'] = recommendations['vote_average'].rank(pct=True) * 5
+    recommendations = recommendations[recommendations['star_rating'] >= star_rating]
+    limits = {"Very Obscure": 1499, "Obscure": 3000, "Moderate": 7000, "Famous": 9000}
+    if fame_level in limits:
+        recommendations = recommendations[recommendations['vote_count'] <= limits[fame_level]]
+    recommendations = recommendations[recommendations['spoken_languages'].str.contains(language_filter, case=False, na=False)]
+    recommendations = recommendations[recommendations['runtime'] <= runtime_max]
+    recommendations = recommendations[(recommendations['release_year'] >= release_year_range[0]) &
+                                      (recommendations['release_year'] <= release_year_range[1])]
+    if genre_filters:
+        recommendations = recommendations[recommendations['genres'].apply(lambda x: all(genre in x for genre in genre_filters))]
+    recommendations = recommendations[~((recommendations['vote_average'] > 6.5) & (recommendations['vote_count'] < 500))]
+    return recommendations['position'].to_numpy()
+
+
+def _repeat(function, reps):
+    timings = []
+    for _ in range(reps):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def run(size, reps, seeds=3, data_dir=DEFAULT_DATA_DIR, seed=0):
+    """Chained filtering against the filter index, alone and in front of a multi-seed query, as result dicts."""
+    df = load_movies(os.path.join(catalog_directory(data_dir, size, seed), 'movies_details.parquet'))
+    start = time.perf_counter()
+    build_filter_index(df)
+    build_seconds = time.perf_counter() - start
+    index = get_filter_index(df)
+    chained = chained_filter(df, *FILTERS)
+    indexed = np.flatnonzero(filter_mask(index, *FILTERS))
+    results = [{'size': size, 'benchmark': 'filters.build_index', 'seconds': round(build_seconds, 4)},
+               {'size': size, 'benchmark': 'filters.rows', 'rows': len(indexed), 'same_rows': bool(np.array_equal(chained, indexed))}]
+    results.append(dict({'size': size, 'benchmark': 'filters.chained'}, **_milliseconds(_repeat(lambda: chained_filter(df, *FILTERS), reps))))
+    results.append(dict({'size': size, 'benchmark': 'filters.indexed'},
+                        **_milliseconds(_repeat(lambda: filter_mask(index, *FILTERS), reps))))
+
+    # A filtered query: scoring every row and filtering the scores, or filtering first and scoring the survivors
+    rng = np.random.default_rng(seed + 1)
+    ids = df['id'].to_numpy()
+    movie_ids = ids[rng.choice(len(ids), seeds, replace=False)].tolist()
+
+    def score_then_filter():
+        return score_movies(df, movie_ids)[chained_filter(df, *FILTERS)]
+
+    def filter_then_score():
+        return score_movies(df, movie_ids, np.flatnonzero(filter_mask(index, *FILTERS)))
+
+    assert np.allclose(score_then_filter(), filter_then_score())
+    results.append(dict({'size': size, 'benchmark': 'filters.query.score_then_filter', 'seeds': seeds},
+                        **_milliseconds(_repeat(score_then_filter, reps))))
+    results.append(dict({'size': size, 'benchmark': 'filters.query.filter_then_score', 'seeds': seeds},
+                        **_milliseconds(_repeat(filter_then_score, reps))))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the recommendation filters applied as chained pandas selections "
+                                                 "and through the precomputed filter index, on a synthetic catalog.")
+    parser.add_argument('--size', type=int, default=20000, help="movies in the synthetic catalog")
+    parser.add_argument('--reps', type=int, default=20, help="timed calls per case")
+    parser.add_argument('--seeds', type=int, default=3, help="seed movies of the filtered query")
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help="where generated catalogs are kept between runs")
+    args = parser.parse_args()
+    for result in run(args.size, args.reps, args.seeds, args.data_dir):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import time
+import numpy as np
+import pandas as pd
+from catalog.lazy import complete_rows, fetch_rows, load_movies, load_people
+from catalog.lookup import find_movie, find_person, movie_lookup, people_lookup, recommendation_options
+from catalog.people_index import filmography, get_people_index, get_people_names
+from individual_movies.similarity import get_recommendations_by_name, get_similarity_explanations
+from recommendations import result_cache
+from recommendations.core import get_recommendations_by_ids
+from recommendations.filter_index import get_filter_index
+from recommendations.input_file import parse_upload
+from recommendations.similarity_engine import get_features
+from recommendations.title_matcher import get_title_matcher
+from .synthetic import catalog_directory
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DATA_DIR = os.path.join(APP_DIR, 'benchmark_data')
+
+# Filters the recommendations tab starts with (one star, every fame level, full runtime and year ranges)
+TAB_DEFAULTS = {'star_rating': 1, 'fame_level': "Very Famous", 'language_filter': "", 'runtime_max': 300,
+                'release_year_range': (1915, 2025), 'genre_filters': []}
+
+# Lines of the generated upload file: exact labels, labels with a typo, bare titles and lines matching nothing
+UPLOAD_LINES = 200
+
+
+def _milliseconds(timings):
+    timings = np.asarray(timings) * 1000
+    return {'reps': len(timings), 'p50_ms': round(float(np.percentile(timings, 50)), 3),
+            'p95_ms': round(float(np.percentile(timings, 95)), 3), 'mean_ms': round(float(timings.mean()), 3),
+            'min_ms': round(float(timings.min()), 3)}
+
+
+def _time(function, inputs):
+    """Call function on every input with the result cache emptied first, so every call computes its answer.
+
+    One untimed call comes first, so lazily built structures are not charged to the first input.
+    """
+    function(inputs[0])
+    timings = []
+    for value in inputs:
+        result_cache.clear_result_cache()
+        start = time.perf_counter()
+        function(value)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _typo(label, rng):
+    position = int(rng.integers(0, max(1, len(label) - 7)))  # leave the "(Year)" suffix intact
+    return label[:position] + label[position + 1:]
+
+
+def upload_text(labels, lines, rng):
+    """A plain-text upload mixing exact labels, labels with a typo, bare titles and lines no title matches."""
+    picks = [labels[i] for i in rng.integers(0, len(labels), lines)]
+    kinds = rng.choice(4, lines, p=[0.5, 0.25, 0.15, 0.1])
+    text = [label if kind == 0 else _typo(label, rng) if kind == 1 else label.rsplit(' (', 1)[0] if kind == 2
+            else f"zz{rng.integers(1 << 30)} qq" for label, kind in zip(picks, kinds.tolist())]
+    return '\n'.join(text).encode()
+
+
+def _builds(movies_path, people_path):
+    """Seconds of each cold step the first rerun of a fresh process pays for."""
+    steps = [('load_movies', lambda: load_movies(movies_path)), ('load_people', lambda: load_people(people_path))]
+    timings = {}
+    for name, step in steps:
+        start = time.perf_counter()
+        step()
+        timings[name] = time.perf_counter() - start
+    df, people_df = load_movies(movies_path), load_people(people_path)
+    for name, step in (('features', get_features), ('filter_index', get_filter_index),
+                       ('recommendation_options', recommendation_options), ('movie_lookup', movie_lookup),
+                       ('people_index', get_people_index)):
+        start = time.perf_counter()
+        step(df)
+        timings[name] = time.perf_counter() - start
+    for name, step in (('people_lookup', people_lookup), ('people_names', get_people_names)):
+        start = time.perf_counter()
+        step(people_df)
+        timings[name] = time.perf_counter() - start
+    start = time.perf_counter()
+    get_title_matcher(df)
+    timings['title_matcher'] = time.perf_counter() - start
+    for name, frame in (('movie_details_file', df), ('people_details_file', people_df)):
+        start = time.perf_counter()
+        fetch_rows(frame, [0])  # the row-group copy display columns are read from, written on first use
+        timings[name] = time.perf_counter() - start
+    return df, people_df, timings
+
+
+def _title_year(label):
+    title, year = label.rsplit(' (', 1)
+    return title, int(year.rstrip(')'))
+
+
+def detail_page(df, people_df, title, year):
+    """The lookups of one detail page: the movie, its similar movies with explanations, and its first cast member."""
+    movie = find_movie(df, title, year)
+    recommendations = get_recommendations_by_name(movie['original_title'], df)
+    if not recommendations.empty:
+        get_similarity_explanations(movie, complete_rows(df, recommendations.head(5)), df)
+    cast = movie['cast'].split(', ')[:9] if isinstance(movie['cast'], str) else []
+    names = get_people_names(people_df)
+    if cast and cast[0] in names:
+        find_person(people_df, cast[0])
+        filmography(get_people_index(df), cast[0])
+
+
+def run_size(size, data_dir, seed_counts, reps, seed=0):
+    """Benchmark results for the synthetic catalog of one size, as a list of result dicts."""
+    directory = catalog_directory(data_dir, size, seed)
+    movies_path = os.path.join(directory, 'movies_details.parquet')
+    people_path = os.path.join(directory, 'people_details.parquet')
+    df, people_df, builds = _builds(movies_path, people_path)
+    results = [{'size': size, 'benchmark': f"build.{name}", 'seeds': None, 'reps': 1, 'seconds': round(seconds, 4)}
+               for name, seconds in builds.items()]
+
+    rng = np.random.default_rng(seed + 1)
+    ids = df['id'].to_numpy()
+    options = recommendation_options(df)
+    labels = list(options['movie_options'])
+    for count in seed_counts:
+        queries = [ids[rng.choice(len(ids), count, replace=False)].tolist() for _ in range(reps)]
+        timings = _time(lambda movie_ids: get_recommendations_by_ids(movie_ids, df=df, **TAB_DEFAULTS), queries)
+        results.append(dict({'size': size, 'benchmark': 'recommendations_by_ids', 'seeds': count}, **_milliseconds(timings)))
+    genres = options['genres']
+    filtered = dict(TAB_DEFAULTS, language_filter="en", genre_filters=[genres[0]], fame_level="Famous", star_rating=3)
+    queries = [ids[rng.choice(len(ids), 3, replace=False)].tolist() for _ in range(reps)]
+    timings = _time(lambda movie_ids: get_recommendations_by_ids(movie_ids, df=df, **filtered), queries)
+    results.append(dict({'size': size, 'benchmark': 'recommendations_by_ids.filtered', 'seeds': 3}, **_milliseconds(timings)))
+
+    titles = df['original_title'].iloc[rng.integers(0, len(df), reps)].tolist()
+    timings = _time(lambda title: get_recommendations_by_name(title, df), titles)
+    results.append(dict({'size': size, 'benchmark': 'recommendations_by_name', 'seeds': 1}, **_milliseconds(timings)))
+
+    uploads = [upload_text(labels, UPLOAD_LINES, rng) for _ in range(max(1, reps // 4))]
+    timings = _time(lambda data: parse_upload(io.BytesIO(data), 'upload.txt', get_title_matcher(df)), uploads)
+    results.append(dict({'size': size, 'benchmark': 'upload_matching', 'seeds': None, 'lines': UPLOAD_LINES},
+                        **_milliseconds(timings)))
+
+    pages = [_title_year(labels[i]) for i in rng.integers(0, len(labels), reps)]
+    timings = _time(lambda page: detail_page(df, people_df, *page), pages)
+    results.append(dict({'size': size, 'benchmark': 'detail_page', 'seeds': None}, **_milliseconds(timings)))
+    timings = _time(lambda page: find_movie(df, *page), pages)
+    results.append(dict({'size': size, 'benchmark': 'detail_page.find_movie', 'seeds': None}, **_milliseconds(timings)))
+    return results
+
+
+def _environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR, capture_output=True, text=True,
+                                timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'platform': platform.platform(), 'cpus': os.cpu_count()}
+
+
+def run(sizes, seed_counts, reps, data_dir=DEFAULT_DATA_DIR, seed=0):
+    """Run every benchmark for each catalog size; returns the JSON-ready report."""
+    # Results must come from computation, not from a store shared with earlier runs
+    result_cache.DISK_PATH = None
+    report = {'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'environment': _environment(),
+              'config': {'sizes': sizes, 'seed_counts': seed_counts, 'reps': reps, 'seed': seed}, 'results': []}
+    for size in sizes:
+        report['results'].extend(run_size(size, data_dir, seed_counts, reps, seed))
+    return report
+
+
+def _key(result):
+    return result['size'], result['benchmark'], result['seeds']
+
+
+def compare(report, baseline):
+    """Per benchmark in both reports: the current and baseline medians (or build seconds) and their ratio."""
+    previous = {_key(result): result for result in baseline['results']}
+    rows = []
+    for result in report['results']:
+        before = previous.get(_key(result))
+        if before is None:
+            continue
+        measure = 'seconds' if 'seconds' in result else 'p50_ms'
+        rows.append({'size': result['size'], 'benchmark': result['benchmark'], 'seeds': result['seeds'], 'measure': measure,
+                     'current': result[measure], 'baseline': before[measure],
+                     'ratio': round(result[measure] / before[measure], 3) if before[measure] else None})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the recommendation, search, upload and detail-page paths "
+                                                 "on synthetic catalogs and write the results as JSON.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    measure = commands.add_parser('run', help="run the benchmarks")
+    measure.add_argument('--sizes', default='10000,100000', help="comma-separated catalog sizes (10k to 1M)")
+    measure.add_argument('--seeds', default='1,3,10', help="comma-separated seed-movie counts of the multi-seed queries")
+    measure.add_argument('--reps', type=int, default=20, help="timed calls per benchmark")
+    measure.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help="where generated catalogs are kept between runs")
+    measure.add_argument('--seed', type=int, default=0, help="seed of the catalog generator and of the queries")
+    measure.add_argument('--output', help="JSON file to write (printed when omitted)")
+    check = commands.add_parser('compare', help="compare a results file with a baseline")
+    check.add_argument('results')
+    check.add_argument('baseline')
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        with open(args.results) as current, open(args.baseline) as baseline:
+            for row in compare(json.load(current), json.load(baseline)):
+                print(json.dumps(row))
+        return
+    report = run([int(size) for size in args.sizes.split(',')], [int(count) for count in args.seeds.split(',')],
+                 args.reps, args.data_dir, args.seed)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(report, handle, indent=1)
+    for result in report['results']:
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
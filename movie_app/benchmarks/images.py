@@ -0,0 +1,120 @@
+import argparse
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from PIL import Image
+from catalog import images
+from .harness import _milliseconds
+
+# Size of the stand-in posters, as TMDB serves them at w500
+POSTER_SIZE = (500, 750)
+
+
+def poster_bytes(rng):
+    """A JPEG poster-sized image of smoothed noise, about as large on disk as a real poster."""
+    small = rng.integers(0, 256, (POSTER_SIZE[1] // 8, POSTER_SIZE[0] // 8, 3), dtype=np.uint8)
+    image = Image.fromarray(small).resize(POSTER_SIZE, Image.BICUBIC)
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=90)
+    return output.getvalue()
+
+
+def serve(posters, latency):
+    """Start a local server answering every GET with one of posters after latency seconds; returns (server, base URL).
+
+    The path of every request is appended to server.requests.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.server.requests.append(self.path)
+            time.sleep(latency)
+            data = posters[hash(self.path) % len(posters)]
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def _grid(urls, width, prefetched):
+    """Seconds until every card of a result grid has its image, cards rendered in order as the tabs do."""
+    start = time.perf_counter()
+    if prefetched:
+        images.prefetch(urls, width)
+    for url in urls:
+        images.thumbnail(url, width, wait=None)
+    return time.perf_counter() - start
+
+
+def _remote(urls):
+    start = time.perf_counter()
+    for url in urls:
+        images._download(url)
+    return time.perf_counter() - start
+
+
+def run(latency, cards, reps, width=150, seed=0):
+    """Grid render timings for each way of getting the card images, as a list of result dicts."""
+    rng = np.random.default_rng(seed)
+    posters = [poster_bytes(rng) for _ in range(16)]
+    server, base = serve(posters, latency)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        disk_path = os.path.join(directory, 'thumbnails.sqlite')
+        saved = images.DISK_PATH
+        try:
+            grids = [[f"{base}/t/p/w500/{rep}-{card}.jpg" for card in range(cards)] for rep in range(reps)]
+            cases = [('remote_sequential', lambda urls: _remote(urls)),
+                     ('cold_sequential', lambda urls: _grid(urls, width, prefetched=False)),
+                     ('cold_prefetched', lambda urls: _grid(urls, width, prefetched=True)),
+                     ('memory', lambda urls: _grid(urls, width, prefetched=True))]
+            for name, case in cases:
+                images.DISK_PATH = disk_path if name == 'cold_prefetched' else None
+                if name != 'memory':
+                    images.clear_image_cache()
+                    # Each cold case asks for URLs no earlier case cached
+                    grids = [[f"{url}?{name}" for url in urls] for urls in grids]
+                timings = [case(urls) for urls in grids]
+                results.append(dict({'benchmark': f"images.{name}", 'latency_ms': latency * 1000, 'cards': cards},
+                                    **_milliseconds(timings)))
+            # The SQLite store filled by the prefetched case, with memory emptied (a restarted process)
+            images.DISK_PATH = disk_path
+            images.clear_image_cache()
+            timings = [_grid(urls, width, prefetched=True) for urls in grids]
+            results.append(dict({'benchmark': 'images.disk', 'latency_ms': latency * 1000, 'cards': cards},
+                                **_milliseconds(timings)))
+            results.append({'benchmark': 'images.bytes', 'poster_bytes': int(np.mean([len(poster) for poster in posters])),
+                            'thumbnail_bytes': int(np.mean([len(images.resize(poster, width)) for poster in posters]))})
+        finally:
+            images.DISK_PATH = saved
+            server.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time how long a result grid waits for its images, served by a local "
+                                                 "stand-in poster server, with and without the thumbnail cache.")
+    parser.add_argument('--latency-ms', type=float, default=80, help="delay of the stand-in server per image")
+    parser.add_argument('--cards', type=int, default=6, help="images per grid (6 on the recommendations tab)")
+    parser.add_argument('--reps', type=int, default=10, help="grids per case")
+    parser.add_argument('--width', type=int, default=150, help="display width of the thumbnails")
+    args = parser.parse_args()
+    for result in run(args.latency_ms / 1000, args.cards, args.reps, args.width):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+from catalog.lazy import load_movies, load_people
+from catalog.lookup import movie_lookup, people_lookup
+from .harness import DEFAULT_DATA_DIR, _milliseconds
+from .synthetic import catalog_directory
+
+
+def scan_rerun(df, people_df, title, year, name):
+    """The lookups of one detail-page rerun as the pages made them before the lookup maps: sorts, list.index and masks.
+
+    Returns the selected option labels and catalog positions; reading the rows' display columns costs the same either way.
+    """
+    labels = [""] + sorted(f"{movie_title} ({movie_year})" for movie_title, movie_year in zip(df['original_title'], df['release_year']))
+    label = labels[labels.index(f"{title} ({year})")]
+    movie = np.flatnonzero((df['original_title'].str.lower() == title.lower()) & (df['release_year'] == year))[0]
+    names = [""] + sorted(people_df['name'].tolist())
+    person_label = names[names.index(name) if name in names else 0]
+    person = np.flatnonzero(people_df['name'] == name)[0]
+    return label, int(movie), person_label, int(person)
+
+
+def mapped_rerun(df, people_df, title, year, name):
+    """The same lookups through the per-catalog maps of catalog.lookup."""
+    movies, people = movie_lookup(df), people_lookup(people_df)
+    label = movies['options'][movies['option_positions'].get(f"{title} ({year})", 0)]
+    movie = movies['title_year'][(title.lower(), year)]
+    person_label = people['options'][people['option_positions'].get(name, 0)]
+    return label, movie, person_label, people['rows'][name]
+
+
+def _timed_pages(rerun, df, people_df, pages):
+    timings = []
+    for page in pages:
+        start = time.perf_counter()
+        rerun(df, people_df, *page)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def run(size, reps, data_dir=DEFAULT_DATA_DIR, seed=0):
+    """Per-rerun cost of the detail-page lookups before and after the lookup maps, as result dicts."""
+    directory = catalog_directory(data_dir, size, seed)
+    df = load_movies(os.path.join(directory, 'movies_details.parquet'))
+    people_df = load_people(os.path.join(directory, 'people_details.parquet'))
+    start = time.perf_counter()
+    movie_lookup(df)
+    people_lookup(people_df)
+    build_seconds = time.perf_counter() - start
+
+    rng = np.random.default_rng(seed + 1)
+    rows = rng.integers(0, len(df), reps)
+    names = people_df['name'].iloc[rng.integers(0, len(people_df), reps)].tolist()
+    pages = [(df['original_title'].iloc[row], int(df['release_year'].iloc[row]), name) for row, name in zip(rows, names)]
+    same = all(scan_rerun(df, people_df, *page) == mapped_rerun(df, people_df, *page) for page in pages)
+    return [{'size': size, 'people': len(people_df), 'benchmark': 'lookups.build_maps', 'seconds': round(build_seconds, 4)},
+            dict({'size': size, 'benchmark': 'lookups.scan_rerun'}, **_milliseconds(_timed_pages(scan_rerun, df, people_df, pages))),
+            dict({'size': size, 'benchmark': 'lookups.mapped_rerun', 'same_rows': same},
+                 **_milliseconds(_timed_pages(mapped_rerun, df, people_df, pages)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the title/year and person lookups of one detail-page rerun, "
+                                                 "with sorts and masks over the catalog and with the lookup maps.")
+    parser.add_argument('--size', type=int, default=20000, help="movies in the synthetic catalog")
+    parser.add_argument('--reps', type=int, default=20, help="reruns timed per case")
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help="where generated catalogs are kept between runs")
+    args = parser.parse_args()
+    for result in run(args.size, args.reps, args.data_dir):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+import argparse
+import os
+import time
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+GENRES = ["Drama", "Comedy", "Thriller", "Action", "Romance", "Horror", "Crime", "Documentary", "Adventure",
+          "Science Fiction", "Family", "Mystery", "Fantasy", "Animation", "Music", "History", "War", "TV Movie",
+          "Western"]
+
+# Most common first; tags and people are drawn with Zipf-like weights over these orders
+LANGUAGES = ["English", "French", "Spanish", "German", "Japanese", "Italian", "Russian", "Korean", "Mandarin", "Hindi",
+             "Portuguese", "Swedish", "Danish", "Cantonese", "Arabic", "Polish", "Dutch", "Turkish", "Norwegian", "Finnish",
+             "Czech", "Hungarian", "Greek", "Thai", "Persian", "Hebrew", "Tamil", "Telugu", "Indonesian", "Romanian"]
+
+TITLE_WORDS = ["Love", "Night", "Man", "Last", "Dead", "Day", "Life", "Girl", "Story", "Time", "Dark", "Blood", "House",
+               "World", "Home", "Christmas", "Black", "King", "Secret", "City", "Lost", "Family", "Death", "Heart", "Dream",
+               "Little", "Lady", "Big", "Boy", "Game", "Red", "War", "Summer", "Wild", "Star", "Devil", "Island", "Water",
+               "Road", "Murder", "Return", "Ghost", "Women", "Revenge", "Stranger", "Fire", "Moon", "Power", "Sea", "Angel",
+               "Shadow", "Street", "Light", "Kill", "Rain", "River", "Queen", "Paradise", "Escape", "Zero", "Golden",
+               "Silent", "Hunter", "Winter", "Storm", "Mountain", "Train", "Witch", "Monster", "Dragon", "Prince", "Sun",
+               "Legend", "Empire", "Edge", "Brother", "Sister", "Mother", "Father", "Blue", "White", "Hotel", "Song",
+               "Dance", "Party", "Beach", "School", "Money", "Crazy", "Happy", "Young", "American", "Paris", "Tokyo"]
+
+FIRST_NAMES = ["James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda", "William", "Elizabeth",
+               "David", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen", "Daniel",
+               "Nancy", "Matthew", "Lisa", "Anthony", "Betty", "Mark", "Margaret", "Paul", "Sandra", "Steven", "Ashley",
+               "Andrew", "Emily", "Kenneth", "Donna", "Joshua", "Michelle", "Kevin", "Carol", "Brian", "Amanda", "George",
+               "Melissa", "Timothy", "Deborah", "Ronald", "Stephanie", "Jason", "Rebecca", "Yuki", "Hiroshi", "Marie",
+               "Pierre", "Hans", "Ingrid", "Carlos", "Lucia", "Giovanni", "Sofia", "Raj", "Priya", "Min-jun", "Seo-yeon",
+               "Ivan", "Olga", "Ahmed", "Fatima", "Lars", "Astrid"]
+
+# Surnames are built from these syllables, which gives tens of thousands of distinct names
+SYLLABLES = ["an", "ber", "cal", "dor", "el", "fen", "gar", "hal", "is", "jor", "kel", "lan", "mor", "nes", "ol", "per",
+             "quin", "ros", "san", "tor", "ul", "ven", "wil", "xan", "yor", "zel", "ash", "brook", "croft", "dale",
+             "ford", "gate", "ham", "ley", "mont", "ton", "wood", "ric", "son", "stein"]
+
+# Share of a movie's tags drawn from its theme (the rest come from the whole vocabulary), per column
+THEME_SHARE = {'genres': 0.85, 'keywords': 0.7, 'cast': 0.6, 'directors': 0.5, 'spoken_languages': 0.9}
+
+# Tags per movie, drawn uniformly from [low, high]
+TAG_COUNTS = {'genres': (1, 4), 'keywords': (0, 15), 'cast': (1, 20), 'directors': (1, 2), 'spoken_languages': (1, 3)}
+
+# Movies per theme; movies of a theme share tags, people and recommendation lists
+THEME_SIZE = 100
+
+# Share of movies in a collection, and the largest collection
+COLLECTION_SHARE = 0.15
+MAX_COLLECTION = 5
+
+
+def _zipf_weights(size, exponent=1.0):
+    weights = 1.0 / np.arange(1, size + 1) ** exponent
+    return weights / weights.sum()
+
+
+def _surnames(count, rng):
+    """count distinct surnames made of two or three syllables."""
+    first, second, third = np.meshgrid(np.arange(len(SYLLABLES)), np.arange(len(SYLLABLES)), np.arange(len(SYLLABLES) + 1),
+                                       indexing='ij')
+    combinations = np.stack([first.ravel(), second.ravel(), third.ravel()], axis=1)
+    combinations = combinations[rng.permutation(len(combinations))[:count]]
+    syllables = SYLLABLES + [""]
+    return ["".join(syllables[part] for part in parts).capitalize() for parts in combinations.tolist()]
+
+
+def person_names(count, rng):
+    """count distinct "First Last" names (up to about 4.5 million), in random order."""
+    surnames = _surnames(max(1, -(-count // len(FIRST_NAMES))), rng)
+    names = [f"{first} {last}" for last in surnames for first in FIRST_NAMES]
+    order = rng.permutation(len(names))[:count]
+    return [names[i] for i in order.tolist()]
+
+
+def keyword_vocabulary(count, rng):
+    """count distinct lower-case keywords: pairs of title words, then title words with made-up words."""
+    words = [word.lower() for word in TITLE_WORDS]
+    keywords = [f"{a} {b}" for a in words for b in words if a != b]
+    if count > len(keywords):
+        extra = _surnames(-(-(count - len(keywords)) // len(words)), rng)
+        keywords += [f"{word} {made_up.lower()}" for made_up in extra for word in words]
+    return keywords[:count]
+
+
+def _list_column(rows, picks, size, vocabulary, separator=', ', null_empty=False):
+    """Join the picked vocabulary entries of every row (rows grouped in order) into one string per row."""
+    offsets = np.zeros(size + 1, dtype=np.int32)
+    np.cumsum(np.bincount(rows, minlength=size), out=offsets[1:])
+    lists = pa.ListArray.from_arrays(pa.array(offsets), vocabulary.take(pa.array(picks)))
+    joined = pc.binary_join(lists, separator)
+    if null_empty:
+        joined = pc.if_else(pc.equal(pc.list_value_length(lists), 0), pa.nulls(size, pa.string()), joined)
+    return joined
+
+
+def _unique_in_order(rows, picks, width):
+    """Drop repeated picks within a row, keeping first occurrences in their original order."""
+    _, first = np.unique(rows.astype(np.int64) * width + picks, return_index=True)
+    first.sort()
+    return rows[first], picks[first]
+
+
+def _themed_tags(rng, themes, theme_count, vocabulary_size, pool_size, counts, theme_share, exponent=1.0):
+    """(row, tag code) pairs: each tag comes from the row's theme pool with probability theme_share, else from all tags."""
+    weights = _zipf_weights(vocabulary_size, exponent)
+    pools = rng.choice(vocabulary_size, size=(theme_count, pool_size), p=weights)
+    rows = np.repeat(np.arange(len(themes)), counts)
+    from_theme = rng.random(len(rows)) < theme_share
+    picks = np.where(from_theme, pools[themes[rows], rng.integers(0, pool_size, len(rows))],
+                     rng.choice(vocabulary_size, size=len(rows), p=weights))
+    return _unique_in_order(rows, picks, vocabulary_size)
+
+
+def _counts(rng, size, low, high):
+    return rng.integers(low, high + 1, size)
+
+
+def _titles(rng, size):
+    """Titles of one to four Zipf-drawn words, a fifth starting with "The"; common titles repeat, as remakes do."""
+    counts = rng.choice([1, 2, 2, 3, 3, 4], size)
+    rows = np.repeat(np.arange(size), counts)
+    words = rng.choice(len(TITLE_WORDS), size=len(rows), p=_zipf_weights(len(TITLE_WORDS), 0.8))
+    titles = _list_column(*_unique_in_order(rows, words, len(TITLE_WORDS)), size, pa.array(TITLE_WORDS), separator=' ')
+    articles = rng.random(size) < 0.2
+    return pc.if_else(pa.array(articles), pc.binary_join_element_wise("The", titles, ' '), titles).to_pylist()
+
+
+def _collections(rng, themes):
+    """belongs_to_id per movie (NaN outside collections) and each member's place in its collection.
+
+    Collections group movies of one theme, mostly, since members are taken in theme order.
+    """
+    size = len(themes)
+    members = rng.choice(size, int(size * COLLECTION_SHARE), replace=False)
+    members = members[np.argsort(themes[members], kind='stable')]
+    lengths = rng.integers(2, MAX_COLLECTION + 1, len(members) // 2 + 1)
+    ends = np.cumsum(lengths)
+    lengths = lengths[:np.searchsorted(ends, len(members)) + 1]
+    group = np.repeat(np.arange(len(lengths)), lengths)[:len(members)]
+    place = np.arange(len(members)) - np.repeat(np.cumsum(lengths) - lengths, lengths)[:len(members)]
+    belongs_to_id = np.full(size, np.nan)
+    belongs_to_id[members] = 10_000 + group * 7  # sparse ids, like real collection ids
+    order = np.zeros(size, dtype=np.int64)
+    order[members] = place
+    first_member = np.full(size, -1, dtype=np.int64)
+    first_member[members] = members[np.repeat(np.cumsum(lengths) - lengths, lengths)[:len(members)]]
+    return belongs_to_id, order, first_member
+
+
+def _title_lists(rng, themes, titles, low, high, theme_share):
+    """Comma-joined titles of other movies, mostly of the same theme (recommendations, similar movies)."""
+    size = len(themes)
+    by_theme = np.argsort(themes, kind='stable')
+    starts = np.searchsorted(themes[by_theme], np.arange(themes.max() + 1))
+    sizes = np.bincount(themes, minlength=themes.max() + 1)
+    counts = _counts(rng, size, low, high)
+    rows = np.repeat(np.arange(size), counts)
+    same_theme = rng.random(len(rows)) < theme_share
+    picks = np.where(same_theme, by_theme[starts[themes[rows]] + rng.integers(0, 1 << 30, len(rows)) % sizes[themes[rows]]],
+                     rng.integers(0, size, len(rows)))
+    keep = picks != rows  # never list the movie itself
+    rows, picks = _unique_in_order(rows[keep], picks[keep], size)
+    return _list_column(rows, picks, size, pa.array(titles), null_empty=True)
+
+
+def _word_rows(rng, size, low, high):
+    counts = _counts(rng, size, low, high)
+    return np.repeat(np.arange(size), counts), rng.integers(0, len(TITLE_WORDS), counts.sum())
+
+
+def generate_catalog(size, seed=0):
+    """A synthetic movies_details table of size rows and the matching people_details table.
+
+    Every column the app reads has the shape of the real files: comma-joined genres,
+    keywords, cast (billing order), directors and languages with theme clusters and
+    Zipf-popular tags, recommendation lists naming other titles, sequels in collections
+    sharing a title stem, and heavy-tailed vote counts. The same size and seed always
+    give the same tables.
+    """
+    rng = np.random.default_rng(seed)
+    theme_count = max(1, size // THEME_SIZE)
+    themes = rng.integers(0, theme_count, size)
+    people = person_names(max(1000, int(size * 1.2)), rng)
+    keywords = keyword_vocabulary(max(1000, size // 4), rng)
+
+    belongs_to_id, place, first_member = _collections(rng, themes)
+    titles = _titles(rng, size)
+    for position in np.flatnonzero(place).tolist():
+        titles[position] = f"{titles[first_member[position]]} {place[position] + 1}"  # sequels share their collection's title stem
+
+    columns = {'id': np.sort(rng.choice(3 * size + 10, size, replace=False)) + 2, 'original_title': titles}
+    release_year = 2025 - np.minimum(rng.exponential(22, size).astype(np.int64), 110)
+    columns['release_year'] = release_year
+    credited = []
+    for name, vocabulary, pool in (('genres', GENRES, 4), ('keywords', keywords, 40), ('cast', people, 60),
+                                   ('directors', people, 8), ('spoken_languages', LANGUAGES, 3)):
+        counts = _counts(rng, size, *TAG_COUNTS[name])
+        exponent = 1.6 if name == 'spoken_languages' else 0.9
+        rows, picks = _themed_tags(rng, themes, theme_count, len(vocabulary), pool, counts, THEME_SHARE[name], exponent)
+        columns[name] = _list_column(rows, picks, size, pa.array(vocabulary), null_empty=name == 'keywords')
+        if vocabulary is people:
+            credited.append(picks)
+    columns['recommendations'] = _title_lists(rng, themes, titles, 0, 12, 0.8)
+    columns['similar_movies'] = _title_lists(rng, themes, titles, 0, 12, 0.5)
+    columns['belongs_to_id'] = belongs_to_id
+
+    vote_count = np.floor(rng.lognormal(3.0, 2.2, size)).astype(np.int64)
+    vote_count[rng.random(size) < 0.1] = 0
+    spread = 0.8 + 2.5 / np.sqrt(1 + vote_count)
+    vote_average = np.round(np.clip(rng.normal(6.2, spread), 0, 10), 1)
+    vote_average[vote_count == 0] = 0.0
+    columns['vote_average'] = vote_average
+    columns['vote_count'] = vote_count
+    runtime = np.clip(rng.normal(102, 22, size), 45, 240).astype(np.int64)
+    runtime[rng.random(size) < 0.03] = 0
+    columns['runtime'] = runtime
+
+    codes = [f"{value:012x}" for value in rng.integers(0, 1 << 48, size).tolist()]
+    columns['poster_path'] = [f"https://image.tmdb.org/t/p/w500/{code}.jpg" for code in codes]
+    columns['trailers'] = [f"https://www.youtube.com/watch?v={code[:11]}" for code in codes]
+    columns['tagline'] = _list_column(*_word_rows(rng, size, 3, 10), size, pa.array(TITLE_WORDS), separator=' ')
+    columns['overview'] = _list_column(*_word_rows(rng, size, 20, 60), size, pa.array(TITLE_WORDS), separator=' ')
+    has_money = rng.random(size) < 0.3
+    budget = np.where(has_money, rng.lognormal(16, 1.5, size), 0).astype(np.int64)
+    columns['budget'] = budget
+    columns['revenue'] = np.where(has_money, budget * rng.lognormal(0.5, 1.2, size), 0).astype(np.int64)
+    movies = pa.table(columns)
+
+    # Everyone credited in a movie has a people_details row
+    credited = np.unique(np.concatenate(credited))
+    person_count = len(credited)
+    born = rng.integers(1900, 2005, person_count)
+    people_table = pa.table({
+        'name': pa.array(people).take(pa.array(credited)),
+        'biography': _list_column(*_word_rows(rng, person_count, 0, 120), person_count, pa.array(TITLE_WORDS), separator=' '),
+        'birthday': [f"{year}-{month:02d}-{day:02d}" for year, month, day
+                     in zip(born.tolist(), rng.integers(1, 13, person_count).tolist(), rng.integers(1, 29, person_count).tolist())],
+        'deathday': [f"{year + 70}-01-01" if dead else None
+                     for year, dead in zip(born.tolist(), (rng.random(person_count) < 0.1).tolist())],
+        'known_for_department': rng.choice(["Acting", "Directing", "Writing", "Production", "Camera"], person_count,
+                                           p=[0.7, 0.1, 0.08, 0.07, 0.05]),
+        'place_of_birth': rng.choice([f"{city}, {country}" for city, country in (("London", "UK"), ("Paris", "France"),
+                                      ("Los Angeles", "USA"), ("New York", "USA"), ("Tokyo", "Japan"), ("Mumbai", "India"),
+                                      ("Seoul", "South Korea"), ("Berlin", "Germany"))], person_count),
+        'images': [f"https://image.tmdb.org/t/p/w185/p{index}a.jpg, https://image.tmdb.org/t/p/w185/p{index}b.jpg"
+                   for index in range(person_count)],
+    })
+    return movies, people_table
+
+
+def write_catalog(directory, size, seed=0):
+    """Write movies_details.parquet and people_details.parquet for a synthetic catalog; returns both paths."""
+    os.makedirs(directory, exist_ok=True)
+    movies, people = generate_catalog(size, seed)
+    paths = {'movies': os.path.join(directory, 'movies_details.parquet'),
+             'people': os.path.join(directory, 'people_details.parquet')}
+    pq.write_table(movies, paths['movies'])
+    pq.write_table(people, paths['people'])
+    return paths
+
+
+def catalog_directory(root, size, seed=0):
+    """Directory holding the synthetic catalog of this size and seed under root, generated on first use."""
+    directory = os.path.join(root, f"movies-{size}-seed{seed}")
+    if not os.path.exists(os.path.join(directory, 'people_details.parquet')):
+        write_catalog(directory, size, seed)
+    return directory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic movies/people catalog with the shape of the real one.")
+    parser.add_argument('size', type=int, help="number of movies, e.g. 10000 or 1000000")
+    parser.add_argument('output', help="directory for movies_details.parquet and people_details.parquet")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    paths = write_catalog(args.output, args.size, args.seed)
+    people = pq.read_metadata(paths['people']).num_rows
+    print(f"Wrote {args.size} movies and {people} people to {args.output} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
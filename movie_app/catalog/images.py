@@ -0,0 +1,241 @@
+import http.client
+import io
+import os
+import sqlite3
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, wait as wait_for
+from contextlib import closing
+from PIL import Image
+from instrumentation import count
+
+# Bytes of thumbnails kept in memory per process
+MAX_BYTES = 64 * 1024 * 1024
+
+# Optional SQLite file that keeps thumbnails across restarts and shares them between processes
+DISK_PATH = os.environ.get('MOVIEREX_IMAGE_CACHE')
+
+# Bytes of thumbnails kept in the SQLite file before the least recently used ones are dropped
+DISK_MAX_BYTES = 512 * 1024 * 1024
+
+# Downloads running at the same time
+FETCH_WORKERS = 8
+
+# Seconds a download may stall before it is given up
+FETCH_TIMEOUT = 10
+
+# Seconds a page waits for an image (or, in all, a grid of images) still downloading before handing
+# the browser the remote URLs instead; a slow image host delays a render by at most this long
+WAIT_SECONDS = 1
+
+# Seconds a failed image is served as its remote URL before it is downloaded again
+FAILURE_SECONDS = 10 * 60
+
+# Thumbnails are this many times the display width, so they stay sharp on high-density screens
+PIXEL_DENSITY = 2
+
+JPEG_QUALITY = 85
+
+# key -> thumbnail bytes, least recently used first
+_entries = OrderedDict()
+_memory_bytes = 0
+# key -> future of a download under way; key -> time of the last failure
+_pending = {}
+_failures = {}
+_lock = threading.Lock()
+_stats = {'hits': 0, 'disk_hits': 0, 'downloads': 0, 'failures': 0, 'evictions': 0, 'waits': 0, 'timeouts': 0}
+_executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix='images')
+
+
+def _key(url, width):
+    return f"{width}:{url}"
+
+
+def _valid(url):
+    return isinstance(url, str) and url.startswith(('http://', 'https://'))
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+    count(f"images.{name}")
+
+
+def _remember(key, data):
+    global _memory_bytes
+    if len(data) > MAX_BYTES:
+        return
+    with _lock:
+        if key in _entries:
+            _memory_bytes -= len(_entries.pop(key))
+        _entries[key] = data
+        _memory_bytes += len(data)
+        while _memory_bytes > MAX_BYTES:
+            _memory_bytes -= len(_entries.popitem(last=False)[1])
+            _stats['evictions'] += 1
+
+
+def _lookup(key):
+    with _lock:
+        data = _entries.get(key)
+        if data is None:
+            return None
+        _entries.move_to_end(key)
+        _stats['hits'] += 1
+    count('images.hits')
+    return data
+
+
+def _connect(path):
+    connection = sqlite3.connect(path, timeout=5)
+    connection.execute("CREATE TABLE IF NOT EXISTS thumbnails (key TEXT PRIMARY KEY, accessed REAL, bytes INTEGER, data BLOB)")
+    return connection
+
+
+def _disk_lookup(path, key, now):
+    with closing(_connect(path)) as connection, connection:
+        row = connection.execute("SELECT accessed, data FROM thumbnails WHERE key = ?", (key,)).fetchone()
+        # Use is recorded to the minute, so the prefetches of one page read without queueing for the write lock
+        if row is not None and row[0] < now - 60:
+            connection.execute("UPDATE thumbnails SET accessed = ? WHERE key = ?", (now, key))
+    return None if row is None else bytes(row[1])
+
+
+def _disk_store(path, key, data, now):
+    with closing(_connect(path)) as connection, connection:
+        connection.execute("INSERT OR REPLACE INTO thumbnails VALUES (?, ?, ?, ?)", (key, now, len(data), data))
+        # Drop least recently used rows beyond the size limit
+        connection.execute("DELETE FROM thumbnails WHERE key IN (SELECT key FROM (SELECT key, SUM(bytes) OVER "
+                           "(ORDER BY accessed DESC) AS total FROM thumbnails) WHERE total > ?)", (DISK_MAX_BYTES,))
+
+
+def resize(data, width):
+    """JPEG bytes of the image in data scaled down to width * PIXEL_DENSITY pixels wide; smaller images keep their size."""
+    with Image.open(io.BytesIO(data)) as image:
+        image.thumbnail((width * PIXEL_DENSITY, image.height), Image.BICUBIC)
+        output = io.BytesIO()
+        image.convert('RGB').save(output, format='JPEG', quality=JPEG_QUALITY)
+    return output.getvalue()
+
+
+def _download(url):
+    request = urllib.request.Request(url, headers={'User-Agent': 'movierex-images'})
+    with urllib.request.urlopen(request, timeout=FETCH_TIMEOUT) as response:
+        return response.read()
+
+
+def _load(key, url, width, disk_path):
+    """Thumbnail bytes for key from the SQLite store or a fresh download, or None when the image cannot be had."""
+    try:
+        now = time.time()
+        data = _disk_lookup(disk_path, key, now) if disk_path else None
+        downloaded = data is None
+        if not downloaded:
+            _count('disk_hits')
+        else:
+            _count('downloads')
+            data = resize(_download(url), width)
+        _remember(key, data)
+        if downloaded and disk_path:
+            _disk_store(disk_path, key, data, now)
+        return data
+    except (OSError, http.client.HTTPException, ValueError, Image.DecompressionBombError, sqlite3.Error):
+        # Unreachable hosts, error statuses, timeouts and files PIL cannot read are OSErrors;
+        # malformed responses raise HTTPException
+        _count('failures')
+        with _lock:
+            _failures[key] = time.time()
+        return None
+    finally:
+        with _lock:
+            _pending.pop(key, None)
+
+
+def _future(url, width, disk_path):
+    """The download of url's thumbnail under way or just started; None when it is cached or recently failed."""
+    key = _key(url, width)
+    with _lock:
+        if key in _entries:
+            return None
+        future = _pending.get(key)
+        if future is None:
+            if time.time() - _failures.get(key, float('-inf')) < FAILURE_SECONDS:
+                return None
+            future = _pending[key] = _executor.submit(_load, key, url, width, disk_path)
+    return future
+
+
+def prefetch(urls, width, disk_path=None):
+    """Start downloading the thumbnails of urls (for display width pixels wide) in the background.
+
+    Cached, already downloading and recently failed images are skipped; returns at once.
+    """
+    disk_path = disk_path or DISK_PATH
+    for url in urls:
+        if _valid(url):
+            _future(url, width, disk_path)
+
+
+def thumbnail(url, width, wait=WAIT_SECONDS, disk_path=None):
+    """Cached thumbnail bytes of the image at url for display width pixels wide, or None.
+
+    A missing thumbnail is downloaded (or the download under way joined) for up to wait seconds;
+    None is returned when it is not ready by then, or the image failed to load recently.
+    """
+    if not _valid(url):
+        return None
+    key = _key(url, width)
+    data = _lookup(key)
+    if data is not None:
+        return data
+    future = _future(url, width, disk_path or DISK_PATH)
+    if future is None:
+        return _lookup(key)  # stored since the first look, or failed
+    _count('waits')
+    try:
+        return future.result(timeout=wait)
+    except FutureTimeout:
+        _count('timeouts')
+        return None
+
+
+def image_source(url, width, wait=WAIT_SECONDS):
+    """What to hand st.image for url shown width pixels wide: the cached thumbnail, else the URL for the browser to load."""
+    data = thumbnail(url, width, wait)
+    return url if data is None else data
+
+
+def image_sources(urls, width, wait=WAIT_SECONDS):
+    """image_source for every url of a grid, waiting at most wait seconds for the whole grid rather than per image.
+
+    Every missing thumbnail starts downloading at once; those not ready by the deadline are
+    handed over as their URLs and keep downloading for the next render.
+    """
+    urls = list(urls)
+    disk_path = DISK_PATH
+    futures = [future for future in (_future(url, width, disk_path) for url in urls if _valid(url)) if future is not None]
+    if futures:
+        _count('waits')
+        if wait_for(futures, timeout=wait).not_done:
+            _count('timeouts')
+    return [(_lookup(_key(url, width)) if _valid(url) else None) or url for url in urls]
+
+
+def image_stats():
+    """Hit/download/failure counters plus the current entry count and memory use."""
+    with _lock:
+        return dict(_stats, entries=len(_entries), bytes=_memory_bytes, pending=len(_pending))
+
+
+def clear_image_cache():
+    """Drop every in-memory thumbnail and failure and reset the counters (the SQLite store is left alone)."""
+    global _memory_bytes
+    with _lock:
+        _entries.clear()
+        _failures.clear()
+        _memory_bytes = 0
+        for name in _stats:
+            _stats[name] = 0
+
@@ -0,0 +1,120 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from .provider import cached_for_frame, dataset_version, is_current_copy, load_dataset, source_metadata
+
+# Columns used for scoring, filtering, option lists and lookups; everything else is read on demand
+MOVIE_COLUMNS = ('id', 'original_title', 'release_year', 'genres', 'keywords', 'cast', 'directors',
+                 'spoken_languages', 'recommendations', 'similar_movies', 'belongs_to_id',
+                 'vote_average', 'vote_count', 'runtime')
+PEOPLE_COLUMNS = ('name',)
+
+# Rows per row group of the details file; a fetch reads and decodes only the groups it touches
+ROW_GROUP_ROWS = 512
+
+# Fetched rows kept in memory per process
+ROW_CACHE_SIZE = 4096
+
+# (details path, version, position) -> {column: value}, least recently used first
+_rows = OrderedDict()
+_rows_lock = threading.Lock()
+_details_lock = threading.Lock()
+# details path -> source metadata the file was last found current for, so fetches skip reading its footer
+_details_sources = {}
+
+
+def load_movies(path):
+    """Load the movie catalog with only the resident columns; display columns come from fetch_rows."""
+    return load_dataset(path, columns=MOVIE_COLUMNS)
+
+
+def load_people(path):
+    """Load people_details with only the resident columns; display columns come from fetch_rows."""
+    return load_dataset(path, columns=PEOPLE_COLUMNS)
+
+
+def details_path(path):
+    return os.path.splitext(path)[0] + '.details.parquet'
+
+
+def _details_file(path):
+    """Copy of the Parquet file in catalog order with small row groups, rewritten when the source version (mtime, size) changes."""
+    target = details_path(path)
+    with _details_lock:
+        metadata = source_metadata(path)
+        if _details_sources.get(target) != metadata:
+            if not os.path.exists(target) or not is_current_copy(path, pq.read_schema(target)):
+                table = pq.read_table(path)
+                table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+                temporary_path = f"{target}.{os.getpid()}.tmp"
+                pq.write_table(table, temporary_path, row_group_size=ROW_GROUP_ROWS)
+                os.replace(temporary_path, target)
+            _details_sources[target] = metadata
+    return target
+
+
+def _missing_columns(df):
+    path = dataset_version(df)[0]
+    names = pq.read_schema(path).names
+    return {'names': names, 'missing': [name for name in names if name not in df.columns]}
+
+
+def _read_rows(target, positions, columns):
+    """Read the given catalog positions (sorted, distinct) from the details file, one row group at a time."""
+    records = {}
+    with pq.ParquetFile(target) as file:
+        groups = positions // ROW_GROUP_ROWS
+        for group in np.unique(groups):
+            wanted = positions[groups == group]
+            table = file.read_row_group(int(group), columns=columns).take(wanted - group * ROW_GROUP_ROWS)
+            for position, record in zip(wanted.tolist(), table.to_pylist()):
+                records[position] = record
+    return records
+
+
+def fetch_rows(df, positions):
+    """Rows of df at the given positions with every column of the source file.
+
+    Columns df does not hold are read from the details file (only the row groups holding
+    these positions) and kept in a per-process LRU. Frames that hold all their columns,
+    or were not loaded through load_dataset, are returned as df.iloc[positions].
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    rows = df.iloc[positions]
+    version = dataset_version(df)
+    if version is None:
+        return rows
+    columns = cached_for_frame(df, 'missing_columns', _missing_columns)
+    if not columns['missing']:
+        return rows
+    target = _details_file(version[0])
+    keys = [(target, version, position) for position in positions.tolist()]
+    with _rows_lock:
+        found = {key: _rows[key] for key in keys if key in _rows}
+        for key in found:
+            _rows.move_to_end(key)
+    wanted = np.unique([key[2] for key in keys if key not in found]).astype(np.int64)
+    if len(wanted):
+        fetched = _read_rows(target, wanted, columns['missing'])
+        with _rows_lock:
+            for position, record in fetched.items():
+                key = (target, version, position)
+                found[key] = _rows[key] = record
+            while len(_rows) > ROW_CACHE_SIZE:
+                _rows.popitem(last=False)
+    details = pd.DataFrame([found[key] for key in keys], columns=columns['missing'], index=rows.index)
+    return pd.concat([rows, details], axis=1)[columns['names']]
+
+
+def complete_rows(df, rows):
+    """rows taken from df (possibly with extra columns) plus the source columns df does not hold."""
+    full = fetch_rows(df, df.index.get_indexer(rows.index))
+    return rows.assign(**{name: full[name].to_numpy() for name in full.columns if name not in rows.columns})
+
+
+def fetch_row(df, position):
+    """One full row of df as a Series, like df.iloc[position]."""
+    return fetch_rows(df, [position]).iloc[0]
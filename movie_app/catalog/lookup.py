@@ -0,0 +1,110 @@
+from bisect import bisect_left
+from .lazy import fetch_row
+from .provider import cached_for_frame
+
+# Most titles a search returns
+SEARCH_LIMIT = 50
+
+
+def _first_positions(keys):
+    positions = {}
+    for position, key in enumerate(keys):
+        positions.setdefault(key, position)
+    return positions
+
+
+def _build_movie_lookup(df):
+    titles = df['original_title'].tolist()
+    years = df['release_year'].tolist()
+    options = sorted(f"{title} ({year})" for title, year in zip(titles, years))
+    return {
+        # (lower-cased title, year) -> first catalog row, like the old boolean mask + iloc[0]
+        'title_year': _first_positions((str(title).lower(), year) for title, year in zip(titles, years)),
+        # "" followed by the sorted "Title (Year)" labels, and each label's position in that list
+        'options': [""] + options,
+        'option_positions': {option: position for position, option in enumerate(options, start=1)},
+    }
+
+
+def _build_people_lookup(people_df):
+    names = people_df['name'].tolist()
+    options = [""] + sorted(names)
+    return {
+        'rows': _first_positions(names),
+        'options': options,
+        'option_positions': {name: position for position, name in enumerate(options)},
+    }
+
+
+def _build_recommendation_options(df):
+    labels = [f"{title} ({year})" for title, year in zip(df['original_title'], df['release_year'])]
+    movie_options = {label: movie_id for label, movie_id in zip(labels, df['id'].tolist())}
+    searchable = sorted((label.lower(), label) for label in movie_options)
+    lowered = [lower for lower, _ in searchable]
+    offsets = []
+    offset = 0
+    for lower in lowered:
+        offsets.append(offset)
+        offset += len(lower) + 1
+    return {
+        # "Title (Year)" -> movie id, in catalog order (a repeated label keeps the last id)
+        'movie_options': movie_options,
+        'genres': sorted(df['genres'].str.split(', ').explode().dropna().unique()),
+        # Search structures: sorted lower-cased labels, and all of them joined for substring scans
+        'search_keys': lowered,
+        'search_labels': [label for _, label in searchable],
+        'search_text': '\n'.join(lowered),
+        'search_offsets': offsets,
+    }
+
+
+def recommendation_options(df):
+    """Movie options, genre options and title search structures of the recommendations tab, built once per frame."""
+    return cached_for_frame(df, 'recommendation_options', _build_recommendation_options)
+
+
+def search_titles(options, query, limit=SEARCH_LIMIT):
+    """Labels matching query (case-insensitive): prefix matches in sorted order, then other substring matches."""
+    query = query.strip().lower()
+    if not query or '\n' in query:
+        return []
+    keys = options['search_keys']
+    labels = options['search_labels']
+    matches = []
+    position = bisect_left(keys, query)
+    while position < len(keys) and len(matches) < limit and keys[position].startswith(query):
+        matches.append(labels[position])
+        position += 1
+    seen = set(matches)
+    text = options['search_text']
+    offsets = options['search_offsets']
+    found = text.find(query)
+    while found != -1 and len(matches) < limit:
+        row = bisect_left(offsets, found + 1) - 1
+        if labels[row] not in seen:
+            seen.add(labels[row])
+            matches.append(labels[row])
+        found = text.find(query, offsets[row + 1] if row + 1 < len(offsets) else len(text))
+    return matches
+
+
+def movie_lookup(df):
+    """Title/year -> row map and the sorted "Title (Year)" options of a catalog, built once per frame."""
+    return cached_for_frame(df, 'movie_lookup', _build_movie_lookup)
+
+
+def people_lookup(people_df):
+    """Name -> row map and the sorted name options of people_details, built once per frame."""
+    return cached_for_frame(people_df, 'people_lookup', _build_people_lookup)
+
+
+def find_movie(df, title, year):
+    """Return the first catalog row with this title (case-insensitive) and year, with all its columns, or None."""
+    position = movie_lookup(df)['title_year'].get((title.lower(), year))
+    return None if position is None else fetch_row(df, position)
+
+
+def find_person(people_df, name):
+    """Return the first people_details row with this name, with all its columns, or None."""
+    position = people_lookup(people_df)['rows'].get(name)
+    return None if position is None else fetch_row(people_df, position)
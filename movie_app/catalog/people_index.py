@@ -0,0 +1,95 @@
+import numpy as np
+from .provider import cached_for_frame, register_frame_updater
+from .storage import splice_rows
+
+# Columns holding comma-joined person names, indexed separately
+ROLES = ('cast', 'directors')
+
+
+def _postings(codes_per_movie, person_count):
+    """Invert movie -> person codes into person -> movie positions (indptr/indices arrays)."""
+    movies = np.repeat(np.arange(len(codes_per_movie), dtype=np.int32), [len(codes) for codes in codes_per_movie])
+    people = np.fromiter((code for codes in codes_per_movie for code in codes), dtype=np.int32, count=len(movies))
+    order = np.lexsort((movies, people))
+    indptr = np.zeros(person_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(people, minlength=person_count), out=indptr[1:])
+    return {'indptr': indptr, 'indices': movies[order]}
+
+
+def build_people_index(movies_df):
+    """Index which catalog rows every person appears in, per role.
+
+    Names are integer-coded once; each role stores person -> movie postings as flat arrays.
+    """
+    codes = {}
+    index = {'codes': codes}
+    per_role = {}
+    for role in ROLES:
+        per_role[role] = [sorted({codes.setdefault(name, len(codes)) for name in value.split(', ') if name})
+                          if isinstance(value, str) else [] for value in movies_df[role].tolist()]
+    for role in ROLES:
+        index[role] = _postings(per_role[role], len(codes))
+    index['names'] = list(codes)
+    return index
+
+
+def _names(value):
+    return {name for name in value.split(', ') if name} if isinstance(value, str) else set()
+
+
+def update_people_index(index, previous, movies_df, positions):
+    """People index of movies_df from the previous frame's, rewriting only the postings of people in changed rows.
+
+    People who no longer appear anywhere keep their code, with empty postings.
+    """
+    codes = dict(index['codes'])
+    replaced = positions[positions < len(previous)]
+    changes = {}
+    for role in ROLES:
+        before = {codes[name] for value in previous[role].iloc[replaced].tolist() for name in _names(value)}
+        after = [sorted({codes.setdefault(name, len(codes)) for name in _names(value)})
+                 for value in movies_df[role].iloc[positions].tolist()]
+        changes[role] = (before, after)
+    updated = {'codes': codes, 'names': list(codes)}
+    for role, (before, after) in changes.items():
+        postings = index[role]
+        added_people = np.fromiter((code for row in after for code in row), dtype=np.int64)
+        added_movies = np.repeat(positions, [len(row) for row in after])
+        people = np.union1d(np.fromiter(before, dtype=np.int64, count=len(before)), added_people)
+        # Old postings of the affected people, without the changed movies, plus the new ones
+        known = people[people < len(postings['indptr']) - 1]
+        starts = postings['indptr'][known]
+        lengths = postings['indptr'][known + 1] - starts
+        gather = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+        movies = postings['indices'][gather]
+        kept = ~np.isin(movies, positions)
+        person = np.concatenate([np.repeat(known, lengths)[kept], added_people])
+        movie = np.concatenate([movies[kept], added_movies]).astype(np.int32)
+        order = np.lexsort((movie, person))
+        offsets = np.zeros(len(people) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(np.searchsorted(people, person), minlength=len(people)), out=offsets[1:])
+        updated[role] = dict(zip(('indptr', 'indices'), splice_rows(postings['indptr'], postings['indices'], people,
+                                                                   offsets, movie[order], len(codes))))
+    return updated
+
+
+register_frame_updater('people_index', update_people_index)
+
+
+def get_people_index(movies_df):
+    """Return the person -> movies index of a catalog frame, built once per frame."""
+    return cached_for_frame(movies_df, 'people_index', build_people_index)
+
+
+def filmography(index, name, role='cast'):
+    """Catalog positions (in catalog order) of the movies where name appears in the given role."""
+    code = index['codes'].get(name)
+    if code is None:
+        return np.empty(0, dtype=np.int32)
+    postings = index[role]
+    return postings['indices'][postings['indptr'][code]:postings['indptr'][code + 1]]
+
+
+def get_people_names(people_df):
+    """Set of the names in people_details, built once per frame for membership checks."""
+    return cached_for_frame(people_df, 'people_names', lambda frame: frozenset(frame['name'].dropna().tolist()))
@@ -0,0 +1,207 @@
+import json
+import os
+import threading
+import time
+import weakref
+import numpy as np
+import pandas as pd
+from instrumentation import count
+
+# Set to "arrow" to serve frames from a memory-mapped Arrow file shared by every server worker,
+# or to "compact" to load through the integer-coded catalog file written by catalog.storage
+BACKEND = os.environ.get('MOVIEREX_DATA_BACKEND', 'parquet')
+
+# One entry per file path (and column projection), shared by every Streamlit session of this process
+_datasets = {}
+_datasets_lock = threading.Lock()
+_path_locks = {}
+
+# Structures derived from a frame (features, indexes, option lists) live as long as the frame
+_frame_cache = {}
+_frame_cache_lock = threading.Lock()
+
+# name -> updater(previous value, previous frame, frame, positions) for derived structures
+# that can follow an append/upsert written by catalog.updates instead of being rebuilt
+_frame_updaters = {}
+
+# Schema metadata key of the change journal written by catalog.updates
+JOURNAL_KEY = b'movierex.update'
+
+# Schema metadata key of the source file version (mtime_ns, size) a derived copy was written from
+SOURCE_KEY = b'movierex.source'
+
+# Load timings, most recent last
+_load_stats = []
+
+
+def _file_version(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def source_metadata(path):
+    """Schema metadata marking a copy as written from the current version of path; take it before reading path."""
+    return {SOURCE_KEY: json.dumps(_file_version(path)).encode()}
+
+
+def is_current_copy(path, schema):
+    """Whether a copy with this schema was written from the current version of path.
+
+    Any other mtime or size counts as stale, so a source replaced by an older file is picked up too.
+    """
+    return (schema.metadata or {}).get(SOURCE_KEY) == source_metadata(path)[SOURCE_KEY]
+
+
+def _arrow_path(path):
+    return os.path.splitext(path)[0] + '.arrow'
+
+
+def _ipc_schema(path):
+    import pyarrow as pa
+
+    with pa.memory_map(path, 'r') as source:
+        return pa.ipc.open_file(source).schema
+
+
+def _read_arrow(path, columns=None):
+    """Read through an uncompressed Arrow IPC copy of the Parquet file, memory-mapped so pages are shared."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrow_path = _arrow_path(path)
+    if not os.path.exists(arrow_path) or not is_current_copy(path, _ipc_schema(arrow_path)):
+        metadata = source_metadata(path)
+        table = pq.read_table(path)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+        temporary_path = f"{arrow_path}.{os.getpid()}.tmp"
+        with pa.OSFile(temporary_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(temporary_path, arrow_path)
+    table = pa.ipc.open_file(pa.memory_map(arrow_path, 'r')).read_all()
+    if columns is not None:
+        table = table.select(columns)
+    # split_blocks keeps numeric columns as zero-copy views of the mapped pages where possible
+    return table.to_pandas(split_blocks=True)
+
+
+def _read(path, backend, columns):
+    if backend == 'arrow':
+        return _read_arrow(path, columns)
+    if backend == 'compact':
+        from .storage import load_compact
+        return load_compact(path, columns)
+    return pd.read_parquet(path, columns=columns)
+
+
+def _existing_columns(path, columns):
+    """The requested columns that the file has, in file order."""
+    import pyarrow.parquet as pq
+
+    return [name for name in pq.read_schema(path).names if name in columns]
+
+
+def load_dataset(path, backend=None, columns=None):
+    """Return the process-wide DataFrame for a Parquet file, reloading it only when the file changes.
+
+    columns restricts the frame to those columns (ones missing from the file are ignored);
+    each distinct projection is a separate shared frame. The frame is shared by every
+    session and must be treated as read-only.
+    """
+    backend = backend or BACKEND
+    start = time.perf_counter()
+    version = _file_version(path)
+    key = path if columns is None else (path, tuple(columns))
+    with _datasets_lock:
+        lock = _path_locks.setdefault(key, threading.Lock())
+    with lock:
+        entry = _datasets.get(key)
+        if entry is None or entry['version'] != version or entry['backend'] != backend:
+            frame = _read(path, backend, None if columns is None else _existing_columns(path, columns))
+            if entry is not None and entry['backend'] == backend:
+                _carry_over(path, entry['frame'], frame, _journal_positions(path, entry['version'], version, len(frame)))
+            entry = {'frame': frame, 'path': path, 'version': version, 'backend': backend}
+            _datasets[key] = entry
+            _record(path, 'load', start)
+        else:
+            _record(path, 'hit', start)
+    return entry['frame']
+
+
+def dataset_version(df):
+    """Return (path, mtime_ns, size) for a frame served by load_dataset, or None for other frames."""
+    for entry in list(_datasets.values()):
+        if entry['frame'] is df:
+            return (entry['path'],) + entry['version']
+    return None
+
+
+def _record(path, kind, start):
+    count(f"dataset.{kind}")
+    _load_stats.append({'path': os.path.basename(path), 'kind': kind, 'seconds': time.perf_counter() - start})
+    del _load_stats[:-100]
+
+
+def load_stats():
+    """Recent cold loads ('load'), warm lookups ('hit') and incremental updates ('update') with their durations."""
+    return list(_load_stats)
+
+
+def register_frame_updater(name, updater):
+    """Derive the cached_for_frame value called name of a reloaded frame from the previous frame's value.
+
+    updater(value, previous, frame, positions) gets the previous frame's value, both frames and the
+    sorted positions of the rows that changed or were appended; every other row is unchanged and
+    keeps its position. Updaters run in registration order, so later ones can use earlier results.
+    """
+    _frame_updaters[name] = updater
+
+
+def _journal_positions(path, previous_version, version, rows):
+    """Changed row positions when the file at path was written by catalog.updates from previous_version, else None."""
+    import pyarrow.parquet as pq
+
+    metadata = pq.read_schema(path).metadata or {}
+    if JOURNAL_KEY not in metadata:
+        return None
+    journal = json.loads(metadata[JOURNAL_KEY])
+    # The frame, the journal and the version must all describe the same file
+    if tuple(journal['previous']) != previous_version or journal['rows'] != rows or _file_version(path) != version:
+        return None
+    return np.asarray(journal['positions'], dtype=np.int64)
+
+
+def _carry_over(path, previous, frame, positions):
+    """Seed the cache of a reloaded frame with structures updated from the previous frame, when the change is journaled."""
+    if positions is None:
+        return
+    start = time.perf_counter()
+    with _frame_cache_lock:
+        entry = _frame_cache.get(id(previous))
+        values = dict(entry[1]) if entry is not None and entry[0]() is previous else {}
+        seeded = _frame_cache.get(id(frame))
+    if seeded is not None and seeded[0]() is frame:
+        # The loader registered its own structures (compact files), which updated ones would not match
+        return
+    for name, updater in _frame_updaters.items():
+        if name in values:
+            value = updater(values[name], previous, frame, positions)
+            cached_for_frame(frame, name, lambda _: value)
+    _record(path, 'update', start)
+
+
+def cached_for_frame(df, name, builder):
+    """Return builder(df), computed once per DataFrame object and cached under name."""
+    with _frame_cache_lock:
+        entry = _frame_cache.get(id(df))
+        if entry is None or entry[0]() is not df:
+            for key in [key for key, (ref, _, _) in _frame_cache.items() if ref() is None]:
+                del _frame_cache[key]
+            entry = (weakref.ref(df), {}, threading.RLock())
+            _frame_cache[id(df)] = entry
+    _, values, lock = entry
+    if name not in values:
+        with lock:
+            if name not in values:
+                values[name] = builder(df)
+                count(f"built.{name}")
+    return values[name]
@@ -0,0 +1,260 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from .provider import cached_for_frame, is_current_copy, register_frame_updater, source_metadata
+
+# Comma-joined columns stored as integer-coded lists
+LIST_COLUMNS = ('genres', 'keywords', 'cast', 'directors', 'spoken_languages', 'recommendations', 'similar_movies')
+SEPARATOR = ', '
+
+# Other string columns with at most this share of distinct values are stored dictionary-encoded
+CATEGORY_RATIO = 0.5
+
+# Schema metadata key holding the original (legacy) schema
+_SCHEMA_KEY = b'movierex.legacy_schema'
+
+
+def compact_path(path):
+    return os.path.splitext(path)[0] + '.compact.arrow'
+
+
+def _split(array):
+    """Split a string array into a list<dictionary<int32, string>> array; nulls stay null."""
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+    tokens = pc.split_pattern(array, SEPARATOR)
+    return pa.ListArray.from_arrays(tokens.offsets, tokens.flatten().dictionary_encode(), mask=tokens.is_null())
+
+
+def _narrow(array):
+    """The narrowest type that holds every value of a numeric array exactly."""
+    if pa.types.is_integer(array.type):
+        bounds = pc.min_max(array)
+        low, high = bounds['min'].as_py(), bounds['max'].as_py()
+        if low is None:
+            return array
+        for candidate in (pa.int8(), pa.int16(), pa.int32()):
+            info = np.iinfo(candidate.to_pandas_dtype())
+            if info.min <= low and high <= info.max:
+                return array.cast(candidate)
+    elif pa.types.is_float64(array.type):
+        values = array.to_numpy(zero_copy_only=False)
+        if np.array_equal(values.astype(np.float32).astype(np.float64), values, equal_nan=True):
+            return array.cast(pa.float32())
+    return array
+
+
+def _compact_array(name, array):
+    if not pa.types.is_string(array.type) and not pa.types.is_large_string(array.type):
+        return _narrow(array)
+    if name in LIST_COLUMNS:
+        return _split(array)
+    if len(array) and pc.count_distinct(array).as_py() <= CATEGORY_RATIO * len(array):
+        return array.dictionary_encode()
+    return array
+
+
+def compact_table(df):
+    """Encode a catalog frame: list columns as offsets + integer codes, repetitive strings as dictionaries,
+    numbers in their narrowest exact type. The original schema is kept for rebuilding the legacy frame."""
+    table = pa.Table.from_pandas(df)
+    columns = [_compact_array(name, table[name].combine_chunks()) for name in table.column_names]
+    metadata = {_SCHEMA_KEY: table.schema.serialize().to_pybytes()}
+    return pa.Table.from_arrays(columns, names=table.column_names).replace_schema_metadata(metadata)
+
+
+def write_compact(df, path, metadata=None):
+    """Write the compact form of df as an uncompressed Arrow IPC file, atomically; metadata is added to its schema."""
+    table = compact_table(df)
+    if metadata:
+        table = table.replace_schema_metadata({**table.schema.metadata, **metadata})
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(temporary_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(temporary_path, path)
+    return table
+
+
+def read_compact(path):
+    """Memory-map a compact catalog file; the returned table's buffers point into the file."""
+    return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+
+def _encoded_list(array):
+    """offsets (n + 1), codes into vocabulary, and a validity mask of a list<dictionary> array."""
+    array = array.combine_chunks() if isinstance(array, pa.ChunkedArray) else array
+    offsets = array.offsets.to_numpy()
+    values = array.values
+    return {'vocabulary': values.dictionary.to_pylist(), 'offsets': offsets - offsets[0],
+            'codes': values.indices.to_numpy()[offsets[0]:offsets[-1]], 'valid': array.is_valid().to_numpy(zero_copy_only=False)}
+
+
+def encoded_from_table(table):
+    """Encoded list columns of a compact table, without decoding any strings."""
+    return {name: _encoded_list(table[name]) for name in LIST_COLUMNS if name in table.column_names}
+
+
+def legacy_frame(table, columns=None):
+    """Rebuild the original DataFrame (same columns, values and dtypes) from a compact table.
+
+    columns limits the frame to those columns; only they are decoded.
+    """
+    schema = pa.ipc.read_schema(pa.py_buffer(table.schema.metadata[_SCHEMA_KEY]))
+    if columns is not None:
+        schema = pa.schema([field for field in schema if field.name in columns], metadata=schema.metadata)
+    columns = []
+    for field in schema:
+        array = table[field.name].combine_chunks()
+        if pa.types.is_list(array.type):
+            values = array.values
+            words = pa.ListArray.from_arrays(array.offsets, values.dictionary.take(values.indices), mask=array.is_null())
+            array = pc.binary_join(words, pa.scalar(SEPARATOR, values.dictionary.type))
+        elif pa.types.is_dictionary(array.type):
+            array = array.dictionary_decode()
+        columns.append(array.cast(field.type))
+    return pa.Table.from_arrays(columns, schema=schema).to_pandas()
+
+
+def _encode_lists(df):
+    return {name: _encoded_list(_split(pa.array(df[name], type=pa.string(), from_pandas=True)))
+            for name in LIST_COLUMNS if name in df.columns}
+
+
+def encoded_lists(df):
+    """Integer-coded list columns of a catalog frame ({name: vocabulary, offsets, codes, valid}).
+
+    Frames loaded from a compact file come with these arrays already; other frames are
+    encoded once per frame.
+    """
+    return cached_for_frame(df, 'encoded_lists', _encode_lists)
+
+
+def splice_rows(offsets, values, positions, delta_offsets, delta_values, size):
+    """Replace or append rows of a ragged (offsets, values) array, e.g. list codes or CSR indices.
+
+    Row positions[i] gets the values of delta row i; positions at or past the end are appended,
+    so the result has size rows. Every other row keeps its position and values.
+    """
+    old_lengths = np.diff(offsets)
+    lengths = np.zeros(size, dtype=np.int64)
+    lengths[:len(old_lengths)] = old_lengths
+    lengths[positions] = np.diff(delta_offsets)
+    starts = np.zeros(size, dtype=np.int64)
+    starts[:len(old_lengths)] = offsets[:-1]
+    starts[positions] = len(values) + np.asarray(delta_offsets[:-1], dtype=np.int64)
+    new_offsets = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_offsets[1:])
+    source = np.concatenate([values, np.asarray(delta_values, dtype=values.dtype)])
+    return new_offsets, source[np.repeat(starts - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])]
+
+
+def take_rows(column, positions):
+    """The rows at positions of an encoded list column, with the same vocabulary."""
+    offsets = column['offsets'].astype(np.int64)
+    lengths = np.diff(offsets)[positions]
+    new_offsets = np.zeros(len(positions) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_offsets[1:])
+    gather = np.repeat(offsets[positions] - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+    return {'vocabulary': column['vocabulary'], 'offsets': new_offsets, 'codes': column['codes'][gather],
+            'valid': column['valid'][positions]}
+
+
+def update_encoded_lists(encoded, previous, frame, positions):
+    """Encoded list columns of frame from those of previous, re-encoding only the rows at positions.
+
+    New tags are appended to the vocabularies, so existing codes keep their meaning. The empty
+    tag is added first, at the position tag matrices already use for missing values. Each column
+    keeps its word -> code lookup for the next update.
+    """
+    updated = {}
+    for name, column in encoded.items():
+        delta = _encoded_list(_split(pa.array(frame[name].iloc[positions], type=pa.string(), from_pandas=True)))
+        if 'lookup' in column:
+            lookup = dict(column['lookup'])
+        else:
+            lookup = {word: code for code, word in enumerate(column['vocabulary'])}
+        lookup.setdefault('', len(lookup))
+        codes = np.array([lookup.setdefault(word, len(lookup)) for word in delta['vocabulary']], dtype=np.int64)
+        offsets, values = splice_rows(column['offsets'], column['codes'], positions, delta['offsets'],
+                                      codes[delta['codes']], len(frame))
+        valid = np.ones(len(frame), dtype=bool)
+        valid[:len(column['valid'])] = column['valid']
+        valid[positions] = delta['valid']
+        updated[name] = {'vocabulary': list(lookup), 'offsets': offsets, 'codes': values, 'valid': valid, 'lookup': lookup}
+    return updated
+
+
+register_frame_updater('encoded_lists', update_encoded_lists)
+
+
+def load_compact(path, columns=None):
+    """Load the legacy frame for a Parquet catalog through its compact file, writing that file when it is missing or stale.
+
+    The file is stale when it was written from another version (mtime, size) of the Parquet file. The encoded list columns are registered for the frame, so encoded_lists() needs no string splitting.
+    """
+    target = compact_path(path)
+    table = read_compact(target) if os.path.exists(target) else None
+    if table is None or not is_current_copy(path, table.schema):
+        metadata = source_metadata(path)
+        write_compact(pd.read_parquet(path), target, metadata)
+        table = read_compact(target)
+    frame = legacy_frame(table, columns)
+    encoded = encoded_from_table(table)
+    cached_for_frame(frame, 'encoded_lists', lambda _: encoded)
+    return frame
+
+
+def _encoded_bytes(encoded):
+    return sum(column['offsets'].nbytes + column['codes'].nbytes + column['valid'].nbytes +
+               sum(len(word.encode()) for word in column['vocabulary']) for column in encoded.values())
+
+
+def _timed(function, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return result, round(best, 3)
+
+
+def footprint_report(path):
+    """Write the compact file for a Parquet catalog and compare sizes and load times with the Parquet file."""
+    metadata = source_metadata(path)
+    frame, parquet_seconds = _timed(lambda: pd.read_parquet(path))
+    target = compact_path(path)
+    # Marked like load_compact's own copies, so the app loads this file instead of writing it again
+    table = write_compact(frame, target, metadata)
+    encoded, encoded_seconds = _timed(lambda: encoded_from_table(read_compact(target)))
+    rebuilt, legacy_seconds = _timed(lambda: legacy_frame(read_compact(target)))
+    list_columns = [name for name in LIST_COLUMNS if name in frame.columns]
+    return {
+        'rows': len(frame),
+        'legacy_frame_matches': bool(rebuilt.equals(frame)),
+        'parquet_file_bytes': os.path.getsize(path),
+        'compact_file_bytes': os.path.getsize(target),
+        'frame_memory_bytes': int(frame.memory_usage(deep=True, index=False).sum()),
+        'compact_table_bytes': table.nbytes,
+        'list_columns_frame_bytes': int(frame[list_columns].memory_usage(deep=True, index=False).sum()),
+        'list_columns_encoded_bytes': _encoded_bytes(encoded),
+        'parquet_load_seconds': parquet_seconds,
+        'compact_encoded_load_seconds': encoded_seconds,
+        'compact_legacy_frame_seconds': legacy_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the compact catalog file next to a Parquet catalog and report the savings.")
+    parser.add_argument('parquet', nargs='+', help="catalog Parquet files, e.g. movies_details.parquet")
+    args = parser.parse_args()
+    for path in args.parquet:
+        print(json.dumps(dict(path=path, **footprint_report(path)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
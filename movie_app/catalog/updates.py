@@ -0,0 +1,185 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from .lazy import MOVIE_COLUMNS, ROW_GROUP_ROWS, details_path
+from .provider import JOURNAL_KEY, load_dataset, load_stats, source_metadata
+
+
+def _read_rows(path):
+    return pd.read_csv(path) if path.endswith('.csv') else pd.read_parquet(path)
+
+
+def _write_atomically(table, path, **options):
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table, temporary_path, **options)
+    os.replace(temporary_path, path)
+
+
+def upsert(path, rows, key='id'):
+    """Replace the rows of a catalog Parquet file whose key is in rows, and append the others.
+
+    Existing rows keep their position, which is their row id; new rows are appended in the order
+    given. Columns rows does not have keep their values (nulls in appended rows). The file is
+    replaced atomically and records which positions changed relative to the version it replaced,
+    so processes reloading it update their derived structures instead of rebuilding them.
+    Returns the counts and the sorted changed positions.
+    """
+    previous = os.stat(path)
+    table = pq.read_table(path)
+    unknown = [name for name in rows.columns if name not in table.column_names]
+    if unknown:
+        raise ValueError(f"Columns not in {path}: {', '.join(unknown)}")
+    rows = rows.drop_duplicates(key, keep='last').reset_index(drop=True)
+
+    size = table.num_rows
+    existing = pd.Series(np.arange(size), index=table[key].to_numpy())
+    found = existing[~existing.index.duplicated()].reindex(rows[key].to_numpy()).to_numpy()
+    appended = np.isnan(found)
+    positions = np.where(appended, 0, found).astype(np.int64)
+    positions[appended] = size + np.arange(appended.sum())
+    total = size + int(appended.sum())
+
+    columns = []
+    for field in table.schema:
+        take = np.arange(total)
+        if field.name in rows.columns:
+            values = pa.array(rows[field.name], from_pandas=True).cast(field.type)
+            if isinstance(values, pa.ChunkedArray):
+                values = values.combine_chunks()  # Arrow-backed pandas columns come chunked
+            take[positions] = size + np.arange(len(rows))
+        else:
+            values = pa.nulls(len(rows), field.type)
+            take[positions[appended]] = size + np.flatnonzero(appended)
+        columns.append(pa.concat_arrays([table[field.name].combine_chunks(), values]).take(pa.array(take)))
+
+    changed = np.unique(positions)
+    metadata = dict(table.schema.metadata or {})
+    metadata[JOURNAL_KEY] = json.dumps({'previous': [previous.st_mtime_ns, previous.st_size], 'rows': total,
+                                        'positions': changed.tolist()}).encode()
+    updated = pa.Table.from_arrays(columns, schema=table.schema.with_metadata(metadata))
+    _write_atomically(updated, path)
+    if os.path.exists(details_path(path)):
+        # Refresh the row-group copy too, marked with the version just written, so the first detail fetch does not rewrite it
+        details = updated.replace_schema_metadata({**metadata, **source_metadata(path)})
+        _write_atomically(details, details_path(path), row_group_size=ROW_GROUP_ROWS)
+    return {'rows': total, 'updated': int((~appended).sum()), 'appended': int(appended.sum()), 'positions': changed}
+
+
+def _derived(df):
+    """Build (or fetch) every structure with an incremental updater; returns the seconds it took."""
+    from .people_index import get_people_index
+    from recommendations.filter_index import get_filter_index
+    from recommendations.similarity_engine import get_features
+
+    start = time.perf_counter()
+    get_features(df)
+    get_filter_index(df)
+    get_people_index(df)
+    return time.perf_counter() - start
+
+
+def _rebuild_seconds(df):
+    from .people_index import build_people_index
+    from .storage import _encode_lists
+    from recommendations.filter_index import build_filter_index
+    from recommendations.similarity_engine import build_features
+
+    start = time.perf_counter()
+    _encode_lists(df)
+    for build in (build_features, build_filter_index, build_people_index):
+        build(df)
+    return time.perf_counter() - start
+
+
+def _delta(df, count, next_id, rng):
+    """count rows: half existing movies with reshuffled tags, half new movies cloned from random rows."""
+    changed = df.iloc[rng.choice(len(df), count - count // 2, replace=False)].copy()
+    for name in ('genres', 'keywords', 'cast'):
+        changed[name] = df[name].iloc[rng.choice(len(df), len(changed))].to_numpy()
+    added = df.iloc[rng.choice(len(df), count // 2)].copy()
+    added['id'] = np.arange(next_id, next_id + len(added))
+    added['original_title'] = [f"New Release {movie_id}" for movie_id in added['id']]
+    return pd.concat([changed, added])
+
+
+def benchmark(path, counts, neighbors=True, seed=0):
+    """Time upserts of growing size against rebuilding every derived structure, on a copy of a catalog.
+
+    The copy is loaded and its structures built once, as a running app would have them. Each
+    upsert is then reloaded through load_dataset, which updates the structures, and the neighbor
+    index is updated for the changed positions.
+    """
+    from individual_movies.neighbor_index import build_neighbor_index, update_neighbor_index
+
+    rng = np.random.default_rng(seed)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        copy = os.path.join(directory, os.path.basename(path))
+        shutil.copyfile(path, copy)
+        df = load_dataset(copy, columns=MOVIE_COLUMNS)
+        summary = {'rows': len(df), 'build_seconds': round(_derived(df), 3)}
+        if neighbors:
+            start = time.perf_counter()
+            index = build_neighbor_index(df)
+            summary['neighbors_build_seconds'] = round(time.perf_counter() - start, 3)
+        results.append(summary)
+        for count in counts:
+            rows = _delta(pd.read_parquet(copy), count, int(df['id'].max()) + 1, rng)
+            start = time.perf_counter()
+            changes = upsert(copy, rows)
+            written = time.perf_counter() - start
+            start = time.perf_counter()
+            df = load_dataset(copy, columns=MOVIE_COLUMNS)
+            loaded = time.perf_counter() - start
+            update = next((stat['seconds'] for stat in reversed(load_stats()) if stat['kind'] == 'update'), 0.0)
+            result = {'delta': count, 'rows': changes['rows'], 'write_seconds': round(written, 3),
+                      'reload_seconds': round(loaded, 3), 'update_seconds': round(update + _derived(df), 3),
+                      'rebuild_seconds': round(_rebuild_seconds(df), 3)}
+            if neighbors:
+                start = time.perf_counter()
+                index, stats = update_neighbor_index(df, index, changes['positions'])
+                result['neighbors_update_seconds'] = round(time.perf_counter() - start, 3)
+                result['neighbors_rescored'] = stats['rescored']
+            results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upsert rows into a catalog Parquet file, or benchmark incremental updates.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    apply = commands.add_parser('upsert', help="replace rows with a known key and append the others")
+    apply.add_argument('catalog', help="e.g. movies_details.parquet or people_details.parquet")
+    apply.add_argument('rows', help="Parquet or CSV file with the new and changed rows")
+    apply.add_argument('--key', default='id', help="column identifying a row ('name' for people_details)")
+    apply.add_argument('--neighbors', help="neighbor index (movies_neighbors.npz) to update for the changed movies")
+    measure = commands.add_parser('benchmark', help="compare incremental updates with full rebuilds on a copy")
+    measure.add_argument('catalog')
+    measure.add_argument('--deltas', default='10,100,1000', help="comma-separated upsert sizes")
+    measure.add_argument('--no-neighbors', action='store_true', help="skip the neighbor index")
+    args = parser.parse_args()
+
+    if args.command == 'benchmark':
+        for result in benchmark(args.catalog, [int(count) for count in args.deltas.split(',')], not args.no_neighbors):
+            print(json.dumps(result))
+        return
+    changes = upsert(args.catalog, _read_rows(args.rows), args.key)
+    print(f"{args.catalog}: {changes['updated']} rows updated, {changes['appended']} appended, {changes['rows']} in total")
+    if args.neighbors:
+        from individual_movies.neighbor_index import update_neighbor_index, save_neighbor_index
+
+        with np.load(args.neighbors) as data:
+            index = {name: data[name] for name in data.files}
+        index, stats = update_neighbor_index(load_dataset(args.catalog, columns=MOVIE_COLUMNS), index, changes['positions'])
+        save_neighbor_index(index, args.neighbors)
+        print(f"Updated {args.neighbors}: {stats}")
+
+
+if __name__ == "__main__":
+    main()
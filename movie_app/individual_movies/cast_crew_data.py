@@ -1,5 +1,7 @@
 import streamlit as st
 import pandas as pd
+from catalog.images import image_source
+from catalog.lookup import find_person, people_lookup
 from .utils import create_movie_dropdown
 
 def display_people_details(df, movies_df):
@@ -17,8 +19,8 @@ def display_people_details(df, movies_df):
     st.markdown("<h4 style='margin-bottom: 5px;'>Search All Actors</h4>", unsafe_allow_html=True)
 
     # Dropdown with all people names
-    all_people_names = [""] + sorted(df['name'].tolist())
-    selected_person = st.selectbox("", all_people_names, index=all_people_names.index(selected_person) if selected_person in all_people_names else 0)
+    lookup = people_lookup(df)
+    selected_person = st.selectbox("", lookup['options'], index=lookup['option_positions'].get(selected_person, 0))
 
     # Update query parameters when a person is selected
     if selected_person and not st.session_state.rerun_done:
@@ -28,13 +30,13 @@ def display_people_details(df, movies_df):
 
     # Display selected person details
     if selected_person:
-        person_details = df[df['name'] == selected_person].iloc[0]
+        person_details = find_person(df, selected_person)
 
         # Create columns for image and details
         col1, col2 = st.columns([1, 2])
 
         with col1:
-            st.image(person_details['images'].split(', ')[0], width=200)
+            st.image(image_source(person_details['images'].split(', ')[0], 200), width=200)
 
         with col2:
             st.markdown(f"**Name:** {person_details['name']}")
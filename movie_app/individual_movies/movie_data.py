@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
 import urllib.parse
+from catalog.lookup import movie_lookup
 from .cast_crew_data import display_people_details
 from .movie_details import display_movie_details
 from .utils import create_person_dropdown
@@ -22,14 +23,13 @@ def movie_info_tab(df, people_df, movies_df):
     if movie_from_url:
         movie_from_url = urllib.parse.unquote(movie_from_url)
 
-    # Create a list of movie titles with years
-    all_movie_titles_with_year = [f"{title} ({year})" for title, year in zip(df['original_title'], df['release_year'])]
-    all_movie_titles_with_year_sorted = sorted(all_movie_titles_with_year)
+    # Sorted "Title (Year)" options, built once per catalog
+    lookup = movie_lookup(df)
 
     # Dropdown with all movie titles with years
-    selected_movie_with_year = st.selectbox("", [""] + all_movie_titles_with_year_sorted,
-                                            index=all_movie_titles_with_year_sorted.index(
-                                                f"{movie_from_url} ({year_from_url})") + 1 if movie_from_url and year_from_url else 0)
+    selected_movie_with_year = st.selectbox("", lookup['options'],
+                                            index=lookup['option_positions'].get(
+                                                f"{movie_from_url} ({year_from_url})", 0) if movie_from_url and year_from_url else 0)
 
     # Extract the movie title and year from the selected option
     if selected_movie_with_year:
@@ -1,23 +1,28 @@
 # movie_details.py
 import streamlit as st
 import pandas as pd
-from .similarity import calculate_similarity, get_similarity_explanation, get_recommendations_by_name
+from catalog.images import image_source
+from catalog.lazy import complete_rows
+from catalog.lookup import find_movie
+from instrumentation import span, timed
+from .similarity import get_recommendations_by_name
+from .neighbor_index import get_neighbors
 from .utils import create_person_dropdown, create_movie_buttons
 
+@timed()
 def display_movie_details(movie_title, movie_year, df, people_df):
     """Display the details of the selected movie."""
-    movie_details = df[(df['original_title'].str.lower() == movie_title.lower()) & (df['release_year'] == movie_year)]
-    if movie_details.empty:
+    movie_details = find_movie(df, movie_title, movie_year)
+    if movie_details is None:
         st.error("Movie details not found.")
         return
-    movie_details = movie_details.iloc[0]
 
     # Create two columns
     col1, col2 = st.columns([1, 3])
 
     # Display tagline and poster in the first column
     with col1:
-        st.image(movie_details['poster_path'], use_container_width=True)
+        st.image(image_source(movie_details['poster_path'], 200), use_container_width=True)
         st.markdown(f"<p style='font-size:10px;'>{movie_details['tagline']}</p>", unsafe_allow_html=True)
 
     # Display movie details in the second column
@@ -101,9 +106,14 @@ def display_movie_details(movie_title, movie_year, df, people_df):
 
     # Row 6: Recommendations and Similar Movies
     st.markdown("<div class='tiny-header'>Recommendations and Similar Movies</div>", unsafe_allow_html=True)
-    recommendations = get_recommendations_by_name(movie_details['original_title'], df)
+    with span('neighbors'):
+        recommendations = get_neighbors(movie_details, df)
+    if recommendations is None:
+        # Fall back to a live scan when the neighbor index has not been built for this movie
+        recommendations = get_recommendations_by_name(movie_details['original_title'], df)
     if not recommendations.empty:
-        create_movie_buttons(recommendations, movie_details)
+        with span('render_recommendations'):
+            create_movie_buttons(complete_rows(df, recommendations.head(5)), movie_details, df)
     # Row 7: Cast
     st.markdown("<div class='tiny-header'>Cast</div>", unsafe_allow_html=True)
     st.markdown(f"<div class='element small-button'>{create_person_dropdown(', '.join(movie_details['cast'].split(', ')[:9]), people_df)}</div>", unsafe_allow_html=True)
\ No newline at end of file
@@ -0,0 +1,204 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from recommendations.similarity_engine import COMPONENTS, WEIGHT_PROFILES, get_features, id_positions, seed_scores
+
+# Number of neighbors stored per movie; the detail page shows at most 5 of them
+NEIGHBOR_COUNT = 10
+
+# The index lives next to movies_details.parquet
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'movies_neighbors.npz')
+
+# Columns that feed the detail-page scores; a change in any of them invalidates a movie's neighbors
+SCORING_COLUMNS = ['id', 'original_title', 'genres', 'keywords', 'directors', 'cast',
+                   'recommendations', 'similar_movies', 'belongs_to_id']
+
+# Upper bound on the size of a (sources x catalog) score block
+BLOCK_CELLS = 2 ** 24
+
+# Weight profile the stored neighbors are ranked with
+PROFILE = 'details'
+
+_loaded_index = {}
+
+
+def _row_hashes(df):
+    return pd.util.hash_pandas_object(df[SCORING_COLUMNS], index=False).to_numpy()
+
+
+def _profile_weights(profile=PROFILE):
+    """The profile's weights per component (0 when unused), stored with the index to detect stale files."""
+    weights = WEIGHT_PROFILES[profile]['weights']
+    return np.array([weights.get(name, 0.0) for name in COMPONENTS] + [WEIGHT_PROFILES[profile]['excluded_score']])
+
+
+def pair_scores(features, sources, candidates=None):
+    """Detail-page similarity of every (source, candidate) pair, as a (sources x candidates) array.
+
+    candidates=None scores every catalog movie.
+    """
+    return seed_scores(features, sources, candidates, PROFILE).T
+
+
+def _top_neighbors(candidate_ids, scores, count):
+    """Keep the count best (id, score) pairs of every row, best first; pads with id -1."""
+    count = min(count, scores.shape[1])
+    best = np.argpartition(-scores, count - 1, axis=1)[:, :count]
+    best.sort(axis=1)
+    order = np.argsort(-np.take_along_axis(scores, best, axis=1), axis=1, kind='stable')
+    best = np.take_along_axis(best, order, axis=1)
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    best_ids = np.take_along_axis(candidate_ids, best, axis=1) if candidate_ids.ndim == 2 else candidate_ids[best]
+    best_ids = np.where(np.isfinite(best_scores), best_ids, -1)
+    return best_ids, best_scores.astype(np.float32)
+
+
+def _rank_rows(features, rows, count):
+    """Score the given rows against the whole catalog and keep their top neighbors."""
+    everything = np.arange(len(features['ids']))
+    neighbor_ids = np.full((len(rows), count), -1, dtype=np.int64)
+    neighbor_scores = np.full((len(rows), count), -np.inf, dtype=np.float32)
+    step = max(1, BLOCK_CELLS // max(1, len(everything)))
+    for start in range(0, len(rows), step):
+        block = rows[start:start + step]
+        scores = pair_scores(features, block)
+        scores[np.arange(len(block)), block] = -np.inf  # a movie is never its own neighbor
+        ids, best = _top_neighbors(features['ids'], scores, count)
+        neighbor_ids[start:start + len(block), :ids.shape[1]] = ids
+        neighbor_scores[start:start + len(block), :best.shape[1]] = best
+    return neighbor_ids, neighbor_scores
+
+
+def build_neighbor_index(df, count=NEIGHBOR_COUNT):
+    """Compute the top neighbors of every movie in the catalog."""
+    features = get_features(df)
+    neighbor_ids, neighbor_scores = _rank_rows(features, np.arange(len(df)), count)
+    return {'ids': features['ids'].astype(np.int64), 'row_hashes': _row_hashes(df), 'profile': _profile_weights(),
+            'neighbor_ids': neighbor_ids, 'neighbor_scores': neighbor_scores}
+
+
+def _follows(index, ids, positions):
+    """True when df only changed index's catalog at positions (as catalog.updates.upsert does)."""
+    kept = np.ones(len(index['ids']), dtype=bool)
+    kept[positions[positions < len(kept)]] = False
+    return len(ids) >= len(kept) and np.array_equal(index['ids'][kept], ids[:len(kept)][kept])
+
+
+def update_neighbor_index(df, index, positions=None):
+    """Bring an existing index up to date with df, rescoring only the movies affected by the changes.
+
+    Added or modified movies are ranked against the whole catalog. Movies whose neighbor list
+    pointed at a changed or removed movie are ranked again too. Every other movie only gets the
+    changed movies merged into its existing list. An index ranked with other weights is rebuilt.
+
+    positions, the rows catalog.updates.upsert changed, saves hashing every row to find them.
+    """
+    count = index['neighbor_ids'].shape[1]
+    if 'profile' not in index or not np.array_equal(index['profile'], _profile_weights()):
+        return build_neighbor_index(df, count), {'changed': len(df), 'removed': 0, 'rescored': len(df), 'merged': 0}
+    features = get_features(df)
+    ids = features['ids'].astype(np.int64)
+    if positions is not None and _follows(index, ids, positions):
+        old_rows = np.arange(len(ids), dtype=np.int64)
+        old_rows[len(index['ids']):] = -1
+        unchanged = old_rows >= 0
+        unchanged[positions] = False
+        row_hashes = np.zeros(len(ids), dtype=index['row_hashes'].dtype)
+        row_hashes[:len(index['ids'])] = index['row_hashes']
+        row_hashes[positions] = _row_hashes(df.iloc[positions])
+    else:
+        row_hashes = _row_hashes(df)
+        old_row = {movie_id: row for row, movie_id in enumerate(index['ids'].tolist())}
+        old_rows = np.array([old_row.get(movie_id, -1) for movie_id in ids.tolist()], dtype=np.int64)
+        unchanged = old_rows >= 0
+        unchanged[unchanged] = index['row_hashes'][old_rows[unchanged]] == row_hashes[unchanged]
+    changed = np.flatnonzero(~unchanged)
+    touched_ids = np.union1d(ids[changed], np.setdiff1d(index['ids'], ids))
+
+    neighbor_ids = np.full((len(ids), count), -1, dtype=np.int64)
+    neighbor_scores = np.full((len(ids), count), -np.inf, dtype=np.float32)
+    neighbor_ids[unchanged] = index['neighbor_ids'][old_rows[unchanged]]
+    neighbor_scores[unchanged] = index['neighbor_scores'][old_rows[unchanged]]
+
+    stale = unchanged & np.isin(neighbor_ids, touched_ids).any(axis=1)
+    rescored = np.flatnonzero(~unchanged | stale)
+    if len(rescored):
+        neighbor_ids[rescored], neighbor_scores[rescored] = _rank_rows(features, rescored, count)
+
+    merged = np.flatnonzero(unchanged & ~stale)
+    if len(changed) and len(merged):
+        step = max(1, BLOCK_CELLS // len(changed))
+        for start in range(0, len(merged), step):
+            block = merged[start:start + step]
+            scores = np.hstack([neighbor_scores[block], pair_scores(features, block, changed).astype(np.float32)])
+            candidates = np.hstack([neighbor_ids[block], np.broadcast_to(ids[changed], (len(block), len(changed)))])
+            scores[candidates < 0] = -np.inf
+            neighbor_ids[block], neighbor_scores[block] = _top_neighbors(candidates, scores, count)
+
+    updated = {'ids': ids, 'row_hashes': row_hashes, 'profile': index['profile'],
+               'neighbor_ids': neighbor_ids, 'neighbor_scores': neighbor_scores}
+    return updated, {'changed': len(changed), 'removed': len(np.setdiff1d(index['ids'], ids)),
+                     'rescored': len(rescored), 'merged': len(merged) if len(changed) else 0}
+
+
+def save_neighbor_index(index, path=DEFAULT_INDEX_PATH):
+    """Write the index atomically so running apps never read a half-written file."""
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, 'wb') as handle:
+        np.savez(handle, **index)
+    os.replace(temporary_path, path)
+
+
+def load_neighbor_index(path=DEFAULT_INDEX_PATH):
+    """Load the index once per file version; returns None when it has not been built."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _loaded_index.get(path)
+    if cached is None or cached[0] != mtime:
+        with np.load(path) as data:
+            index = {name: data[name] for name in data.files}
+        index['row_of'] = {movie_id: row for row, movie_id in enumerate(index['ids'].tolist())}
+        # Files ranked with other weights (or before profiles existed) are ignored until rebuilt
+        index['current'] = 'profile' in index and np.array_equal(index['profile'], _profile_weights())
+        cached = (mtime, index)
+        _loaded_index[path] = cached
+    return cached[1]
+
+
+def get_neighbors(movie, df, count=7, path=DEFAULT_INDEX_PATH):
+    """Return the precomputed neighbors of a movie as catalog rows, or None if it is not indexed."""
+    index = load_neighbor_index(path)
+    if index is None or not index['current'] or movie['id'] not in index['row_of']:
+        return None
+    positions = id_positions(df)
+    row = index['row_of'][movie['id']]
+    hits = [positions[movie_id] for movie_id in index['neighbor_ids'][row].tolist() if movie_id in positions]
+    recommendations = df.iloc[hits]
+    recommendations = recommendations[recommendations['original_title'] != movie['original_title']]
+    return recommendations.head(count)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or update the precomputed similar-movies index.")
+    parser.add_argument('command', choices=['build', 'update'])
+    parser.add_argument('--movies', default=os.path.join(os.path.dirname(DEFAULT_INDEX_PATH), 'movies_details.parquet'))
+    parser.add_argument('--output', default=DEFAULT_INDEX_PATH)
+    parser.add_argument('--count', type=int, default=NEIGHBOR_COUNT)
+    args = parser.parse_args()
+
+    df = pd.read_parquet(args.movies)
+    if args.command == 'update' and os.path.exists(args.output):
+        with np.load(args.output) as data:
+            index, stats = update_neighbor_index(df, {name: data[name] for name in data.files})
+        print(f"Updated {args.output}: {stats}")
+    else:
+        index = build_neighbor_index(df, args.count)
+        print(f"Built {args.output} for {len(df)} movies")
+    save_neighbor_index(index, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,74 +1,68 @@
+import numpy as np
 import pandas as pd
+from catalog.provider import dataset_version
+from instrumentation import count, span, timed
+from recommendations.result_cache import cache_key, cached_result
+from recommendations.similarity_engine import COMPONENTS, LINK_COLUMNS, get_features, id_positions, movie_similarity, names_title, pair_breakdowns, scoring_fingerprint, seed_scores, shared_tags, tag_set, top_positions
 
 def calculate_similarity(movie1, movie2):
     """Calculate similarity score between two movies."""
-    if pd.notna(movie1['belongs_to_id']) and pd.notna(movie2['belongs_to_id']) and movie1['belongs_to_id'] == movie2['belongs_to_id']:
-        return 0
+    return movie_similarity(movie1, movie2, 'details')
 
-    genre_similarity = jaccard_similarity(movie1['genres'], movie2['genres'])
-    keyword_similarity = jaccard_similarity(movie1['keywords'], movie2['keywords'])
-    director_similarity = 1 if set(movie1['directors']) == set(movie2['directors']) else 0
+# Components listed in explanations, with their labels
+EXPLAINED_COMPONENTS = {'genres': "Genres", 'keywords': "Keywords", 'directors': "Directors", 'cast': "Cast"}
 
-    cast1 = movie1['cast'].split(', ')[:8]
-    cast2 = movie2['cast'].split(', ')[:8]
-    cast_similarity = jaccard_similarity(cast1, cast2)
-
-    extra_points = 0
-    if movie2['original_title'] in movie1['recommendations']:
-        extra_points += 0.1
-    if movie2['original_title'] in movie1['similar_movies']:
-        extra_points += 0.1
-
-    similarity_score = (0.4 * genre_similarity +
-                        0.3 * keyword_similarity +
-                        0.2 * director_similarity +
-                        0.1 * cast_similarity +
-                        extra_points)
-
-    return similarity_score
-
-def jaccard_similarity(list1, list2):
-    """Calculate Jaccard similarity between two lists."""
-    intersection = len(set(list1).intersection(set(list2)))
-    union = len(set(list1).union(set(list2)))
-    return intersection / union if union != 0 else 0
+def _explanation_text(shared, mentions):
+    """Explanation lines from the shared tags of each component and the seed lists mentioning the other title."""
+    explanations = [f"{label}: {', '.join(shared[name])}" for name, label in EXPLAINED_COMPONENTS.items() if shared[name]]
+    if mentions['recommendations']:
+        explanations.append("Recommended by the same movie")
+    if mentions['similar_movies']:
+        explanations.append("Similar movies")
+    return "\n".join(explanations) if explanations else "No significant similarities"
 
 def get_similarity_explanation(movie1, movie2):
     """Generate an explanation of what makes the movies similar."""
-    explanations = []
+    shared = {}
+    for name in EXPLAINED_COMPONENTS:
+        limit = COMPONENTS[name][0]
+        shared[name] = sorted(tag for tag in tag_set(movie1[name], limit) & tag_set(movie2[name], limit) if tag)
+    mentions = {column: names_title(movie1[column], movie2['original_title']) for column in LINK_COLUMNS}
+    return _explanation_text(shared, mentions)
 
-    common_genres = set(movie1['genres'].split(', ')).intersection(set(movie2['genres'].split(', ')))
-    if common_genres:
-        explanations.append(f"Genres: {', '.join(sorted(common_genres))}")
+def get_similarity_explanations(movie, recommendations, df):
+    """Explanations for recommendation rows taken from df, from one batch of score breakdowns instead of string parsing."""
+    features = get_features(df)
+    positions = id_positions(df)
+    candidates = np.array([positions[movie_id] for movie_id in recommendations['id'].tolist()], dtype=np.int64)
+    sources = np.full(len(candidates), positions[movie['id']])
+    breakdown = pair_breakdowns(features, sources, candidates, 'details')
+    return [_explanation_text({name: shared_tags(features, breakdown, name, i) for name in EXPLAINED_COMPONENTS},
+                              {column: mentioned[i] for column, mentioned in breakdown['mentions'].items()})
+            for i in range(len(candidates))]
 
-    common_keywords = set(movie1['keywords'].split(', ')).intersection(set(movie2['keywords'].split(', ')))
-    if common_keywords:
-        explanations.append(f"Keywords: {', '.join(sorted(common_keywords))}")
-
-    common_directors = set(movie1['directors'].split(', ')).intersection(set(movie2['directors'].split(', ')))
-    if common_directors:
-        explanations.append(f"Directors: {', '.join(sorted(common_directors))}")
-
-    common_cast = set(movie1['cast'].split(', ')[:8]).intersection(set(movie2['cast'].split(', ')[:8]))
-    if common_cast:
-        explanations.append(f"Cast: {', '.join(sorted(common_cast))}")
-
-    if movie2['original_title'] in movie1['recommendations']:
-        explanations.append("Recommended by the same movie")
-    if movie2['original_title'] in movie1['similar_movies']:
-        explanations.append("Similar movies")
-
-    return "\n".join(explanations) if explanations else "No significant similarities"
+def _rank_by_name(movie_name, df):
+    matches = np.flatnonzero(df['original_title'].str.contains(movie_name, case=False, na=False).to_numpy())
+    if not len(matches):
+        return None
+    count('rows_scored', len(df))
+    with span('similarity_scan'):
+        scores = seed_scores(get_features(df), matches[:1], profile='details')[:, 0]
+    best = top_positions(scores, limit=7)
+    return best, scores[best]
 
+@timed()
 def get_recommendations_by_name(movie_name, df):
     """Get recommendations for a movie based on its name."""
     movie_name = movie_name.split(' (')[0]
-    movie = df[df['original_title'].str.contains(movie_name, case=False, na=False)]
-    if not movie.empty:
-        movie = movie.iloc[0]
-        df['similarity'] = df.apply(lambda x: calculate_similarity(movie, x), axis=1)
-        recommendations = df.sort_values(by='similarity', ascending=False).head(7)
-        recommendations = recommendations[recommendations['original_title'] != movie_name]
-        return recommendations
+    version = dataset_version(df)
+    if version is None:
+        ranked = _rank_by_name(movie_name, df)
     else:
-        return pd.DataFrame()
\ No newline at end of file
+        ranked = cached_result(cache_key('by_name', version, scoring_fingerprint('details'), title=movie_name), lambda: _rank_by_name(movie_name, df))
+    if ranked is None:
+        return pd.DataFrame()
+    # Copy out only the 7 best rows; df itself is never modified
+    best, scores = ranked
+    recommendations = df.iloc[best].assign(similarity=scores)
+    return recommendations[recommendations['original_title'] != movie_name]
\ No newline at end of file
@@ -1,11 +1,14 @@
 # utils.py
 import streamlit as st
-from .similarity import get_similarity_explanation  # Import the function
+from catalog.images import image_sources, prefetch
+from catalog.people_index import filmography, get_people_index, get_people_names
+from .similarity import get_similarity_explanation, get_similarity_explanations
 
 def create_person_dropdown(names, people_df):
     """Create a dropdown menu for names that exist in the people_details database."""
     names_list = names.split(', ')
-    filtered_names = [name for name in names_list if name in people_df['name'].values]
+    people_names = get_people_names(people_df)
+    filtered_names = [name for name in names_list if name in people_names]
 
     if filtered_names:
         options = ["Select a person"] + filtered_names
@@ -16,13 +19,25 @@ def create_person_dropdown(names, people_df):
             st.write(f'<script>window.location.href = window.location.href.split("?")[0] + "?" + new URLSearchParams(window.location.search) + "#cast-and-crew-details";</script>', unsafe_allow_html=True)
     return ''
 
-def create_movie_buttons(recommendations, movie_details):
-    """Create buttons for recommended movies."""
+def create_movie_buttons(recommendations, movie_details, df=None):
+    """Create buttons for recommended movies.
+
+    With the catalog frame the recommendations were taken from, the similarity explanations
+    come from the scoring features in one batch instead of parsing each pair.
+    """
+    recommendations = recommendations.head(5)
+    # Posters download while the explanations are worked out
+    prefetch(recommendations['poster_path'], 150)
     all_cols = st.columns(min(len(recommendations), 5))
-    for col, (_, movie) in zip(all_cols, recommendations.head(5).iterrows()):
+    if df is not None:
+        explanations = get_similarity_explanations(movie_details, recommendations, df)
+    else:
+        explanations = [get_similarity_explanation(movie_details, movie) for _, movie in recommendations.iterrows()]
+    posters = image_sources(recommendations['poster_path'], 150)
+    for col, (_, movie), similarity_explanation, poster in zip(all_cols, recommendations.iterrows(), explanations, posters):
         with col:
             col.markdown(f"<div class='center-content'><div class='element one-line-title'>{movie['original_title']}</div><div class='year'>{movie['release_year']}</div></div>", unsafe_allow_html=True)
-            col.image(movie['poster_path'], use_container_width=True)
+            col.image(poster, use_container_width=True)
             col.markdown('<div class="center-content">', unsafe_allow_html=True)
             if col.button("Select", key=f"select_{movie['id']}"):
                 st.session_state.selected_movie = movie['original_title']
@@ -30,14 +45,14 @@ def create_movie_buttons(recommendations, movie_details):
                 st.query_params.update({'movie': movie_name, 'year': movie['release_year']})
                 st.write('<script>window.scrollTo(0, 0);</script>', unsafe_allow_html=True)
             col.markdown('</div>', unsafe_allow_html=True)
-            similarity_explanation = get_similarity_explanation(movie_details, movie)
             with col.expander("Similarities"):
                 col.markdown(f"<div class='element'>{similarity_explanation}</div>", unsafe_allow_html=True)
 
 def create_movie_dropdown(movies, person_details):
     """Create a dropdown menu for movies."""
     actor_name = person_details['name']
-    matched_movies = movies[movies['cast'].str.contains(actor_name, na=False)]
+    # Exact cast membership from the inverted index, so "Chris Evans" no longer matches "Chris Evanson"
+    matched_movies = movies.iloc[filmography(get_people_index(movies), actor_name)]
 
     if matched_movies.empty:
         st.error(f"No movies found for actor: {actor_name}")
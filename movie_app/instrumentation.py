@@ -0,0 +1,251 @@
+import argparse
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# When set, every finished trace is appended to this file as one JSON line
+LOG_PATH = os.environ.get('MOVIEREX_TRACE_LOG')
+
+# Default profiler for traces that do not ask for one: "cprofile", "sample" or unset
+PROFILER = os.environ.get('MOVIEREX_PROFILER')
+
+# Seconds between two stack samples of the sampling profiler
+SAMPLE_INTERVAL = 0.005
+
+# Functions (cProfile) or stacks (sampling) kept in a trace record
+PROFILE_TOP = 25
+
+# Finished traces kept in memory for the debug panel, most recent last
+RECENT_TRACES = 50
+
+# Each thread runs at most one trace at a time (Streamlit runs every session's rerun on its own thread)
+_local = threading.local()
+_recent = []
+_recent_lock = threading.Lock()
+_log_lock = threading.Lock()
+
+
+def current_trace():
+    """The trace running on this thread, or None."""
+    return getattr(_local, 'trace', None)
+
+
+@contextmanager
+def span(name):
+    """Time the enclosed block as a span of the current trace; does nothing outside a trace."""
+    trace = current_trace()
+    if trace is None:
+        yield
+        return
+    record = {'name': name, 'depth': len(trace['stack']), 'start_ms': 0.0, 'ms': 0.0}
+    trace['spans'].append(record)
+    trace['stack'].append(name)
+    start = time.perf_counter()
+    record['start_ms'] = round((start - trace['perf_start']) * 1000, 3)
+    try:
+        yield
+    finally:
+        record['ms'] = round((time.perf_counter() - start) * 1000, 3)
+        trace['stack'].pop()
+
+
+def timed(name=None):
+    """Decorator running every call of a function inside span(name, defaulting to the function name)."""
+    def decorate(function):
+        label = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if current_trace() is None:
+                return function(*args, **kwargs)
+            with span(label):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count(name, amount=1):
+    """Add amount to a counter of the current trace (rows scored, cache hits, ...)."""
+    trace = current_trace()
+    if trace is not None:
+        trace['counters'][name] += amount
+
+
+def _cprofile_top(profiler):
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    rows = []
+    for (filename, line, function), (_, calls, own, cumulative, _) in stats.stats.items():
+        rows.append({'function': f"{os.path.basename(filename)}:{line}({function})", 'calls': calls,
+                     'own_ms': round(own * 1000, 3), 'cumulative_ms': round(cumulative * 1000, 3)})
+    rows.sort(key=lambda row: -row['cumulative_ms'])
+    return rows[:PROFILE_TOP]
+
+
+def _stack(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def _sample(thread_id, stacks, stop):
+    """Count the stacks of thread_id every SAMPLE_INTERVAL until stop is set."""
+    while not stop.wait(SAMPLE_INTERVAL):
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            stacks[_stack(frame)] += 1
+
+
+def _start_profiler(kind):
+    if kind == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return {'kind': kind, 'profiler': profiler}
+    if kind == 'sample':
+        sampler = {'kind': kind, 'stacks': Counter(), 'stop': threading.Event()}
+        sampler['thread'] = threading.Thread(target=_sample, args=(threading.get_ident(), sampler['stacks'], sampler['stop']),
+                                             daemon=True)
+        sampler['thread'].start()
+        return sampler
+    return None
+
+
+def _stop_profiler(profiler, dump_path):
+    """Stop a profiler; returns its summary for the trace record and writes the full dump to dump_path."""
+    if profiler['kind'] == 'cprofile':
+        profiler['profiler'].disable()
+        if dump_path:
+            profiler['profiler'].dump_stats(dump_path)  # readable with pstats or snakeviz
+        return {'kind': 'cprofile', 'dump': dump_path, 'top': _cprofile_top(profiler['profiler'])}
+    profiler['stop'].set()
+    profiler['thread'].join()
+    stacks = profiler['stacks']
+    if dump_path:
+        # Collapsed stacks, one "frame;frame;frame count" line each, as flamegraph tools read them
+        with open(dump_path, 'w') as handle:
+            handle.writelines(f"{stack} {samples}\n" for stack, samples in stacks.most_common())
+    return {'kind': 'sample', 'dump': dump_path, 'interval_ms': SAMPLE_INTERVAL * 1000, 'samples': sum(stacks.values()),
+            'top': [{'stack': stack, 'samples': samples} for stack, samples in stacks.most_common(PROFILE_TOP)]}
+
+
+def _dump_path(trace, kind):
+    if not LOG_PATH:
+        return None
+    extension = 'prof' if kind == 'cprofile' else 'stacks.txt'
+    return f"{os.path.splitext(LOG_PATH)[0]}.{trace['name']}.{int(trace['started'] * 1000)}.{extension}"
+
+
+@contextmanager
+def trace(name, profiler=None, **context):
+    """Collect the spans and counters of the enclosed block (one Streamlit rerun, one request) as one trace.
+
+    profiler ("cprofile" or "sample", else PROFILER) also profiles the block. The finished
+    record is kept for recent_traces() and appended to LOG_PATH when set. Nested traces
+    on the same thread are folded into the outer one as a span.
+    """
+    if current_trace() is not None:
+        with span(name):
+            yield current_trace()
+        return
+    record = {'name': name, 'started': time.time(), 'perf_start': time.perf_counter(), 'context': context,
+              'spans': [], 'stack': [], 'counters': Counter()}
+    profiler = _start_profiler(profiler or PROFILER)
+    _local.trace = record
+    try:
+        yield record
+    finally:
+        _local.trace = None
+        record['ms'] = round((time.perf_counter() - record['perf_start']) * 1000, 3)
+        if profiler is not None:
+            record['profile'] = _stop_profiler(profiler, _dump_path(record, profiler['kind']))
+        del record['perf_start'], record['stack']
+        record['counters'] = dict(record['counters'])
+        _finish(record)
+
+
+def _finish(record):
+    with _recent_lock:
+        _recent.append(record)
+        del _recent[:-RECENT_TRACES]
+    if LOG_PATH:
+        line = json.dumps(record, default=str) + '\n'
+        with _log_lock, open(LOG_PATH, 'a') as handle:
+            handle.write(line)
+
+
+def recent_traces():
+    """Finished traces of this process, most recent last."""
+    with _recent_lock:
+        return list(_recent)
+
+
+def show_debug_panel(record):
+    """Render a finished trace (spans, counters, profile) and the recent rerun totals in Streamlit."""
+    import streamlit as st
+
+    with st.expander(f"Debug: {record['name']} took {record['ms']:.1f} ms", expanded=True):
+        st.dataframe([{'span': '  ' * entry['depth'] + entry['name'], 'start ms': entry['start_ms'], 'ms': entry['ms']}
+                      for entry in record['spans']])
+        st.json(record['counters'])
+        if 'profile' in record:
+            st.markdown(f"**Profile ({record['profile']['kind']})**")
+            st.dataframe(record['profile']['top'])
+        st.markdown("**Recent traces**")
+        st.dataframe([{'trace': past['name'], 'started': time.strftime('%H:%M:%S', time.localtime(past['started'])),
+                       'ms': past['ms']} for past in reversed(recent_traces())])
+        st.download_button("Download trace (JSON)", json.dumps(record, default=str), file_name=f"trace-{int(record['started'])}.json")
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def summarize(path, name=None):
+    """Per span (and whole trace) count, median, p95 and max milliseconds over a JSON-lines trace log."""
+    durations = {}
+    with open(path) as handle:
+        for line in handle:
+            record = json.loads(line)
+            if name is not None and record['name'] != name:
+                continue
+            durations.setdefault(f"{record['name']} (total)", []).append(record['ms'])
+            for entry in record['spans']:
+                durations.setdefault(entry['name'], []).append(entry['ms'])
+    return {label: {'count': len(values), 'p50_ms': _percentile(values, 0.5), 'p95_ms': _percentile(values, 0.95),
+                    'max_ms': max(values)}
+            for label, values in sorted(durations.items())}
+
+
+def compare(path, baseline, name=None):
+    """summarize() of path next to that of a baseline log, with the ratio of the medians."""
+    current, previous = summarize(path, name), summarize(baseline, name)
+    return {label: dict(stats, baseline_p50_ms=previous[label]['p50_ms'],
+                        p50_ratio=round(stats['p50_ms'] / previous[label]['p50_ms'], 3) if previous[label]['p50_ms'] else None)
+            for label, stats in current.items() if label in previous}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize trace logs written with MOVIEREX_TRACE_LOG.")
+    parser.add_argument('log')
+    parser.add_argument('--baseline', help="earlier log to compare medians against")
+    parser.add_argument('--trace', help="only traces with this name")
+    args = parser.parse_args()
+    summary = compare(args.log, args.baseline, args.trace) if args.baseline else summarize(args.log, args.trace)
+    for label, stats in summary.items():
+        print(json.dumps(dict(span=label, **stats)))
+
+
+if __name__ == "__main__":
+    main()
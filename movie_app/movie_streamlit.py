@@ -1,6 +1,7 @@
 import streamlit as st
-import pandas as pd
 import os
+from catalog.lazy import load_movies, load_people
+from instrumentation import show_debug_panel, span, trace
 
 # Get the current working directory
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -9,19 +10,28 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 people_file_path = os.path.join(current_dir, 'people_details.parquet')
 movies_file_path = os.path.join(current_dir, 'movies_details.parquet')
 
-# Load the Parquet files
-people_df = pd.read_parquet(people_file_path)
-movies_df = pd.read_parquet(movies_file_path)
+# ?debug=1 shows where this rerun's time went; ?debug=cprofile or ?debug=sample also profiles it
+debug = st.query_params.get('debug')
 
-# Import the modules using relative imports
-from individual_movies import movie_data
-from recommendations.movie_recs import load_recommendations_tab
+# Every rerun is one trace; with MOVIEREX_TRACE_LOG set it is also appended to that JSON-lines file
+with trace('rerun', profiler=debug if debug in ('cprofile', 'sample') else None, query=st.query_params.to_dict()) as rerun:
+    # Load the Parquet files once per process; reruns and other sessions share the same frames.
+    # Only the columns used for scoring and lookups stay in memory; display columns are read per row.
+    with span('load_dataset'):
+        people_df = load_people(people_file_path)
+        movies_df = load_movies(movies_file_path)
 
-# Create tabs
-tab1, tab2 = st.tabs(["Recommendations", "Movie Data"])
+    # Import the modules using relative imports
+    from individual_movies import movie_data
+    from recommendations.movie_recs import load_recommendations_tab
 
-with tab1:
-    load_recommendations_tab(movies_df)
-with tab2:
-    movie_data.movie_info_tab(movies_df, people_df, movies_df)
+    # Create tabs
+    tab1, tab2 = st.tabs(["Recommendations", "Movie Data"])
 
+    with tab1:
+        load_recommendations_tab(movies_df)
+    with tab2:
+        movie_data.movie_info_tab(movies_df, people_df, movies_df)
+
+if debug:
+    show_debug_panel(rerun)
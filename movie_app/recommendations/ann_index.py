@@ -0,0 +1,184 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+from catalog.provider import cached_for_frame, load_dataset
+from .similarity_engine import get_features, linked_positions, score_movies, top_positions
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MOVIES_PATH = os.path.join(APP_DIR, 'movies_details.parquet')
+DEFAULT_INDEX_PATH = os.path.join(APP_DIR, 'movies_minhash.npz')
+
+# When set to an index file, multi-seed queries only rescore the LSH shortlist instead of the whole catalog
+INDEX_PATH = os.environ.get('MOVIEREX_ANN_INDEX')
+
+# Band layout. Every index has one band keyed on the exact genre set and one on the exact
+# director set (worth 0.3 and 0.2 of a score); these MinHash bands add keyword and cast overlap
+# and genre/language overlap. More bands raise recall and the shortlist size.
+KEYWORD_BANDS = 4
+CAST_BANDS = 4
+GENRE_LANGUAGE_BANDS = 2
+ROWS_PER_BAND = 1
+
+# The movies the seeds' recommendations and similar_movies name join the shortlist (they get the
+# title bonus); with 2 hops, so do the movies those name
+LINK_HOPS = 2
+
+# Mersenne prime for the universal hash functions (a * token + b) mod P
+_PRIME = (1 << 31) - 1
+
+# Multiplier used to fold several hash values into one 64-bit bucket key
+_FOLD = np.uint64(1_000_003)
+
+
+def minhash_signatures(tokens, count, seed=0):
+    """MinHash signature (rows x count, uint32) of every row of a binary CSR token matrix."""
+    rng = np.random.default_rng(seed)
+    multipliers = rng.integers(1, _PRIME, size=count, dtype=np.uint64)
+    offsets = rng.integers(0, _PRIME, size=count, dtype=np.uint64)
+    columns = tokens.indices.astype(np.uint64)
+    starts = tokens.indptr[:-1]
+    filled = np.diff(tokens.indptr) > 0
+    signatures = np.full((tokens.shape[0], count), _PRIME, dtype=np.uint32)
+    for i in range(count):
+        hashes = (columns * multipliers[i] + offsets[i]) % _PRIME
+        signatures[filled, i] = np.minimum.reduceat(hashes, starts[filled])
+    return signatures
+
+
+def set_keys(tokens, seed=0):
+    """64-bit key per row that is equal for rows with exactly the same token set."""
+    token_hashes = np.random.default_rng(seed).integers(0, 1 << 63, size=tokens.shape[1], dtype=np.int64).astype(np.uint64)
+    keys = np.zeros(tokens.shape[0], dtype=np.uint64)
+    np.add.at(keys, np.repeat(np.arange(tokens.shape[0]), np.diff(tokens.indptr)), token_hashes[tokens.indices])
+    return keys
+
+
+def _fold(columns):
+    keys = np.zeros(len(columns[0]), dtype=np.uint64)
+    for column in columns:
+        keys = keys * _FOLD + column.astype(np.uint64)
+    return keys
+
+
+def build_ann_index(df, keyword_bands=KEYWORD_BANDS, cast_bands=CAST_BANDS, genre_language_bands=GENRE_LANGUAGE_BANDS,
+                    rows=ROWS_PER_BAND, seed=0):
+    """Hash every movie into one bucket per band; movies sharing a bucket with a seed form its shortlist.
+
+    Tag sets are hashed as scoring compares them, so the empty tag of a missing list counts
+    like any other tag. For a MinHash band over a component with Jaccard similarity s,
+    two movies share a bucket with probability s ** rows.
+    """
+    components = get_features(df)['components']
+    keywords = minhash_signatures(components['keywords'], keyword_bands * rows, seed + 1)
+    cast = minhash_signatures(components['cast'], cast_bands * rows, seed + 2)
+    genres = minhash_signatures(components['genres'], genre_language_bands * rows, seed + 3)
+    languages = minhash_signatures(components['spoken_languages'], genre_language_bands * rows, seed + 4)
+    keys = [set_keys(components['genres'], seed), set_keys(components['directors'], seed)]
+    keys += [_fold([keywords[:, band * rows + row] for row in range(rows)]) for band in range(keyword_bands)]
+    keys += [_fold([cast[:, band * rows + row] for row in range(rows)]) for band in range(cast_bands)]
+    keys += [_fold([signature[:, band * rows + row] for signature in (genres, languages) for row in range(rows)])
+             for band in range(genre_language_bands)]
+    keys = np.vstack(keys)
+    order = np.argsort(keys, axis=1, kind='stable').astype(np.int32)
+    return {'ids': get_features(df)['ids'], 'sorted_keys': np.take_along_axis(keys, order, axis=1), 'order': order,
+            'keys': keys, 'layout': np.array([keyword_bands, cast_bands, genre_language_bands, rows, seed])}
+
+
+def save_ann_index(index, path=DEFAULT_INDEX_PATH):
+    # The per-movie keys are a permutation of sorted_keys and are rebuilt on load
+    temporary_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(temporary_path, **{name: value for name, value in index.items() if name != 'keys'})
+    os.replace(temporary_path, path)
+
+
+def load_ann_index(path=DEFAULT_INDEX_PATH):
+    with np.load(path) as data:
+        index = {name: data[name] for name in data.files}
+    # Bucket key of every movie in every band, recovered from the sorted copy
+    index['keys'] = np.empty_like(index['sorted_keys'])
+    np.put_along_axis(index['keys'], index['order'].astype(np.int64), index['sorted_keys'], axis=1)
+    return index
+
+
+def shortlist(index, features, seed_positions, hops=LINK_HOPS):
+    """Catalog positions sharing a bucket with any seed, plus the movies within hops links of the seeds."""
+    found = [linked_positions(features, seed_positions, hops)]
+    for band in range(len(index['sorted_keys'])):
+        sorted_keys, order = index['sorted_keys'][band], index['order'][band]
+        keys = index['keys'][band][seed_positions]
+        starts = np.searchsorted(sorted_keys, keys, side='left')
+        stops = np.searchsorted(sorted_keys, keys, side='right')
+        found.extend(order[start:stop] for start, stop in zip(starts, stops))
+    return np.unique(np.concatenate(found).astype(np.int64))
+
+
+def _index_for_frame(df):
+    index = load_ann_index(INDEX_PATH)
+    # An index built for another catalog version would shortlist the wrong rows
+    return index if np.array_equal(index['ids'], get_features(df)['ids']) else None
+
+
+def shortlist_for(df, movie_ids):
+    """Shortlist for a query when an index is configured (MOVIEREX_ANN_INDEX) and matches df, else None."""
+    if not INDEX_PATH or not os.path.exists(INDEX_PATH):
+        return None
+    index = cached_for_frame(df, 'ann_index', _index_for_frame)
+    if index is None:
+        return None
+    features = get_features(df)
+    return shortlist(index, features, np.flatnonzero(np.isin(features['ids'], list(movie_ids))))
+
+
+def evaluate(df, index, queries=200, seeds=3, limit=7, seed=1, hops=LINK_HOPS):
+    """Recall@limit of shortlist + exact rescoring against the exact full scan, on random seed sets."""
+    features = get_features(df)
+    rng = np.random.default_rng(seed)
+    recalls, sizes, exact_seconds, approximate_seconds = [], [], 0.0, 0.0
+    for _ in range(queries):
+        seed_positions = np.sort(rng.choice(len(df), seeds, replace=False))
+        movie_ids = features['ids'][seed_positions].tolist()
+        start = time.perf_counter()
+        scores = score_movies(df, movie_ids)
+        exact = top_positions(scores, groups=features['collections'], limit=limit)
+        exact_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        candidates = shortlist(index, features, seed_positions, hops)
+        approximate = candidates[top_positions(score_movies(df, movie_ids, candidates),
+                                               groups=features['collections'][candidates], limit=limit)]
+        approximate_seconds += time.perf_counter() - start
+        recalls.append(len(np.intersect1d(exact, approximate)) / max(len(exact), 1))
+        sizes.append(len(candidates))
+    return {'layout': index['layout'][:4].tolist(), 'hops': hops, 'recall_at_k': round(float(np.mean(recalls)), 4),
+            'k': limit, 'mean_shortlist': round(float(np.mean(sizes)), 1), 'catalog': len(df),
+            'exact_ms': round(exact_seconds / queries * 1000, 2), 'approximate_ms': round(approximate_seconds / queries * 1000, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or evaluate the MinHash-LSH candidate index.")
+    parser.add_argument('command', choices=['build', 'evaluate'])
+    parser.add_argument('--movies', default=DEFAULT_MOVIES_PATH)
+    parser.add_argument('--output', default=DEFAULT_INDEX_PATH)
+    parser.add_argument('--layout', action='append', default=[], metavar='K,C,GL,R',
+                        help="keyword bands, cast bands, genre/language bands and rows per band, e.g. 4,4,2,1; "
+                             "evaluate accepts several to compare recall")
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seeds', type=int, default=3, help="seed movies per evaluation query")
+    parser.add_argument('--limit', type=int, default=7, help="k of recall@k")
+    parser.add_argument('--hops', type=int, default=LINK_HOPS, help="link hops added to the shortlist when evaluating")
+    args = parser.parse_args()
+    layouts = [tuple(int(part) for part in layout.split(',')) for layout in args.layout] or \
+        [(KEYWORD_BANDS, CAST_BANDS, GENRE_LANGUAGE_BANDS, ROWS_PER_BAND)]
+    df = load_dataset(args.movies)
+    if args.command == 'build':
+        start = time.perf_counter()
+        save_ann_index(build_ann_index(df, *layouts[0]), args.output)
+        print(f"Wrote {args.output} ({len(df)} movies, layout {layouts[0]}) in {time.perf_counter() - start:.1f}s")
+        return
+    for layout in layouts:
+        print(json.dumps(evaluate(df, build_ann_index(df, *layout), args.queries, args.seeds, args.limit, hops=args.hops)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+import argparse
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool, shared_memory
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from scipy import sparse
+from catalog.lazy import load_movies
+from catalog.provider import dataset_version
+from . import cooccurrence
+from .filter_index import filter_mask, get_filter_index
+from .similarity_engine import get_features, seed_scores, title_bonus_rows, top_positions
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MOVIES_PATH = os.path.join(APP_DIR, 'movies_details.parquet')
+
+# Users written to each output part file
+CHUNK_SIZE = 1000
+
+# Upper bound on candidate rows x stacked seeds scored in one block
+BLOCK_CELLS = 2 ** 24
+
+# Records the job settings so a resumed run can check it continues the same job
+MANIFEST_NAME = '_batch.json'
+
+# Set in every worker process by _attach_worker
+_worker = {}
+
+
+def _id_list(value):
+    """Movie ids of one watchlist cell: a list/array, or ids separated by commas or spaces."""
+    if isinstance(value, str):
+        return [int(part) for part in value.replace(',', ' ').split()]
+    if value is None or (np.ndim(value) == 0 and pd.isna(value)):
+        return []
+    return [int(part) for part in value]
+
+
+def read_watchlists(path):
+    """Read a Parquet or CSV watchlist file as (user ids, movie ids) in long form.
+
+    The file has a user_id column and either a movie_ids column (one list per user) or
+    a movie_id column (one row per watched movie).
+    """
+    frame = pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path)
+    if 'movie_ids' in frame:
+        frame = frame.assign(movie_id=frame['movie_ids'].map(_id_list)).explode('movie_id')
+    elif 'movie_id' not in frame:
+        raise ValueError(f"{path} needs a user_id column and a movie_ids or movie_id column")
+    return frame['user_id'].to_numpy(), frame['movie_id'].to_numpy()
+
+
+def seed_positions_by_user(ids, user_ids, movie_ids):
+    """Group watchlists per user (first-seen order); seeds are sorted catalog positions.
+
+    Movie ids that are not in the catalog are dropped, so a user can end up with no seeds.
+    """
+    codes, users = pd.factorize(user_ids)
+    known = pd.notna(movie_ids) & (codes >= 0)
+    codes, movie_ids = codes[known], movie_ids[known].astype(np.int64)
+    catalog_ids, first = np.unique(ids, return_index=True)
+    found = np.minimum(np.searchsorted(catalog_ids, movie_ids), len(catalog_ids) - 1)
+    matched = catalog_ids[found] == movie_ids if len(catalog_ids) else np.zeros(len(movie_ids), dtype=bool)
+    codes, positions = codes[matched], first[found[matched]]
+    order = np.argsort(codes, kind='stable')
+    bounds = np.cumsum(np.bincount(codes, minlength=len(users)))
+    return list(users), [np.unique(part) for part in np.split(positions[order], bounds[:-1])]
+
+
+def _share(arrays):
+    """Copy named arrays into shared memory; returns the blocks and the specs workers attach with."""
+    blocks, specs = [], {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        specs[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, specs
+
+
+def _attach(specs):
+    blocks, arrays = [], {}
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        arrays[name] = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+    return blocks, arrays
+
+
+def shared_arrays(features, candidates, bonus_rows, bonus_row_of, cooccurrence_rows=None):
+    """Flatten what the workers need for scoring into plain named arrays.
+
+    bonus_row_of maps a catalog position to its row in bonus_rows and in cooccurrence_rows
+    (None when no co-occurrence model is in use).
+    """
+    arrays = {'ids': features['ids'].astype(np.int64), 'collections': features['collections'],
+              'candidates': candidates, 'bonus_row_of': bonus_row_of,
+              'bonus.data': bonus_rows.data, 'bonus.indices': bonus_rows.indices, 'bonus.indptr': bonus_rows.indptr}
+    if cooccurrence_rows is not None:
+        arrays['cooccurrence.data'] = cooccurrence_rows.data
+        arrays['cooccurrence.indices'] = cooccurrence_rows.indices
+        arrays['cooccurrence.indptr'] = cooccurrence_rows.indptr
+    for name, matrix in features['components'].items():
+        arrays[f'{name}.data'] = matrix.data
+        arrays[f'{name}.indices'] = matrix.indices
+        arrays[f'{name}.indptr'] = matrix.indptr
+        arrays[f'{name}.shape'] = np.asarray(matrix.shape, dtype=np.int64)
+        arrays[f'{name}.sizes'] = features['sizes'][name]
+    return arrays
+
+
+def _features_from_arrays(arrays):
+    """Rebuild a features dict over shared arrays, as seed_scores expects it."""
+    features = {'components': {}, 'sizes': {}, 'ids': arrays['ids'], 'collections': arrays['collections'],
+                'bonus_row_of': arrays['bonus_row_of']}
+    for name in {key.split('.')[0] for key in arrays if key.endswith('.shape')}:
+        features['components'][name] = sparse.csr_matrix(
+            (arrays[f'{name}.data'], arrays[f'{name}.indices'], arrays[f'{name}.indptr']),
+            shape=tuple(arrays[f'{name}.shape']), copy=False)
+        features['sizes'][name] = arrays[f'{name}.sizes']
+    features['bonus_rows'] = sparse.csr_matrix(
+        (arrays['bonus.data'], arrays['bonus.indices'], arrays['bonus.indptr']),
+        shape=(len(arrays['bonus.indptr']) - 1, len(arrays['ids'])), copy=False)
+    # Set even without a model, so workers never load one of their own
+    features['cooccurrence_rows'] = None
+    if 'cooccurrence.indptr' in arrays:
+        features['cooccurrence_rows'] = sparse.csr_matrix(
+            (arrays['cooccurrence.data'], arrays['cooccurrence.indices'], arrays['cooccurrence.indptr']),
+            shape=(len(arrays['cooccurrence.indptr']) - 1, len(arrays['ids'])), copy=False)
+    return features
+
+
+def _attach_worker(specs, limit):
+    blocks, arrays = _attach(specs)
+    _worker.update(blocks=blocks, features=_features_from_arrays(arrays), candidates=arrays['candidates'], limit=limit)
+
+
+def score_users(features, candidates, seed_lists, limit):
+    """Rank candidates for each user, scoring users in blocks of stacked seeds.
+
+    Each block scores every candidate against all seeds of its users in one pass; the
+    per-user totals are sums over each user's seed columns. Returns one (positions,
+    scores) pair per user, best first, as rank_recommendations does.
+    """
+    ids = features['ids']
+    groups = features['collections'][candidates]
+    budget = max(1, BLOCK_CELLS // max(len(candidates), 1))
+    results = []
+    start = 0
+    while start < len(seed_lists):
+        stop, stacked = start + 1, len(seed_lists[start])
+        while stop < len(seed_lists) and stacked + len(seed_lists[stop]) <= budget:
+            stacked += len(seed_lists[stop])
+            stop += 1
+        block = seed_lists[start:stop]
+        scores = seed_scores(features, np.concatenate(block), candidates)
+        lengths = np.array([len(seeds) for seeds in block])
+        offsets = np.cumsum(lengths) - lengths
+        # Segment sums over each user's seed columns, added seed by seed like score_movies
+        totals = np.zeros((scores.shape[0], len(block)))
+        for k in range(lengths.max()):
+            users = np.flatnonzero(lengths > k)
+            totals[:, users] += scores[:, offsets[users] + k]
+        for j, seeds in enumerate(block):
+            best = top_positions(totals[:, j], groups=groups, limit=limit)
+            best = best[~np.isin(ids[candidates[best]], ids[seeds])]
+            results.append((candidates[best], totals[best, j]))
+        start = stop
+    return results
+
+
+def part_path(output_dir, chunk):
+    return os.path.join(output_dir, f'part-{chunk:05d}.parquet')
+
+
+def _write_part(path, columns):
+    """Write one part file atomically, so an interrupted job never leaves a partial part behind."""
+    temporary = f'{path}.{os.getpid()}.tmp'
+    pq.write_table(pa.table(columns), temporary)
+    os.replace(temporary, path)
+
+
+def score_chunk(task):
+    """Score one chunk of users in a worker and write its part file; returns (users, rows)."""
+    chunk, path, user_ids, seed_lists = task
+    features, candidates, limit = _worker['features'], _worker['candidates'], _worker['limit']
+    scored = [j for j, seeds in enumerate(seed_lists) if len(seeds)]
+    ranked = score_users(features, candidates, [seed_lists[j] for j in scored], limit) if scored else []
+    columns = {'user_id': [], 'rank': [], 'movie_id': [], 'score': []}
+    for j, (positions, scores) in zip(scored, ranked):
+        columns['user_id'].extend([user_ids[j]] * len(positions))
+        columns['rank'].extend(range(1, len(positions) + 1))
+        columns['movie_id'].extend(features['ids'][positions].tolist())
+        columns['score'].extend(scores.tolist())
+    _write_part(path, {'user_id': pa.array(columns['user_id']), 'rank': pa.array(columns['rank'], pa.int16()),
+                       'movie_id': pa.array(columns['movie_id'], pa.int64()),
+                       'score': pa.array(columns['score'], pa.float64())})
+    return len(user_ids), len(columns['rank'])
+
+
+def _check_manifest(output_dir, settings):
+    """Record the job settings, or make sure an existing output directory belongs to the same job."""
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if os.path.exists(path):
+        with open(path) as file:
+            if json.load(file) != settings:
+                raise SystemExit(f"{output_dir} holds the output of a different job; remove it or pick another directory")
+        return
+    with open(f'{path}.tmp', 'w') as file:
+        json.dump(settings, file, indent=2)
+    os.replace(f'{path}.tmp', path)
+
+
+def run_batch(input_path, output_dir, movies_path=DEFAULT_MOVIES_PATH, workers=None, chunk_size=CHUNK_SIZE,
+              limit=7, star_rating=None, fame_level="Very Famous", language_filter="", runtime_max=None,
+              release_year_range=None, genre_filters=()):
+    """Write recommendations for every watchlist in input_path as Parquet parts under output_dir.
+
+    Parts that already exist are kept, so rerunning an interrupted job only scores the rest.
+    Returns a summary dict with the users and rows written and the throughput.
+    """
+    started = time.perf_counter()
+    df = load_movies(movies_path)
+    features = get_features(df)
+    user_ids, movie_ids = read_watchlists(input_path)
+    users, seed_lists = seed_positions_by_user(features['ids'], user_ids, movie_ids)
+    users = [user.item() if isinstance(user, np.generic) else user for user in users]
+
+    os.makedirs(output_dir, exist_ok=True)
+    stat = os.stat(input_path)
+    filters = {'star_rating': star_rating, 'fame_level': fame_level, 'language_filter': language_filter,
+               'runtime_max': runtime_max, 'release_year_range': list(release_year_range) if release_year_range else None,
+               'genre_filters': list(genre_filters)}
+    _check_manifest(output_dir, {'input': os.path.abspath(input_path), 'input_size': stat.st_size,
+                                 'input_mtime_ns': stat.st_mtime_ns, 'movies': list(dataset_version(df) or [movies_path]),
+                                 'chunk_size': chunk_size, 'limit': limit, 'filters': filters,
+                                 'cooccurrence': cooccurrence.MODEL_PATH and [os.path.abspath(cooccurrence.MODEL_PATH),
+                                                                              cooccurrence.generation()]})
+
+    chunks = range(0, len(users), chunk_size)
+    tasks = [(index, part_path(output_dir, index), users[start:start + chunk_size], seed_lists[start:start + chunk_size])
+             for index, start in enumerate(chunks)]
+    pending = [task for task in tasks if not os.path.exists(task[1])]
+    summary = {'users': len(users), 'parts': len(tasks), 'skipped_parts': len(tasks) - len(pending),
+               'scored_users': 0, 'rows': 0}
+    if pending:
+        candidates = np.flatnonzero(filter_mask(get_filter_index(df), star_rating, fame_level, language_filter,
+                                                runtime_max, release_year_range, list(genre_filters)))
+        # The title bonus needs the seeds' text; precompute it as sparse rows for every seed in the job
+        distinct_seeds = np.unique(np.concatenate([seeds for task in pending for seeds in task[3]] + [np.empty(0, np.int64)]))
+        bonus_row_of = np.full(len(features['ids']), -1, dtype=np.int64)
+        bonus_row_of[distinct_seeds] = np.arange(len(distinct_seeds))
+        # Likewise the co-occurrence signal, so every worker scores with the model this process loaded
+        blocks, specs = _share(shared_arrays(features, candidates, title_bonus_rows(features, distinct_seeds), bonus_row_of,
+                                             cooccurrence.seed_rows(features, distinct_seeds)))
+        scoring_started = time.perf_counter()
+        try:
+            with Pool(workers or os.cpu_count() or 1, initializer=_attach_worker, initargs=(specs, limit)) as pool:
+                for done, (scored, rows) in enumerate(pool.imap_unordered(score_chunk, pending), start=1):
+                    summary['scored_users'] += scored
+                    summary['rows'] += rows
+                    elapsed = time.perf_counter() - scoring_started
+                    print(f"{done}/{len(pending)} parts, {summary['scored_users'] / elapsed:,.0f} users/s, "
+                          f"{summary['rows'] / elapsed:,.0f} rows/s", file=sys.stderr, flush=True)
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+        summary['scoring_seconds'] = round(time.perf_counter() - scoring_started, 2)
+        summary['users_per_second'] = round(summary['scored_users'] / summary['scoring_seconds'], 1)
+        summary['rows_per_second'] = round(summary['rows'] / summary['scoring_seconds'], 1)
+    summary['seconds'] = round(time.perf_counter() - started, 2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute recommendations for a file of watchlists.")
+    parser.add_argument('input', help="Parquet or CSV file with user_id and movie_ids (or movie_id) columns")
+    parser.add_argument('output', help="directory for the part-NNNNN.parquet result files")
+    parser.add_argument('--movies', default=DEFAULT_MOVIES_PATH)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="users per part file")
+    parser.add_argument('--limit', type=int, default=7, help="recommendations per user")
+    parser.add_argument('--star-rating', type=float, default=None)
+    parser.add_argument('--fame-level', default="Very Famous")
+    parser.add_argument('--language', default="")
+    parser.add_argument('--runtime-max', type=float, default=None)
+    parser.add_argument('--years', type=int, nargs=2, default=None, metavar=('FIRST', 'LAST'))
+    parser.add_argument('--genre', action='append', default=[], help="required genre; repeat for several")
+    args = parser.parse_args()
+    summary = run_batch(args.input, args.output, args.movies, args.workers, args.chunk_size, args.limit,
+                        args.star_rating, args.fame_level, args.language, args.runtime_max,
+                        tuple(args.years) if args.years else None, args.genre)
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
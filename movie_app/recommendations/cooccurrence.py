@@ -0,0 +1,466 @@
+import argparse
+import atexit
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+from scipy import sparse
+from instrumentation import count
+from .similarity_engine import register_signal
+
+# When set, watchlists picked in the recommendations tab are counted into this model file, and movies
+# often listed together score higher (the 'cooccurrence' signal of the recommendations profile)
+MODEL_PATH = os.environ.get('MOVIEREX_COOCCURRENCE')
+
+# Only this many movies of one list are counted, as a list of n movies adds n * n pairs
+MAX_LIST_MOVIES = 100
+
+# Recorded lists are added to the matrix (and saved) at most this often, or once this many are waiting.
+# Every fold starts a new model generation, which cached recommendation results are keyed on.
+FOLD_SECONDS = 60
+FOLD_LISTS = 500
+
+# The lists counted since the last save are merged into the model file (and what other processes saved
+# picked up) at most this often; the file holds every pair ever counted, so it gets large
+SAVE_SECONDS = 10 * 60
+
+# A lock file older than this was left by a process that died while saving, and is taken over
+LOCK_SECONDS = 120
+
+# Pairs listed together fewer times than this do not score; one user's list is not a pattern
+MIN_COUNT = 2
+
+# Pairs counted per sparse update when building a model from a file of lists
+BUILD_PAIRS = 20_000_000
+
+# The model in use, the lists recorded since it was folded, the lists folded since the last save, the
+# version (mtime_ns, size) of the model file it was read from or saved as, when it was folded and saved,
+# and whether a fold or save is running
+_state = {'model': None, 'pending': [], 'unsaved': [], 'source': None, 'folded_at': 0.0, 'saved_at': 0.0, 'folding': False}
+_lock = threading.Lock()
+
+# Catalog ids in sorted order, per catalog, for mapping model rows to catalog positions
+_ORDER_CACHE_SIZE = 4
+_id_orders = OrderedDict()
+_id_orders_lock = threading.Lock()
+
+
+def empty_model():
+    return {'ids': np.empty(0, dtype=np.int64), 'rows': {}, 'counts': sparse.csr_matrix((0, 0), dtype=np.float32),
+            'similarity': sparse.csr_matrix((0, 0), dtype=np.float32), 'lists': 0, 'generation': 0, 'positions': {}}
+
+
+def similarity_matrix(counts):
+    """Cosine similarity of the movies' list memberships: pairs / sqrt(lists of one * lists of the other).
+
+    The diagonal of counts holds the number of lists each movie is in. Pairs counted fewer than
+    MIN_COUNT times and the diagonal itself are left out.
+    """
+    pairs = counts.tocoo()
+    keep = (pairs.data >= MIN_COUNT) & (pairs.row != pairs.col)
+    rows, columns = pairs.row[keep], pairs.col[keep]
+    lists = counts.diagonal().astype(np.float64)
+    values = pairs.data[keep] / np.sqrt(lists[rows] * lists[columns])
+    return sparse.csr_matrix((values.astype(np.float32), (rows, columns)), shape=counts.shape)
+
+
+def _grown(matrix, size):
+    # Rows and columns of movies seen for the first time, appended empty
+    indptr = np.concatenate([matrix.indptr, np.full(size - matrix.shape[0], matrix.indptr[-1], dtype=matrix.indptr.dtype)])
+    return sparse.csr_matrix((matrix.data, matrix.indices, indptr), shape=(size, size))
+
+
+def _count_lists(model, updates):
+    """Ids, id -> row map, count matrix and list total of model with updates counted in, and the rows of the added movies."""
+    rows = dict(model['rows'])
+    ids = model['ids'].tolist()
+    for added, _ in updates:
+        for movie_id in added:
+            if movie_id not in rows:
+                rows[movie_id] = len(ids)
+                ids.append(movie_id)
+    pair_rows, pair_columns, touched = [], [], []
+    lists = model['lists']
+    for added, earlier in updates:
+        added = np.array([rows[movie_id] for movie_id in added], dtype=np.int64)
+        earlier = np.array([rows[movie_id] for movie_id in earlier if movie_id in rows], dtype=np.int64)
+        listed = np.concatenate([added, earlier])
+        pair_rows += [np.repeat(added, len(listed)), np.repeat(earlier, len(added))]
+        pair_columns += [np.tile(listed, len(added)), np.tile(added, len(earlier))]
+        touched.append(added)
+        lists += not len(earlier)
+    size = len(ids)
+    pair_rows = np.concatenate(pair_rows) if pair_rows else np.empty(0, dtype=np.int64)
+    pair_columns = np.concatenate(pair_columns) if pair_columns else np.empty(0, dtype=np.int64)
+    # Pairs repeated across the updates are summed
+    delta = sparse.csr_matrix((np.ones(len(pair_rows), dtype=np.float32), (pair_rows, pair_columns)), shape=(size, size))
+    counts = (_grown(model['counts'], size) + delta).tocsr()
+    touched = np.unique(np.concatenate(touched)) if touched else np.empty(0, dtype=np.int64)
+    return np.array(ids, dtype=np.int64), rows, counts, lists, touched
+
+
+def updated_similarity(similarity, counts, touched):
+    """similarity_matrix(counts), from the similarity of the counts before, when only the movies at rows touched were listed.
+
+    Every pair that changed has a touched movie, as do the list totals that changed, so only
+    the similarity rows (and, mirrored, columns) of the touched movies are recomputed.
+    """
+    size = counts.shape[0]
+    is_touched = np.zeros(size, dtype=bool)
+    is_touched[touched] = True
+    before = _grown(similarity, size).tocoo()
+    kept = ~(is_touched[before.row] | is_touched[before.col])
+    block = counts[touched].tocoo()
+    rows, columns = touched[block.row], block.col
+    keep = (block.data >= MIN_COUNT) & (rows != columns)
+    rows, columns = rows[keep], columns[keep]
+    lists = counts.diagonal().astype(np.float64)
+    values = (block.data[keep] / np.sqrt(lists[rows] * lists[columns])).astype(np.float32)
+    # Pairs of two touched movies come from both of their rows; mirror only the others
+    mirrored = ~is_touched[columns]
+    return sparse.csr_matrix((np.concatenate([before.data[kept], values, values[mirrored]]),
+                              (np.concatenate([before.row[kept], rows, columns[mirrored]]),
+                               np.concatenate([before.col[kept], columns, rows[mirrored]]))), shape=(size, size))
+
+
+def add_lists(model, updates):
+    """The model with updates counted in: per list, (movie ids new to it, ids of it counted before).
+
+    Only the pairs with a new movie are added (new x new, new x earlier and earlier x new), so a
+    list counted in several steps ends up counted once. The count matrix grows by one sparse
+    addition and only the similarities of the new movies are recomputed; the model passed in
+    is left as it was.
+    """
+    ids, rows, counts, lists, touched = _count_lists(model, updates)
+    return {'ids': ids, 'rows': rows, 'counts': counts, 'similarity': updated_similarity(model['similarity'], counts, touched),
+            'lists': lists, 'generation': model['generation'] + 1, 'positions': {}}
+
+
+def save_model(model, path):
+    counts = model['counts']
+    temporary_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(temporary_path, ids=model['ids'], data=counts.data, indices=counts.indices, indptr=counts.indptr,
+             lists=model['lists'], generation=model['generation'])
+    os.replace(temporary_path, path)
+
+
+def load_model(path):
+    with np.load(path) as data:
+        size = len(data['ids'])
+        counts = sparse.csr_matrix((data['data'], data['indices'], data['indptr']), shape=(size, size))
+        ids = data['ids'].astype(np.int64)
+        lists, generation = int(data['lists']), int(data['generation'])
+    return {'ids': ids, 'rows': {movie_id: row for row, movie_id in enumerate(ids.tolist())}, 'counts': counts,
+            'similarity': similarity_matrix(counts), 'lists': lists, 'generation': generation, 'positions': {}}
+
+
+def _file_version(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+@contextmanager
+def _file_lock(path):
+    """Hold path.lock, shared by every process saving the model; a lock older than LOCK_SECONDS is taken over."""
+    lock_path = f"{path}.lock"
+    while True:
+        try:
+            handle = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.stat(lock_path).st_mtime > LOCK_SECONDS:
+                    os.remove(lock_path)
+                    continue
+            except FileNotFoundError:
+                continue
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        os.close(handle)
+        os.remove(lock_path)
+
+
+def sync_model(path, model, source, unsaved):
+    """Merge the lists counted by this process since its last save into the model file shared with other processes.
+
+    model is the file's model as of version source with the unsaved lists folded in. Returns the
+    model to go on with and the file version it matches: the file as other processes left it
+    plus the unsaved lists, written back under a lock so no process's counts are lost.
+    """
+    version = _file_version(path)
+    if not unsaved and version == source:
+        return model, source
+    if not unsaved:
+        merged = load_model(path)
+    else:
+        with _file_lock(path):
+            version = _file_version(path)
+            if version == source:
+                merged = model
+            else:
+                merged = add_lists(load_model(path) if version is not None else empty_model(), unsaved)
+            save_model(merged, path)
+            version = _file_version(path)
+    if merged is not model:
+        # Generations only grow, so results cached for an earlier model are never served for this one
+        merged['generation'] = max(merged['generation'], model['generation'] + 1)
+    return merged, version
+
+
+def _refresh(force):
+    if not MODEL_PATH:
+        return None
+    with _lock:
+        if _state['model'] is None:
+            _state['source'] = _file_version(MODEL_PATH)
+            _state['model'] = load_model(MODEL_PATH) if _state['source'] is not None else empty_model()
+            _state['folded_at'] = _state['saved_at'] = time.time()
+        model, pending, now = _state['model'], _state['pending'], time.time()
+        fold = bool(pending) and (force or len(pending) >= FOLD_LISTS or now - _state['folded_at'] >= FOLD_SECONDS)
+        save = (force and bool(pending or _state['unsaved'])) or now - _state['saved_at'] >= SAVE_SECONDS
+        if _state['folding'] or not (fold or save):
+            return model
+        # Folded and saved outside the lock; queries meanwhile keep scoring with the current model
+        pending = pending if fold else []
+        if fold:
+            _state['pending'] = []
+        _state['folding'] = True
+    source = _state['source']
+    try:
+        if pending:
+            model = add_lists(model, pending)
+            _state['unsaved'] = _state['unsaved'] + pending
+        if save:
+            model, source = sync_model(MODEL_PATH, model, source, _state['unsaved'])
+            _state['unsaved'] = []
+    finally:
+        with _lock:
+            _state['model'], _state['source'] = model, source
+            if pending:
+                _state['folded_at'] = time.time()
+            if save:
+                _state['saved_at'] = time.time()
+            _state['folding'] = False
+    return model
+
+
+def current_model():
+    """The model of MODEL_PATH with the recorded lists folded in and the file synced when due, or None without a model."""
+    return _refresh(force=False)
+
+
+def flush():
+    """Fold the waiting lists and merge everything this process counted into the model file; runs at exit."""
+    if _state['model'] is not None or _state['pending']:
+        _refresh(force=True)
+
+
+def generation():
+    """Generation of the model in use (it changes whenever recorded lists are folded in), or None without a model."""
+    model = current_model()
+    return None if model is None else model['generation']
+
+
+def record_watchlist(movie_ids, counted=()):
+    """Count a watchlist of movie ids towards the model; returns the ids of the list counted so far.
+
+    counted is what an earlier call for the same list (one session's selection) returned: only
+    the movies added since are counted, with each other and with the counted ones still listed.
+    Does nothing when no model is configured.
+    """
+    counted = list(counted)
+    if not MODEL_PATH:
+        return counted
+    known = set(counted)
+    listed = list(dict.fromkeys(int(movie_id) for movie_id in movie_ids))
+    added = [movie_id for movie_id in listed if movie_id not in known][:max(0, MAX_LIST_MOVIES - len(known))]
+    if not added:
+        return counted
+    earlier = [movie_id for movie_id in listed if movie_id in known]
+    with _lock:
+        _state['pending'].append((added, earlier))
+    count('cooccurrence.recorded', len(added))
+    return counted + added
+
+
+def _id_order(ids):
+    key = id(ids)
+    with _id_orders_lock:
+        if key in _id_orders and _id_orders[key][0] is ids:
+            _id_orders.move_to_end(key)
+            return _id_orders[key][1]
+    order = np.argsort(ids, kind='stable')
+    with _id_orders_lock:
+        _id_orders[key] = (ids, order)  # the ids are held so their id() is not reused
+        while len(_id_orders) > _ORDER_CACHE_SIZE:
+            _id_orders.popitem(last=False)
+    return order
+
+
+def catalog_positions(model, ids):
+    """Catalog position (in the catalog with these ids) of every model row, -1 for movies not in it."""
+    key = id(ids)
+    cached = model['positions'].get(key)
+    if cached is not None and cached[0] is ids:
+        return cached[1]
+    if len(ids):
+        order = _id_order(ids)
+        found = order[np.searchsorted(ids, model['ids'], sorter=order).clip(max=len(ids) - 1)]
+        positions = np.where(ids[found] == model['ids'], found, -1)
+    else:
+        positions = np.full(len(model['ids']), -1)
+    model['positions'] = {key: (ids, positions)}  # one catalog at a time per generation
+    return positions
+
+
+def _model_rows(model, movie_ids):
+    return np.array([model['rows'].get(movie_id, -1) for movie_id in movie_ids.tolist()], dtype=np.int64)
+
+
+def _available(model):
+    return model is not None and model['similarity'].nnz > 0
+
+
+def cooccurrence_scores(features, seed_positions, rows=None):
+    """Sparse (rows x seeds) co-occurrence similarity of catalog rows (all, or the given positions) to each seed.
+
+    Only the stored pairs of the seeds' model rows are touched; None while the model has none.
+    Features prepared by a batch job carry the job seeds' rows (see seed_rows) and are scored from those.
+    """
+    if 'cooccurrence_rows' in features:
+        matrix = features['cooccurrence_rows']
+        if matrix is None:
+            return None
+        matrix = matrix[features['bonus_row_of'][seed_positions]]
+        return (matrix if rows is None else matrix[:, np.asarray(rows)]).T.tocsr()
+    model = current_model()
+    if not _available(model):
+        return None
+    ids = features['ids']
+    positions = catalog_positions(model, ids)
+    seed_rows = _model_rows(model, ids[seed_positions])
+    shape = (len(ids) if rows is None else len(rows), len(seed_positions))
+    known = np.flatnonzero(seed_rows >= 0)
+    if not len(known) or not shape[0]:
+        return sparse.csr_matrix(shape)
+    block = model['similarity'][seed_rows[known]]
+    seeds = np.repeat(known, np.diff(block.indptr))
+    targets = positions[block.indices]
+    keep = targets >= 0
+    if rows is not None:
+        rows = np.asarray(rows)
+        # Candidate positions come sorted from the filters; other callers may pass any order
+        order = None if np.all(rows[:-1] <= rows[1:]) else np.argsort(rows, kind='stable')
+        slots = np.searchsorted(rows, targets, sorter=order).clip(max=len(rows) - 1)
+        if order is not None:
+            slots = order[slots]
+        keep &= rows[slots] == targets
+        targets = slots
+    values = block.data[keep].astype(np.float64)
+    return sparse.csr_matrix((values, (targets[keep], seeds[keep])), shape=shape)
+
+
+def seed_rows(features, seed_positions):
+    """Sparse (seeds x catalog) co-occurrence rows of the given seeds from the current model, or None without one.
+
+    A batch job computes them once so that all its workers score with the same model.
+    """
+    scores = cooccurrence_scores(features, seed_positions)
+    return None if scores is None else scores.T.tocsr()
+
+
+def cooccurrence_pairs(features, sources, candidates):
+    """Co-occurrence similarity of each (sources[i], candidates[i]) pair of catalog positions, or None."""
+    model = current_model()
+    if not _available(model):
+        return None
+    ids = features['ids']
+    source_rows, candidate_rows = _model_rows(model, ids[sources]), _model_rows(model, ids[candidates])
+    values = np.zeros(len(sources))
+    known = (source_rows >= 0) & (candidate_rows >= 0)
+    if known.any():
+        values[known] = np.asarray(model['similarity'][source_rows[known], candidate_rows[known]]).ravel()
+    return values
+
+
+def related_positions(features, seed_positions):
+    """Catalog positions of the movies listed together with any seed often enough to score."""
+    model = current_model()
+    if not _available(model):
+        return np.empty(0, dtype=np.int64)
+    seed_rows = _model_rows(model, features['ids'][seed_positions])
+    block = model['similarity'][seed_rows[seed_rows >= 0]]
+    positions = catalog_positions(model, features['ids'])[np.unique(block.indices)]
+    return positions[positions >= 0]
+
+
+register_signal('cooccurrence', cooccurrence_scores, cooccurrence_pairs)
+atexit.register(flush)
+
+
+def read_watchlists(path):
+    """Watchlists of a text file: one list per line, movie ids separated by commas or whitespace."""
+    with open(path) as handle:
+        for line in handle:
+            movie_ids = [int(value) for value in line.replace(',', ' ').split()]
+            if movie_ids:
+                yield movie_ids
+
+
+def build_model(watchlists, model=None, pairs=BUILD_PAIRS):
+    """Count watchlists (lists of movie ids) into model (a new one when None).
+
+    Lists are added about pairs pairs at a time and the similarities computed once at the end.
+    """
+    model = empty_model() if model is None else model
+    ids, rows, counts, lists = model['ids'], model['rows'], model['counts'], model['lists']
+    updates, waiting = [], 0
+    for movie_ids in watchlists:
+        listed = list(dict.fromkeys(movie_ids))[:MAX_LIST_MOVIES]
+        updates.append((listed, []))
+        waiting += len(listed) ** 2
+        if waiting >= pairs:
+            ids, rows, counts, lists, _ = _count_lists({'ids': ids, 'rows': rows, 'counts': counts, 'lists': lists}, updates)
+            updates, waiting = [], 0
+    if updates:
+        ids, rows, counts, lists, _ = _count_lists({'ids': ids, 'rows': rows, 'counts': counts, 'lists': lists}, updates)
+    return {'ids': ids, 'rows': rows, 'counts': counts, 'similarity': similarity_matrix(counts), 'lists': lists,
+            'generation': model['generation'] + 1, 'positions': {}}
+
+
+def summary(model):
+    return {'lists': model['lists'], 'movies': len(model['ids']), 'pairs': int(model['counts'].nnz - len(model['ids'])),
+            'scoring_pairs': int(model['similarity'].nnz), 'generation': model['generation']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect the watchlist co-occurrence model.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="count watchlists from a file into a model")
+    build.add_argument('watchlists', help="text file with one list of movie ids per line")
+    build.add_argument('--model', default=MODEL_PATH, required=not MODEL_PATH, help="model file (MOVIEREX_COOCCURRENCE)")
+    build.add_argument('--append', action='store_true', help="add to the existing model instead of replacing it")
+    show = commands.add_parser('stats', help="print the size of a model")
+    show.add_argument('--model', default=MODEL_PATH, required=not MODEL_PATH)
+    args = parser.parse_args()
+
+    if args.command == 'stats':
+        print(json.dumps(summary(load_model(args.model))))
+        return
+    start = time.perf_counter()
+    model = load_model(args.model) if args.append and os.path.exists(args.model) else None
+    model = build_model(read_watchlists(args.watchlists), model)
+    save_model(model, args.model)
+    print(json.dumps(dict(summary(model), seconds=round(time.perf_counter() - start, 3))))
+
+
+if __name__ == "__main__":
+    main()
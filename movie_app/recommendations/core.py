@@ -0,0 +1,76 @@
+# Recommendation logic shared by the Streamlit tab, the HTTP service and batch jobs; no UI imports
+import numpy as np
+import pandas as pd
+from catalog.lazy import fetch_rows
+from catalog.provider import dataset_version
+from instrumentation import count, span, timed
+from . import ann_index, cooccurrence
+from .filter_index import filter_mask, get_filter_index
+from .result_cache import cached_result, recommendation_key
+from .similarity_engine import get_features, score_movies, scoring_fingerprint, top_positions
+
+
+def rank_recommendations(movie_ids, star_rating, fame_level, df, language_filter, runtime_max, release_year_range, genre_filters, limit=7):
+    """Return (catalog positions, scores) of the best recommendations, best first, without touching df.
+
+    Returns None when none of the movie_ids is in the catalog. Results for catalogs loaded through
+    load_dataset are cached per query and dataset version; the returned arrays are read-only.
+    """
+    version = dataset_version(df)
+    if version is None:
+        return _rank(movie_ids, star_rating, fame_level, df, language_filter, runtime_max, release_year_range, genre_filters, limit)
+    key = recommendation_key(version, scoring_fingerprint(), movie_ids, star_rating, fame_level, language_filter, runtime_max, release_year_range, genre_filters, limit,
+                             approximate=bool(ann_index.INDEX_PATH), cooccurrence=cooccurrence.generation())
+    return cached_result(key, lambda: _rank(movie_ids, star_rating, fame_level, df, language_filter, runtime_max,
+                                            release_year_range, genre_filters, limit))
+
+
+def _rank(movie_ids, star_rating, fame_level, df, language_filter, runtime_max, release_year_range, genre_filters, limit):
+    features = get_features(df)
+    if not np.isin(features['ids'], list(movie_ids)).any():
+        return None
+    # Filter first so only the surviving candidates are scored
+    with span('filters'):
+        candidates = np.flatnonzero(filter_mask(get_filter_index(df), star_rating, fame_level, language_filter, runtime_max, release_year_range, genre_filters))
+    shortlist = ann_index.shortlist_for(df, movie_ids)
+    if shortlist is not None:
+        # Approximate mode: only the LSH shortlist is rescored, with the exact weights. Movies often
+        # listed with the seeds need not share tags with them, so they join the shortlist.
+        seeds = np.flatnonzero(np.isin(features['ids'], list(movie_ids)))
+        shortlist = np.union1d(shortlist, cooccurrence.related_positions(features, seeds))
+        candidates = candidates[np.isin(candidates, shortlist, assume_unique=True)]
+    count('rows_scored', len(candidates))
+    with span('similarity_scan'):
+        scores = score_movies(df, movie_ids, candidates)
+    # One movie per collection (belongs_to_id), as drop_duplicates did on the sorted results
+    best = top_positions(scores, groups=features['collections'][candidates], limit=limit)
+    best = best[~np.isin(features['ids'][candidates[best]], list(movie_ids))]
+    return candidates[best], scores[best]
+
+
+@timed()
+def get_recommendations_by_ids(movie_ids, star_rating, fame_level, df, language_filter, runtime_max, release_year_range, genre_filters):
+    """Get recommendations for multiple movies based on their IDs and various filters."""
+    ranked = rank_recommendations(movie_ids, star_rating, fame_level, df, language_filter, runtime_max, release_year_range, genre_filters)
+    if ranked is None:
+        return pd.DataFrame()
+    positions, scores = ranked
+    # Only the winning rows are copied out of the shared catalog, with their display columns
+    percentile_rank = get_filter_index(df)['percentiles'][positions]
+    return fetch_rows(df, positions).assign(similarity=scores, percentile_rank=percentile_rank, star_rating=percentile_rank * 5)
+
+
+def recommend(df, movie_ids, star_rating=None, fame_level="Very Famous", language_filter="", runtime_max=None,
+              release_year_range=None, genre_filters=(), limit=7):
+    """Ranked recommendations as plain dicts (id, title, year, score, stars); filters left as None are not applied."""
+    ranked = rank_recommendations(movie_ids, star_rating, fame_level, df, language_filter, runtime_max,
+                                  release_year_range, list(genre_filters), limit)
+    if ranked is None:
+        return []
+    positions, scores = ranked
+    percentiles = get_filter_index(df)['percentiles'][positions]
+    rows = df[['id', 'original_title', 'release_year']].iloc[positions]
+    return [{'id': int(movie_id), 'title': title, 'year': None if pd.isna(year) else int(year),
+             'score': float(score), 'stars': float(percentile * 5)}
+            for movie_id, title, year, score, percentile
+            in zip(rows['id'], rows['original_title'], rows['release_year'], scores, percentiles)]
@@ -1,59 +1,22 @@
 import streamlit as st
-import pandas as pd
-from .similarity_calculator import calculate_similarity
+from catalog.images import image_sources
+from catalog.lookup import recommendation_options
+from instrumentation import span
+from . import cooccurrence
+from .core import get_recommendations_by_ids
 from .input_file import upload_file
+from .title_picker import title_picker
 
-# Function to get recommendations based on selected movie IDs
-def get_recommendations_by_ids(movie_ids, star_rating, fame_level, df, language_filter, runtime_max, release_year_range, genre_filters):
-    """Get recommendations for multiple movies based on their IDs and various filters."""
-    selected_movies = df[df['id'].isin(movie_ids)]
-    if not selected_movies.empty:
-        df['similarity'] = df.apply(lambda x: sum(calculate_similarity(movie, x) for _, movie in selected_movies.iterrows()), axis=1)
-        recommendations = df.sort_values(by='similarity', ascending=False)
-
-        # Calculate the percentile rank and convert to a 5-star scale
-        recommendations['percentile_rank'] = recommendations['vote_average'].rank(pct=True)
-        recommendations['star_rating'] = recommendations['percentile_rank'] * 5
-
-        # Filter by star rating
-        recommendations = recommendations[recommendations['star_rating'] >= star_rating]
-
-        # Filter by fame level
-        if fame_level == "Very Obscure":
-            recommendations = recommendations[recommendations['vote_count'] <= 1499]
-        elif fame_level == "Obscure":
-            recommendations = recommendations[recommendations['vote_count'] <= 3000]
-        elif fame_level == "Moderate":
-            recommendations = recommendations[recommendations['vote_count'] <= 7000]
-        elif fame_level == "Famous":
-            recommendations = recommendations[recommendations['vote_count'] <= 9000]
-        elif fame_level == "Very Famous":
-            recommendations = recommendations
-
-        recommendations = recommendations[recommendations['spoken_languages'].str.contains(language_filter, case=False, na=False)]
-        recommendations = recommendations[recommendations['runtime'] <= runtime_max]
-        recommendations = recommendations[(recommendations['release_year'] >= release_year_range[0]) & (recommendations['release_year'] <= release_year_range[1])]
-        if genre_filters:
-            recommendations = recommendations[recommendations['genres'].apply(lambda x: all(genre in x for genre in genre_filters))]
-        recommendations = recommendations[~((recommendations['vote_average'] > 6.5) & (recommendations['vote_count'] < 500))]
-
-        # Remove duplicate belongs_to_id values
-        recommendations = recommendations.drop_duplicates(subset='belongs_to_id', keep='first')
-
-        recommendations = recommendations.head(7)
-        recommendations = recommendations[~recommendations['id'].isin(movie_ids)]
-        return recommendations
-    else:
-        return pd.DataFrame()
 
 # Streamlit app to display the recommendations
 def recommendations_tab(df):
     """Render the recommendations tab in Streamlit."""
     st.title('Movie Recommendations')
 
-    all_movie_titles_with_year = [f"{title} ({year})" for title, year in zip(df['original_title'], df['release_year'])]
-    all_movie_ids = df['id'].tolist()
-    movie_options = {f"{title} ({year})": movie_id for title, year, movie_id in zip(df['original_title'], df['release_year'], all_movie_ids)}
+    # Option lists and the title search index are built once per catalog and shared by every session
+    with span('option_lists'):
+        options = recommendation_options(df)
+    movie_options = options['movie_options']
 
     # Get query parameters
     query_params = st.query_params
@@ -67,9 +30,8 @@ def recommendations_tab(df):
     rows = [st.columns(2) for _ in range((len(selected_movies) + 1) // 2)]
     for i in range(len(selected_movies)):
         with rows[i // 2][i % 2]:
-            options = [""] + list(movie_options.keys())
-            index = 0 if i >= len(selected_movies) else options.index(selected_movies[i])
-            selected_movie = st.selectbox(f"Selected Movie {i+1}:", options, index=index)
+            current = selected_movies[i] if selected_movies[i] in movie_options else ""
+            selected_movie = title_picker(f"Selected Movie {i+1}:", options, key=f"movie_picker_{i}", current=current)
             if selected_movie and selected_movie != "":
                 selected_movies[i] = selected_movie
 
@@ -89,6 +51,7 @@ def recommendations_tab(df):
             st.session_state['release_year_range'] = (1915, 2025)
             st.session_state['genre_filters'] = []
             st.session_state['movies'] = ["" for _ in range(4)]
+            st.session_state['counted_movies'] = []  # the next selection is a new watchlist
             st.query_params.clear()
 
     with st.expander("Select Filters"):
@@ -116,50 +79,51 @@ def recommendations_tab(df):
         release_year_range = st.slider("Select Release Year Range:", 1915, 2025, (1915, 2025), step=1, key='release_year_range')
 
         # Multiselect for genre
-        genre_options = sorted(df['genres'].str.split(', ').explode().unique())
-        genre_filters = st.multiselect("Select Genres:", options=genre_options, key='genre_filters')
+        genre_filters = st.multiselect("Select Genres:", options=options['genres'], key='genre_filters')
 
     # Update query parameters
     if selected_movies:
         st.query_params.update(movies=selected_movies)
 
     if selected_movies:
-        selected_movie_ids = [movie_options[movie] for movie in selected_movies if movie]
+        selected_movie_ids = [movie_options[movie] for movie in selected_movies if movie in movie_options]
+        if cooccurrence.MODEL_PATH:
+            # The selection (picked, uploaded or opened from a shared link) is this session's watchlist
+            st.session_state['counted_movies'] = cooccurrence.record_watchlist(
+                selected_movie_ids, st.session_state.get('counted_movies', []))
         st.write("Top Recommendations:")
         recommendations = get_recommendations_by_ids(selected_movie_ids, star_rating, fame_level, df, language_filter, runtime_max, release_year_range, genre_filters)
         if not recommendations.empty:
-            rows = [st.columns(3) for _ in range(2)]
-            for i, (_, movie) in enumerate(recommendations.head(6).iterrows()):
-                with rows[i // 3][i % 3]:
-                    if st.button(f"**{movie['original_title']} ({movie['release_year']})**", key=f"title_{movie['id']}"):
-                        # Find the first empty select box
-                        empty_index = next((index for index, value in enumerate(selected_movies) if value == ""), len(selected_movies))
-                        if empty_index < len(selected_movies):
-                            selected_movies[empty_index] = f"{movie['original_title']} ({movie['release_year']})"
-                        else:
-                            selected_movies.append(f"{movie['original_title']} ({movie['release_year']})")
-                        st.query_params.update(movies=selected_movies)
-                        st.rerun()
-
-                    st.image(movie['poster_path'], width=150)
-                    # Calculate the percentile rank and convert to a 5-star scale
-                    percentile_rank = recommendations['percentile_rank'][recommendations['id'] == movie['id']].values[0]
-                    stars = percentile_rank * 5
-                    st.write(f"{movie['runtime']} min | Rating: {stars:.2f} stars")
+            # Posters download together, the grid waiting for them once
+            posters = image_sources(recommendations['poster_path'].head(6), 150)
+            with span('render_results'):
+                rows = [st.columns(3) for _ in range(2)]
+                for i, (_, movie) in enumerate(recommendations.head(6).iterrows()):
+                    with rows[i // 3][i % 3]:
+                        if st.button(f"**{movie['original_title']} ({movie['release_year']})**", key=f"title_{movie['id']}"):
+                            # Find the first empty select box
+                            empty_index = next((index for index, value in enumerate(selected_movies) if value == ""), len(selected_movies))
+                            if empty_index < len(selected_movies):
+                                selected_movies[empty_index] = f"{movie['original_title']} ({movie['release_year']})"
+                            else:
+                                selected_movies.append(f"{movie['original_title']} ({movie['release_year']})")
+                            st.query_params.update(movies=selected_movies)
+                            st.rerun()
+
+                        st.image(posters[i], width=150)
+                        # Calculate the percentile rank and convert to a 5-star scale
+                        percentile_rank = recommendations['percentile_rank'][recommendations['id'] == movie['id']].values[0]
+                        stars = percentile_rank * 5
+                        st.write(f"{movie['runtime']} min | Rating: {stars:.2f} stars")
 
     # File uploader at the bottom
-    uploaded_entries = upload_file(movie_options, key='file_uploader_1')
+    uploaded_entries = upload_file(df, key='file_uploader_1')
     if uploaded_entries:
         for entry in uploaded_entries:
             if entry not in selected_movies:
                 selected_movies.append(entry)
 
-    # Always show the search button
+    # Always show the search button; the uploaded titles were already added above
     if st.button("Search"):
-        uploaded_entries = upload_file(movie_options, key='file_uploader_2')
-        if uploaded_entries:
-            for entry in uploaded_entries:
-                if entry not in selected_movies:
-                    selected_movies.append(entry)
         st.query_params.update(movies=selected_movies)
         st.rerun()
\ No newline at end of file
@@ -0,0 +1,152 @@
+import numpy as np
+from catalog.provider import cached_for_frame, register_frame_updater
+from catalog.storage import encoded_lists, take_rows
+
+# Maximum vote_count allowed by each fame level; "Very Famous" has no limit
+FAME_LIMITS = {"Very Obscure": 1499, "Obscure": 3000, "Moderate": 7000, "Famous": 9000}
+
+
+def _tag_bitsets(column):
+    """Packed bitset (one bit per movie) for every distinct tag of an encoded list column."""
+    size = len(column['valid'])
+    rows = np.repeat(np.arange(size), np.diff(column['offsets']))
+    bitsets = {}
+    for code in np.unique(column['codes']):
+        bits = np.zeros(size, dtype=bool)
+        bits[rows[column['codes'] == code]] = True
+        bitsets[column['vocabulary'][code]] = np.packbits(bits)
+    return bitsets
+
+
+def _sorted_column(values):
+    order = np.argsort(values, kind='stable')
+    return {'order': order, 'values': values[order]}
+
+
+def build_filter_index(df):
+    """Precompute everything the recommendation filters need, once per catalog frame."""
+    encoded = encoded_lists(df)
+    vote_average = df['vote_average'].to_numpy(dtype=np.float64)
+    vote_count = df['vote_count'].to_numpy(dtype=np.float64)
+    return {
+        'size': len(df),
+        'genres': _tag_bitsets(encoded['genres']),
+        'languages': _tag_bitsets(encoded['spoken_languages']),
+        'has_languages': np.packbits(df['spoken_languages'].notna().to_numpy()),
+        'runtime': _sorted_column(df['runtime'].to_numpy(dtype=np.float64)),
+        'release_year': _sorted_column(df['release_year'].to_numpy(dtype=np.float64)),
+        'vote_count': _sorted_column(vote_count),
+        'percentiles': df['vote_average'].rank(pct=True).to_numpy(),
+        # Highly rated movies with few votes are never recommended
+        'trusted': ~((vote_average > 6.5) & (vote_count < 500)),
+    }
+
+
+def get_filter_index(df):
+    """Return the filter index of a catalog DataFrame, built once per frame."""
+    return cached_for_frame(df, 'filter_index', build_filter_index)
+
+
+def _update_bitsets(bitsets, column, positions, size):
+    """_tag_bitsets of an encoded column whose rows at positions changed, copying only the affected bitsets."""
+    width = (size + 7) // 8
+    byte, bit = positions >> 3, (np.uint8(128) >> (positions & 7).astype(np.uint8))
+    updated = {}
+    for tag, bits in bitsets.items():
+        if len(bits) < width:
+            bits = np.concatenate([bits, np.zeros(width - len(bits), dtype=np.uint8)])
+        inside = byte < len(bitsets[tag])
+        if (bitsets[tag][byte[inside]] & bit[inside]).any():
+            bits = bits.copy() if bits is bitsets[tag] else bits
+            np.bitwise_and.at(bits, byte, ~bit)
+        updated[tag] = bits
+    delta = take_rows(column, positions)
+    rows = np.repeat(np.arange(len(positions)), np.diff(delta['offsets']))
+    for code in np.unique(delta['codes']):
+        tag = column['vocabulary'][code]
+        bits = updated.get(tag)
+        if bits is None:
+            bits = np.zeros(width, dtype=np.uint8)
+        elif bits is bitsets.get(tag):
+            bits = bits.copy()
+        hits = rows[delta['codes'] == code]
+        np.bitwise_or.at(bits, byte[hits], bit[hits])
+        updated[tag] = bits
+    # Tags no movie carries any more are dropped, as a fresh build would not have them
+    return {tag: bits for tag, bits in updated.items() if bits.any()}
+
+
+def _update_sorted(column, values, positions):
+    """_sorted_column(values) from the column of the previous values, when only the rows at positions changed."""
+    keep = ~np.isin(column['order'], positions)
+    order, sorted_values = column['order'][keep], column['values'][keep]
+    new_values = values[positions]
+    ranked = np.argsort(new_values, kind='stable')
+    at = np.searchsorted(sorted_values, new_values[ranked], side='right')
+    return {'order': np.insert(order, at, positions[ranked]), 'values': np.insert(sorted_values, at, new_values[ranked])}
+
+
+def update_filter_index(index, previous, frame, positions):
+    """Filter index of frame from the previous one: tag bitsets and sorted columns are patched at positions."""
+    encoded = encoded_lists(frame)
+    vote_average = frame['vote_average'].to_numpy(dtype=np.float64)
+    vote_count = frame['vote_count'].to_numpy(dtype=np.float64)
+    return {
+        'size': len(frame),
+        'genres': _update_bitsets(index['genres'], encoded['genres'], positions, len(frame)),
+        'languages': _update_bitsets(index['languages'], encoded['spoken_languages'], positions, len(frame)),
+        'has_languages': np.packbits(frame['spoken_languages'].notna().to_numpy()),
+        'runtime': _update_sorted(index['runtime'], frame['runtime'].to_numpy(dtype=np.float64), positions),
+        'release_year': _update_sorted(index['release_year'], frame['release_year'].to_numpy(dtype=np.float64), positions),
+        'vote_count': _update_sorted(index['vote_count'], vote_count, positions),
+        # Percentiles are relative to the whole catalog, so they are ranked again
+        'percentiles': frame['vote_average'].rank(pct=True).to_numpy(),
+        'trusted': ~((vote_average > 6.5) & (vote_count < 500)),
+    }
+
+
+register_frame_updater('filter_index', update_filter_index)
+
+
+def _range_mask(column, size, low=-np.inf, high=np.inf):
+    """Mask of the rows whose value lies in [low, high], found by binary search on the sorted column."""
+    start = np.searchsorted(column['values'], low, side='left')
+    stop = np.searchsorted(column['values'], high, side='right')
+    mask = np.zeros(size, dtype=bool)
+    mask[column['order'][start:stop]] = True
+    return mask
+
+
+def _matching_bits(bitsets, text, size, case=True):
+    """OR of the bitsets of every tag containing text, like a substring search on the column."""
+    if not case:
+        text = text.lower()
+    bits = np.zeros((size + 7) // 8, dtype=np.uint8)
+    for tag, tag_bits in bitsets.items():
+        if text in (tag if case else tag.lower()):
+            bits |= tag_bits
+    return bits
+
+
+def filter_mask(index, star_rating, fame_level, language_filter, runtime_max, release_year_range, genre_filters):
+    """Boolean mask (catalog order) of the movies that pass every recommendation filter.
+
+    star_rating, runtime_max and release_year_range may be None to skip that filter.
+    """
+    size = index['size']
+    bits = index['has_languages'].copy()
+    if language_filter:
+        bits &= _matching_bits(index['languages'], language_filter, size, case=False)
+    for genre in genre_filters or []:
+        bits &= _matching_bits(index['genres'], genre, size)
+    mask = np.unpackbits(bits, count=size).astype(bool)
+    mask &= index['trusted']
+    if star_rating is not None:
+        mask &= index['percentiles'] * 5 >= star_rating
+    if fame_level in FAME_LIMITS:
+        mask &= _range_mask(index['vote_count'], size, high=FAME_LIMITS[fame_level])
+    if runtime_max is not None:
+        mask &= _range_mask(index['runtime'], size, high=runtime_max)
+    if release_year_range is not None:
+        mask &= _range_mask(index['release_year'], size, *release_year_range)
+    return mask
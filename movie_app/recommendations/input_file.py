@@ -1,30 +1,152 @@
+import csv
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
 import streamlit as st
-import pandas as pd
 import docx
-import difflib
+from openpyxl import load_workbook
+from instrumentation import count, timed
+from .title_matcher import get_title_matcher, match_titles
 
-def upload_file(movie_options, key=None):
-    """Upload a file and return its content as a list of movie titles."""
+# Limits for a single upload; lines past MAX_UPLOAD_ROWS are ignored
+MAX_UPLOAD_ROWS = 5000
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+
+# Lines are matched in batches of this size so progress can be reported
+CHUNK_SIZE = 250
+
+# Matches of recently parsed files, keyed by content hash, shared by all sessions
+PARSED_CACHE_SIZE = 32
+_parsed_uploads = OrderedDict()
+_parsed_uploads_lock = threading.Lock()
+
+
+def _position(stream, size):
+    return min(1.0, stream.tell() / size) if size else 1.0
+
+
+def iter_txt(stream, size):
+    """Yield (line, fraction read) for a plain text file."""
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline=None)
+    try:
+        for line in text:
+            yield line.rstrip('\n'), _position(stream, size)
+    finally:
+        text.detach()  # leave the uploaded file open for later reruns
+
+
+def iter_csv(stream, size):
+    """Yield (first column, fraction read) for every non-empty CSV row."""
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    try:
+        for row in csv.reader(text):
+            if row:
+                yield row[0], _position(stream, size)
+    finally:
+        text.detach()
+
+
+def iter_xlsx(stream, size):
+    """Yield (first column, fraction read) for every row of the first sheet, streamed in read-only mode."""
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        total = sheet.max_row or 0
+        for number, (value,) in enumerate(sheet.iter_rows(max_col=1, values_only=True), start=1):
+            if value is not None:
+                yield str(value), min(1.0, number / total) if total else 0.0
+    finally:
+        workbook.close()
+
+
+def iter_docx(stream, size):
+    """Yield (paragraph text, fraction read) for every non-blank paragraph."""
+    paragraphs = docx.Document(stream).paragraphs
+    for number, paragraph in enumerate(paragraphs, start=1):
+        if paragraph.text.strip():
+            yield paragraph.text, number / len(paragraphs)
+
+
+READERS = {'.txt': iter_txt, '.csv': iter_csv, '.xlsx': iter_xlsx, '.docx': iter_docx}
+
+
+def iter_chunks(lines, size=CHUNK_SIZE):
+    """Group (line, fraction) pairs into lists of lines, yielding (chunk, fraction read)."""
+    chunk = []
+    fraction = 0.0
+    for line, fraction in lines:
+        chunk.append(line)
+        if len(chunk) == size:
+            yield chunk, fraction
+            chunk = []
+    if chunk:
+        yield chunk, fraction
+
+
+def parse_upload(stream, name, matcher, max_rows=MAX_UPLOAD_ROWS, progress=None):
+    """Stream the titles out of an uploaded file and match them in chunks with a title matcher.
+
+    Returns (matches, lines read, truncated). progress, if given, is called after each chunk
+    with (fraction read, lines read, titles matched).
+    """
+    reader = READERS[os.path.splitext(name)[1].lower()]
+    size = stream.seek(0, io.SEEK_END)
+    stream.seek(0)
+    matches = []
+    read = 0
+    truncated = False
+    lines = reader(stream, size)
+    for chunk, fraction in iter_chunks(lines):
+        if read + len(chunk) > max_rows:
+            chunk = chunk[:max_rows - read]
+            truncated = True
+        read += len(chunk)
+        matches.extend(match for match in match_titles(matcher, chunk) if match)
+        if progress:
+            progress(fraction, read, len(matches))
+        if truncated:
+            lines.close()
+            break
+    return matches, read, truncated
+
+
+@timed()
+def upload_file(df, key=None, max_rows=MAX_UPLOAD_ROWS, max_bytes=MAX_UPLOAD_BYTES):
+    """Upload a file and return its content as a list of titles of the catalog df."""
     uploaded_file = st.file_uploader("Choose a file", type=["txt", "csv", "xlsx", "docx"], key=key)
     if uploaded_file is not None:
-        if uploaded_file.name.endswith('.txt'):
-            content = uploaded_file.read().decode("utf-8").splitlines()
-        elif uploaded_file.name.endswith('.csv'):
-            content = pd.read_csv(uploaded_file, header=None).iloc[:, 0].astype(str).tolist()
-        elif uploaded_file.name.endswith('.xlsx'):
-            content = pd.read_excel(uploaded_file, header=None).iloc[:, 0].astype(str).tolist()
-        elif uploaded_file.name.endswith('.docx'):
-            doc = docx.Document(uploaded_file)
-            content = [para.text for para in doc.paragraphs if para.text.strip()]
-        else:
+        extension = os.path.splitext(uploaded_file.name)[1].lower()
+        if extension not in READERS:
             st.error("Unsupported file format")
             return []
+        if uploaded_file.size > max_bytes:
+            st.error(f"The file is larger than {max_bytes // (1024 * 1024)} MB")
+            return []
+
+        # Reruns and repeated uploads of the same file reuse the earlier matches
+        digest = hashlib.sha256(uploaded_file.getbuffer()).hexdigest()
+        matcher = get_title_matcher(df)
+        cache_key = (digest, extension, max_rows, matcher['fingerprint'])
+        with _parsed_uploads_lock:
+            if cache_key in _parsed_uploads:
+                _parsed_uploads.move_to_end(cache_key)
+                count('upload_cache.hits')
+                return list(_parsed_uploads[cache_key])
+
+        progress_bar = st.progress(0.0, text="Reading file...")
+        def report(fraction, read, found):
+            progress_bar.progress(fraction, text=f"Matched {found} of {read} lines")
+        matches, read, truncated = parse_upload(uploaded_file, uploaded_file.name, matcher, max_rows, report)
+        progress_bar.empty()
+        count('upload_lines', read)
+        if truncated:
+            st.warning(f"Only the first {max_rows} lines of the file were used.")
 
-        # Find closest matches for each line in the content
-        closest_matches = []
-        for line in content:
-            match = difflib.get_close_matches(line, movie_options.keys(), n=1, cutoff=0.6)
-            if match:
-                closest_matches.append(match[0])
-        return closest_matches
-    return []
\ No newline at end of file
+        with _parsed_uploads_lock:
+            _parsed_uploads[cache_key] = matches
+            while len(_parsed_uploads) > PARSED_CACHE_SIZE:
+                _parsed_uploads.popitem(last=False)
+        return list(matches)
+    return []
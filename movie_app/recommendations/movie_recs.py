@@ -1,7 +1,9 @@
 import streamlit as st
 import pandas as pd
+from instrumentation import timed
 from .display import recommendations_tab
 
+@timed()
 def load_recommendations_tab(movies_df):
     """Load the recommendations tab with the given DataFrame."""
     if not movies_df.empty:
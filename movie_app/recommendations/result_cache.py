@@ -0,0 +1,174 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+import numpy as np
+from instrumentation import count
+from .filter_index import FAME_LIMITS
+
+# Bytes of cached results kept in memory per process
+MAX_BYTES = 32 * 1024 * 1024
+
+# Seconds a cached result stays valid
+TTL_SECONDS = 6 * 60 * 60
+
+# Optional SQLite file that keeps results across restarts and shares them between processes
+DISK_PATH = os.environ.get('MOVIEREX_RESULT_CACHE')
+
+# Bytes of result data kept in the SQLite file before the least recently used rows are dropped
+DISK_MAX_BYTES = 256 * 1024 * 1024
+
+# Bookkeeping charged per entry on top of the result arrays
+_ENTRY_OVERHEAD = 200
+
+# key -> (expires at, bytes, (positions, scores)), least recently used first
+_entries = OrderedDict()
+_entries_lock = threading.Lock()
+_memory_bytes = 0
+_stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+
+def _number(value):
+    return None if value is None else float(value)
+
+
+def cache_key(kind, version, scoring, **query):
+    """Key of a cached query; version is the dataset_version of the catalog and scoring the scoring_fingerprint of
+    the profile ranking it, so results never outlive their file or the weights and signals they were scored with.
+    """
+    return json.dumps(dict(query, kind=kind, dataset=list(version), scoring=scoring), sort_keys=True, separators=(',', ':'))
+
+
+def recommendation_key(version, scoring, movie_ids, star_rating, fame_level, language_filter, runtime_max, release_year_range,
+                       genre_filters, limit, approximate=False, cooccurrence=None):
+    """Canonical key of a multi-seed query: seeds and genres sorted and deduplicated, numbers as floats.
+
+    approximate marks results ranked from an LSH shortlist, which are kept apart from exact ones;
+    cooccurrence is the generation of the watchlist model the scores include, if any.
+    """
+    return cache_key('recommendations', version, scoring, seeds=sorted({int(movie_id) for movie_id in movie_ids}),
+                     star_rating=_number(star_rating), fame_level=fame_level if fame_level in FAME_LIMITS else None,
+                     language=language_filter or "", runtime_max=_number(runtime_max),
+                     years=None if release_year_range is None else [_number(year) for year in release_year_range],
+                     genres=sorted(set(genre_filters or ())), limit=limit, approximate=approximate,
+                     cooccurrence=cooccurrence)
+
+
+def _size(result):
+    return sum(array.nbytes for array in result) + _ENTRY_OVERHEAD
+
+
+def _count(name):
+    with _entries_lock:
+        _stats[name] += 1
+    count(f"result_cache.{name}")
+
+
+def _remember(key, result, expires):
+    global _memory_bytes
+    for array in result:
+        array.flags.writeable = False  # shared by every caller that hits this entry
+    size = _size(result)
+    if size > MAX_BYTES:
+        return
+    with _entries_lock:
+        if key in _entries:
+            _memory_bytes -= _entries.pop(key)[1]
+        _entries[key] = (expires, size, result)
+        _memory_bytes += size
+        while _memory_bytes > MAX_BYTES:
+            _memory_bytes -= _entries.popitem(last=False)[1][1]
+            _stats['evictions'] += 1
+
+
+def _lookup(key, now):
+    global _memory_bytes
+    with _entries_lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            _memory_bytes -= _entries.pop(key)[1]
+            _stats['expirations'] += 1
+            return None
+        _entries.move_to_end(key)
+        _stats['hits'] += 1
+    count('result_cache.hits')
+    return entry[2]
+
+
+def _connect(path):
+    connection = sqlite3.connect(path, timeout=5)
+    connection.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, expires REAL, accessed REAL, "
+                       "bytes INTEGER, positions BLOB, scores BLOB)")
+    return connection
+
+
+def _disk_lookup(path, key, now):
+    with closing(_connect(path)) as connection, connection:
+        row = connection.execute("SELECT expires, positions, scores FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[0] <= now:
+            connection.execute("DELETE FROM results WHERE key = ?", (key,))
+            return None
+        connection.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+    return row[0], (np.frombuffer(row[1], dtype=np.int64).copy(), np.frombuffer(row[2], dtype=np.float64).copy())
+
+
+def _disk_store(path, key, result, expires, now):
+    positions, scores = result
+    with closing(_connect(path)) as connection, connection:
+        connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                           (key, expires, now, _size(result), positions.astype(np.int64).tobytes(),
+                            scores.astype(np.float64).tobytes()))
+        connection.execute("DELETE FROM results WHERE expires <= ?", (now,))
+        # Drop least recently used rows beyond the size limit
+        connection.execute("DELETE FROM results WHERE key IN (SELECT key FROM (SELECT key, SUM(bytes) OVER "
+                           "(ORDER BY accessed DESC) AS total FROM results) WHERE total > ?)", (DISK_MAX_BYTES,))
+
+
+def cached_result(key, compute, ttl=TTL_SECONDS, disk_path=None):
+    """Return the (positions, scores) result cached under key, or compute, cache and return it.
+
+    Results are looked up in memory first, then in the SQLite store when one is configured
+    (disk_path, or the MOVIEREX_RESULT_CACHE environment variable). None results are not cached.
+    Cached arrays are shared between callers and must not be modified.
+    """
+    disk_path = disk_path or DISK_PATH
+    now = time.time()
+    result = _lookup(key, now)
+    if result is not None:
+        return result
+    if disk_path:
+        stored = _disk_lookup(disk_path, key, now)
+        if stored is not None:
+            _count('disk_hits')
+            _remember(key, stored[1], stored[0])
+            return stored[1]
+    _count('misses')
+    result = compute()
+    if result is not None:
+        _remember(key, result, now + ttl)
+        if disk_path:
+            _disk_store(disk_path, key, result, now + ttl, now)
+    return result
+
+
+def cache_stats():
+    """Hit/miss/eviction counters plus the current entry count and memory use."""
+    with _entries_lock:
+        return dict(_stats, entries=len(_entries), bytes=_memory_bytes)
+
+
+def clear_result_cache():
+    """Drop every in-memory entry and reset the counters (the SQLite store is left alone)."""
+    global _memory_bytes
+    with _entries_lock:
+        _entries.clear()
+        _memory_bytes = 0
+        for name in _stats:
+            _stats[name] = 0
@@ -0,0 +1,622 @@
+import hashlib
+import json
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from catalog.provider import cached_for_frame, register_frame_updater
+from catalog.storage import SEPARATOR, encoded_lists, splice_rows, take_rows
+
+# Part of every scoring fingerprint; bump it when scores change in a way the weights, components and
+# signals do not show (a new formula, a different bonus), so cached results of the old scoring are not served
+SCORING_VERSION = 1
+
+# Penalty given to a candidate that is one of the seeds or shares its collection
+EXCLUDED_SCORE = -1_000_000
+
+# Only the top-billed cast members take part in the cast similarity
+CAST_LIMIT = 8
+
+# Tag components: column -> (tags kept per movie, compared by Jaccard or as exact sets)
+COMPONENTS = {'genres': (None, 'jaccard'), 'keywords': (None, 'jaccard'), 'directors': (None, 'exact'),
+              'cast': (CAST_LIMIT, 'jaccard'), 'spoken_languages': (None, 'jaccard')}
+
+# Components with a vocabulary this small (genres, languages) are also kept as dense arrays,
+# which multiply faster than sparse matrices with mostly non-zero products
+DENSE_VOCABULARY = 512
+
+# Columns listing titles of related movies; a seed whose list names a movie gives it 0.1 per list
+LINK_COLUMNS = ('recommendations', 'similar_movies')
+
+# Pair breakdowns of up to this many pairs intersect tag codes pair by pair, which beats the array setup cost
+FEW_PAIRS = 32
+
+# Named weight profiles: component weights, applied in this order, weights of the signals that
+# are available, and the score of a candidate that is the seed itself or shares its collection.
+# The title bonus is added on top of every profile.
+WEIGHT_PROFILES = {
+    # Recommendations tab, HTTP service and batch jobs
+    'recommendations': {'weights': {'genres': 0.3, 'keywords': 0.2, 'directors': 0.2, 'cast': 0.1, 'spoken_languages': 0.1},
+                        'signals': {'cooccurrence': 0.2}, 'excluded_score': EXCLUDED_SCORE},
+    # Similar movies on the detail page
+    'details': {'weights': {'genres': 0.4, 'keywords': 0.3, 'directors': 0.2, 'cast': 0.1},
+                'excluded_score': 0},
+}
+
+# Scores that are not tag overlaps, registered by the modules computing them (recommendations.cooccurrence):
+# name -> (scores(features, seed_positions, rows) giving a sparse (rows x seeds) matrix, pairs(features,
+# sources, candidates) giving one score per pair). Either returns None while the signal has nothing
+# to add, and the profiles weighing it then score as if it had no weight.
+SIGNALS = {}
+
+
+def register_signal(name, scores, pairs):
+    """Make a signal available to the profiles that give it a weight under 'signals'."""
+    SIGNALS[name] = (scores, pairs)
+
+
+def scoring_fingerprint(profile='recommendations'):
+    """Short hash of everything the scores of a profile depend on besides the data, for cache keys.
+
+    Covers the profile's weights, the components and link columns, the registered signals and SCORING_VERSION.
+    """
+    definition = {'version': SCORING_VERSION, 'profile': WEIGHT_PROFILES[profile], 'components': COMPONENTS,
+                  'links': LINK_COLUMNS, 'signals': sorted(SIGNALS)}
+    return hashlib.sha256(json.dumps(definition, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def tag_matrix(column, limit=None):
+    """Binary CSR matrix (rows x vocabulary) of an encoded list column, keeping the first limit tags of each row.
+
+    A missing value counts as the single empty tag, as value.split(', ') does on fillna('').
+    """
+    vocabulary = column['vocabulary']
+    offsets = column['offsets'].astype(np.int64)
+    lengths = np.diff(offsets) if limit is None else np.minimum(np.diff(offsets), limit)
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    firsts = np.cumsum(lengths) - lengths
+    columns = column['codes'][np.repeat(offsets[:-1] - firsts, lengths) + np.arange(len(rows))]
+    missing = np.flatnonzero(~column['valid'])
+    empty = vocabulary.index('') if '' in vocabulary else len(vocabulary)
+    rows = np.concatenate([rows, missing])
+    columns = np.concatenate([columns, np.full(len(missing), empty, dtype=columns.dtype)])
+    matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, columns)),
+                               shape=(len(lengths), max(len(vocabulary), empty + 1)))
+    matrix.data[:] = 1  # repeated tags in a row were summed
+    return matrix
+
+
+def build_features(df):
+    """Precompute the sparse tag matrices and scalar columns used for scoring."""
+    features = {'components': {}, 'sizes': {}, 'dense': {}}
+    encoded = encoded_lists(df)
+    for name, (limit, _) in COMPONENTS.items():
+        matrix = tag_matrix(encoded[name], limit)
+        features['components'][name] = matrix
+        features['sizes'][name] = np.diff(matrix.indptr).astype(np.float64)
+        if matrix.shape[1] <= DENSE_VOCABULARY:
+            features['dense'][name] = matrix.toarray()
+    features['vocabularies'] = {name: encoded[name]['vocabulary'] for name in COMPONENTS}
+    features['ids'] = df['id'].to_numpy()
+    features['collections'] = pd.factorize(df['belongs_to_id'])[0]  # -1 for movies outside a collection
+    features['titles'] = df['original_title'].tolist()
+    features['title_index'] = build_title_index(features['titles'], _votes(df))
+    features['links'] = {column: link_matrix(encoded[column], features['title_index'], len(df)) for column in LINK_COLUMNS}
+    return features
+
+
+def get_features(df):
+    """Return the features of a catalog DataFrame, built once and reused across queries."""
+    return cached_for_frame(df, 'features', build_features)
+
+
+def _patched_list(values, column, positions):
+    values = values + [None] * (len(column) - len(values))
+    for position, value in zip(positions.tolist(), column.iloc[positions].tolist()):
+        values[position] = value
+    return values
+
+
+def update_features(features, previous, frame, positions):
+    """Features of frame from those of previous, recomputing only the rows at positions.
+
+    Tag matrix and link rows are spliced in from the updated encoded columns (new tags become
+    new columns) and the title index moves only the changed titles.
+    """
+    encoded = encoded_lists(frame)
+    updated = {'components': {}, 'sizes': {}, 'dense': {}}
+    for name, (limit, _) in COMPONENTS.items():
+        old = features['components'][name]
+        delta = tag_matrix(take_rows(encoded[name], positions), limit)
+        indptr, indices = splice_rows(old.indptr, old.indices, positions, delta.indptr, delta.indices, len(frame))
+        matrix = sparse.csr_matrix((np.ones(len(indices), dtype=np.float32), indices, indptr),
+                                   shape=(len(frame), max(old.shape[1], delta.shape[1])))
+        updated['components'][name] = matrix
+        updated['sizes'][name] = np.diff(matrix.indptr).astype(np.float64)
+        if matrix.shape[1] <= DENSE_VOCABULARY:
+            updated['dense'][name] = matrix.toarray()
+    updated['vocabularies'] = {name: encoded[name]['vocabulary'] for name in COMPONENTS}
+    updated['ids'] = frame['id'].to_numpy()
+    updated['collections'] = pd.factorize(frame['belongs_to_id'])[0]
+    updated['titles'] = _patched_list(features['titles'], frame['original_title'], positions)
+    updated['title_index'] = update_title_index(features['title_index'], features['titles'], updated['titles'],
+                                                _votes(frame), positions)
+    # Titles now naming another movie (or none): the lists naming them are relinked too
+    titles = {features['titles'][position] for position in positions.tolist() if position < len(features['titles'])}
+    titles.update(updated['titles'][position] for position in positions.tolist())
+    moved = [title for title in titles if features['title_index']['movie'].get(title) != updated['title_index']['movie'].get(title)]
+    updated['links'] = {column: update_links(features['links'][column], encoded[column], updated['title_index'], positions, moved)
+                        for column in LINK_COLUMNS}
+    return updated
+
+
+register_frame_updater('features', update_features)
+
+
+def _votes(df):
+    return np.nan_to_num(df['vote_count'].to_numpy(dtype=np.float64), nan=-1.0)
+
+
+def _multipart(title):
+    return isinstance(title, str) and SEPARATOR in title
+
+
+def _first_part(title):
+    return title.split(SEPARATOR, 1)[0]
+
+
+def build_title_index(titles, votes):
+    """Map each title to the positions carrying it and to the 'movie' a list naming it links to.
+
+    A title several movies share names the one with the most votes, the first of those in
+    catalog order. Titles containing ', ' are also kept under their first part ('multipart'),
+    as lists are split there.
+    """
+    codes, uniques = pd.factorize(pd.Series(titles, dtype=object), use_na_sentinel=False)
+    uniques = list(uniques)
+    # Positions grouped by title, each group in catalog order and led by its most voted movie
+    by_votes = np.lexsort((-votes, codes))
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(codes[by_votes])) + 1])[:len(uniques)]
+    by_position = np.argsort(codes, kind='stable')
+    multipart = {}
+    for title in uniques:
+        if _multipart(title):
+            multipart.setdefault(_first_part(title), []).append(title)
+    return {'positions': dict(zip(uniques, np.split(by_position.astype(np.int64), starts[1:]))),
+            'movie': dict(zip(uniques, by_votes[starts].tolist())), 'multipart': multipart}
+
+
+def update_title_index(title_index, old_titles, titles, votes, positions):
+    """The index build_title_index(titles, votes) would give, from the index of old_titles, when only the rows at positions differ."""
+    index, movie = dict(title_index['positions']), dict(title_index['movie'])
+    multipart = {part: list(names) for part, names in title_index['multipart'].items()}
+    removed, added = {}, {}
+    for position in positions.tolist():
+        if position < len(old_titles):
+            removed.setdefault(old_titles[position], []).append(position)
+        added.setdefault(titles[position], []).append(position)
+    for title in removed.keys() | added.keys():
+        rows = np.setdiff1d(index.get(title, np.empty(0, dtype=np.int64)), removed.get(title, []))
+        rows = np.union1d(rows, added.get(title, [])).astype(np.int64)
+        if _multipart(title) and title not in index and len(rows):
+            multipart.setdefault(_first_part(title), []).append(title)
+        elif _multipart(title) and title in index and not len(rows):
+            multipart[_first_part(title)].remove(title)
+        if len(rows):
+            index[title] = rows
+            movie[title] = int(rows[np.argmax(votes[rows])])  # votes may have changed too
+        else:
+            del index[title], movie[title]
+    return {'positions': index, 'movie': movie, 'multipart': {part: names for part, names in multipart.items() if names}}
+
+
+def link_matrix(column, title_index, size):
+    """Binary (rows x size) CSR matrix linking each row of an encoded list column to the movies its list names.
+
+    An entry names a title when it equals it, and a title containing ', ' is named by as many
+    consecutive entries; the link goes to the movie title_index has for the title.
+    """
+    vocabulary, movie, multipart = column['vocabulary'], title_index['movie'], title_index['multipart']
+    offsets, codes = column['offsets'].astype(np.int64), column['codes']
+    # Each word is looked up once: the whole vocabulary, or the words of the few rows given
+    words, inverse = (np.arange(len(vocabulary)), codes) if len(codes) >= len(vocabulary) else np.unique(codes, return_inverse=True)
+    words = [vocabulary[code] for code in words.tolist()]
+    targets = np.array([movie.get(word, -1) for word in words], dtype=np.int64)[inverse]
+    row_of = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    rows, columns = [row_of[targets >= 0]], [targets[targets >= 0]]
+    if multipart:
+        starts = np.array([word in multipart for word in words], dtype=bool)[inverse]
+        for entry in np.flatnonzero(starts).tolist():
+            row = row_of[entry]
+            for title in multipart[vocabulary[codes[entry]]]:
+                parts = title.split(SEPARATOR)
+                if entry + len(parts) <= offsets[row + 1] and \
+                        [vocabulary[code] for code in codes[entry:entry + len(parts)].tolist()] == parts:
+                    rows.append([row])
+                    columns.append([movie[title]])
+    rows, columns = np.concatenate(rows), np.concatenate(columns)
+    matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, columns)), shape=(len(offsets) - 1, size))
+    matrix.data[:] = 1  # a title listed twice links once
+    return matrix
+
+
+def update_links(links, column, title_index, positions, titles):
+    """link_matrix of an updated column from the links before, when the rows at positions changed and titles name other movies.
+
+    Only those rows and the rows whose lists name one of titles are linked again.
+    """
+    size = len(column['offsets']) - 1
+    lookup = column.get('lookup') or {word: code for code, word in enumerate(column['vocabulary'])}
+    wanted = [lookup[word] for word in {part for title in titles for part in (title, _first_part(title))} if word in lookup]
+    rows = positions
+    if wanted:
+        entries = np.flatnonzero(np.isin(column['codes'], wanted))
+        rows = np.union1d(positions, np.searchsorted(column['offsets'], entries, side='right') - 1)
+    delta = link_matrix(take_rows(column, rows), title_index, size)
+    indptr, indices = splice_rows(links.indptr, links.indices, rows, delta.indptr, delta.indices, size)
+    return sparse.csr_matrix((np.ones(len(indices), dtype=np.int8), indices, indptr), shape=(size, size))
+
+
+def linked_positions(features, seed_positions, hops=1):
+    """Positions of the movies the seeds' lists name, then (hops > 1) of those their lists name, and so on; seeds left out."""
+    seed_positions = np.asarray(seed_positions, dtype=np.int64)
+    reached, frontier = seed_positions, seed_positions
+    for _ in range(hops):
+        found = np.concatenate([features['links'][column][frontier].indices for column in LINK_COLUMNS]).astype(np.int64)
+        frontier = np.setdiff1d(found, reached)
+        if not len(frontier):
+            break
+        reached = np.union1d(reached, frontier)
+    return np.setdiff1d(reached, seed_positions)
+
+
+def names_title(value, title):
+    """Whether a comma-joined list value (recommendations, similar_movies) has title as one of its entries."""
+    return pd.notna(value) and f"{SEPARATOR}{title}{SEPARATOR}" in f"{SEPARATOR}{value}{SEPARATOR}"
+
+
+def component_overlap(features, name, seed_positions, rows=None):
+    """Return the tag intersection counts (rows x seeds) and the tag counts of both sides.
+
+    rows restricts the result to those catalog positions (all rows when None).
+    """
+    matrix = features.get('dense', {}).get(name, features['components'][name])
+    sizes = features['sizes'][name]
+    if rows is not None:
+        matrix, row_sizes = matrix[rows], sizes[rows]
+    else:
+        row_sizes = sizes
+    intersection = matrix @ features['components'][name][seed_positions].T
+    if not isinstance(intersection, np.ndarray):
+        intersection = intersection.toarray()
+    intersection = intersection.astype(np.float64)
+    return intersection, row_sizes[:, None], sizes[seed_positions][None, :]
+
+
+def jaccard_scores(features, name, seed_positions, rows=None):
+    """Jaccard similarity of every row against every seed for one tag component."""
+    intersection, row_sizes, seed_sizes = component_overlap(features, name, seed_positions, rows)
+    union = row_sizes + seed_sizes - intersection
+    # An empty union has an empty intersection, so dividing by 1 gives the 0 it scores
+    np.maximum(union, 1, out=union)
+    intersection /= union
+    return intersection
+
+
+def exact_match_scores(features, name, seed_positions, rows=None):
+    """1 where a row has exactly the same tag set as the seed, 0 otherwise."""
+    intersection, row_sizes, seed_sizes = component_overlap(features, name, seed_positions, rows)
+    return ((intersection == row_sizes) & (intersection == seed_sizes)).astype(np.float64)
+
+
+def title_bonus_rows(features, seed_positions):
+    """Sparse (seeds x catalog) matrix of the title bonus each seed gives, for reuse across many queries."""
+    links = [features['links'][column][seed_positions] for column in LINK_COLUMNS]
+    # A movie named in both lists gets 2 * 0.1
+    matrix = (links[0] + links[1]).astype(np.float64)
+    matrix.data *= 0.1
+    return matrix
+
+
+def title_bonus(features, seed_positions, rows=None):
+    """0.1 per seed list (recommendations, similar_movies) that names the row's movie."""
+    if 'bonus_rows' in features:
+        # Precomputed by title_bonus_rows; bonus_row_of maps a catalog position to its row
+        matrix = features['bonus_rows'][features['bonus_row_of'][seed_positions]]
+    else:
+        matrix = title_bonus_rows(features, seed_positions)
+    return (matrix if rows is None else matrix[:, rows]).T.toarray()
+
+
+def excluded_mask(features, seed_positions, rows=None):
+    """True where a row is the seed itself or belongs to the seed's collection."""
+    ids = features['ids'] if rows is None else features['ids'][rows]
+    collections = features['collections'] if rows is None else features['collections'][rows]
+    same_id = ids[:, None] == features['ids'][seed_positions][None, :]
+    same_collection = (collections[:, None] == features['collections'][seed_positions][None, :]) & (collections[:, None] >= 0)
+    return same_id | same_collection
+
+
+def _profile(profile):
+    """A profile given by name (WEIGHT_PROFILES) or as a {'weights', 'excluded_score'} dict."""
+    return WEIGHT_PROFILES[profile] if isinstance(profile, str) else profile
+
+
+def component_score(features, name, seed_positions, rows=None):
+    """(rows x seeds) similarity for one tag component, by Jaccard or exact set match as COMPONENTS says."""
+    similarity = exact_match_scores if COMPONENTS[name][1] == 'exact' else jaccard_scores
+    return similarity(features, name, seed_positions, rows)
+
+
+def signal_scores(features, names, seed_positions, rows=None):
+    """{signal name: sparse (rows x seeds) scores} of the named signals that are registered and have something to add."""
+    scores = {}
+    for name in names:
+        if name in SIGNALS:
+            values = SIGNALS[name][0](features, seed_positions, rows)
+            if values is not None:
+                scores[name] = values
+    return scores
+
+
+def component_scores(features, seed_positions, rows=None, profiles=('recommendations',)):
+    """Similarity of catalog rows (all, or the given positions) to each seed, one (rows x seeds) array per component.
+
+    Only the components and signals the profiles weigh are computed. The result also holds the
+    title bonus and the exclusion mask, so weighted_scores can apply any number of profiles to it cheaply.
+    """
+    seed_positions = np.asarray(seed_positions, dtype=np.int64)
+    scores = {name: component_score(features, name, seed_positions, rows) for name in COMPONENTS
+              if any(name in _profile(profile)['weights'] for profile in profiles)}
+    signals = dict.fromkeys(name for profile in profiles for name in _profile(profile).get('signals', {}))
+    scores.update(signal_scores(features, signals, seed_positions, rows))
+    scores['title_bonus'] = title_bonus(features, seed_positions, rows)
+    scores['excluded'] = excluded_mask(features, seed_positions, rows)
+    return scores
+
+
+def _combine(terms, bonus, excluded, profile):
+    # Summed left to right in place; the first term starts the sum, as 0 + x == x
+    scores = None
+    for term in terms:
+        if scores is None:
+            scores = term.toarray() if sparse.issparse(term) else term
+        elif sparse.issparse(term):
+            # Signals are sparse; adding only their stored entries gives the same sums, as x + 0 == x
+            term = term.tocoo()
+            scores[term.row, term.col] += term.data
+        else:
+            scores += term
+    scores += bonus
+    np.copyto(scores, profile['excluded_score'], where=excluded)
+    return scores
+
+
+def weighted_scores(components, profile='recommendations'):
+    """Combine component_scores into (rows x seeds) scores with the weights of one profile."""
+    profile = _profile(profile)
+    weights = list(profile['weights'].items())
+    weights += [(name, weight) for name, weight in profile.get('signals', {}).items() if name in components]
+    terms = (weight * components[name] for name, weight in weights)
+    return _combine(terms, components['title_bonus'], components['excluded'], profile)
+
+
+def seed_scores(features, seed_positions, rows=None, profile='recommendations'):
+    """Score catalog rows (all, or the given positions) against each seed with one weight profile.
+
+    Equal to weighted_scores(component_scores(...), profile), computed one component at a time.
+    """
+    profile = _profile(profile)
+    seed_positions = np.asarray(seed_positions, dtype=np.int64)
+
+    def terms():
+        for name, weight in profile['weights'].items():
+            term = component_score(features, name, seed_positions, rows)
+            term *= weight
+            yield term
+        for name, term in signal_scores(features, profile.get('signals', {}), seed_positions, rows).items():
+            yield term * profile['signals'][name]
+
+    return _combine(terms(), title_bonus(features, seed_positions, rows), excluded_mask(features, seed_positions, rows), profile)
+
+
+def _seed_positions(features, movie_ids):
+    return np.flatnonzero(np.isin(features['ids'], list(movie_ids)))
+
+
+def _total(scores):
+    # Accumulate seed by seed so the result matches a Python sum over the seeds
+    total = np.zeros(scores.shape[0])
+    for j in range(scores.shape[1]):
+        total += scores[:, j]
+    return total
+
+
+def score_movies(df, movie_ids, rows=None, profile='recommendations'):
+    """Sum the similarity of movies in df to the seed movies.
+
+    Returns an array in catalog order, or aligned with rows when only those positions are scored.
+    """
+    features = get_features(df)
+    return _total(seed_scores(features, _seed_positions(features, movie_ids), rows, profile))
+
+
+def score_profiles(df, movie_ids, profiles, rows=None):
+    """score_movies for several profiles at once ({profile name: scores}), sharing the component scores.
+
+    profiles maps names to WEIGHT_PROFILES names or profile dicts, e.g. for comparing weight variants.
+    """
+    features = get_features(df)
+    components = component_scores(features, _seed_positions(features, movie_ids), rows, list(profiles.values()))
+    return {name: _total(weighted_scores(components, profile)) for name, profile in profiles.items()}
+
+
+def _shared_codes(matrix, sources, candidates):
+    """Offsets (pairs + 1) into the sorted codes of the tags each (source, candidate) pair of rows shares."""
+    indptr, indices = matrix.indptr, matrix.indices
+    if len(sources) <= FEW_PAIRS:
+        shared = [sorted(set(indices[indptr[source]:indptr[source + 1]].tolist()).intersection(
+                      indices[indptr[candidate]:indptr[candidate + 1]].tolist()))
+                  for source, candidate in zip(sources.tolist(), candidates.tolist())]
+        counts = np.array([len(codes) for codes in shared], dtype=np.int64)
+        codes = np.array([code for codes in shared for code in codes], dtype=indices.dtype)
+    else:
+        width = np.int64(matrix.shape[1])
+        # Tags are unique within a row, so keying them by pair makes the overlap a set intersection
+        keys = [pairs * width + codes for pairs, codes in (_row_tags(matrix, sources), _row_tags(matrix, candidates))]
+        shared = np.intersect1d(keys[0], keys[1], assume_unique=True)
+        counts = np.bincount(shared // width, minlength=len(sources))
+        codes = shared % width
+    return np.concatenate([[0], np.cumsum(counts)]), codes
+
+
+def _row_tags(matrix, rows):
+    """(row number in rows, tag code) of every tag of the given rows of a CSR tag matrix, grouped by row."""
+    starts, stops = matrix.indptr[rows], matrix.indptr[np.asarray(rows) + 1]
+    lengths = stops - starts
+    gather = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+    return np.repeat(np.arange(len(rows)), lengths), matrix.indices[gather]
+
+
+def pair_breakdowns(features, sources, candidates, profile='recommendations'):
+    """Score breakdown of each (sources[i], candidates[i]) pair, scored as seed_scores scores candidates against a seed.
+
+    Besides the 'scores', holds the weighted 'contributions' of the components and available
+    signals the profile weighs, the 'overlaps' of every component (offsets into the sorted codes
+    of the tags each pair shares), whether the source's recommendations and similar_movies
+    'mentions' the candidate, the 'title_bonus' and the 'excluded' mask. Arrays have
+    one entry per pair.
+    """
+    profile = _profile(profile)
+    sources = np.asarray(sources, dtype=np.int64)
+    candidates = np.asarray(candidates, dtype=np.int64)
+    breakdown = {'contributions': {}, 'overlaps': {}, 'mentions': {}}
+    for name, (_, kind) in COMPONENTS.items():
+        offsets, codes = _shared_codes(features['components'][name], sources, candidates)
+        breakdown['overlaps'][name] = {'offsets': offsets, 'codes': codes}
+        if name not in profile['weights']:
+            continue
+        intersection = np.diff(offsets).astype(np.float64)
+        source_sizes, candidate_sizes = features['sizes'][name][sources], features['sizes'][name][candidates]
+        if kind == 'exact':
+            similarity = ((intersection == candidate_sizes) & (intersection == source_sizes)).astype(np.float64)
+        else:
+            similarity = intersection / np.maximum(candidate_sizes + source_sizes - intersection, 1)
+        breakdown['contributions'][name] = similarity * profile['weights'][name]
+    for name, weight in profile.get('signals', {}).items():
+        values = SIGNALS[name][1](features, sources, candidates) if name in SIGNALS else None
+        if values is not None:
+            breakdown['contributions'][name] = values * weight
+    bonus = np.zeros(len(sources))
+    for column in LINK_COLUMNS:
+        mentioned = np.asarray(features['links'][column][sources, candidates]).ravel() > 0
+        breakdown['mentions'][column] = mentioned
+        bonus += mentioned * 0.1
+    breakdown['title_bonus'] = bonus
+    ids, collections = features['ids'], features['collections']
+    breakdown['excluded'] = (ids[sources] == ids[candidates]) | \
+        ((collections[sources] == collections[candidates]) & (collections[candidates] >= 0))
+    names = list(profile['weights']) + [name for name in profile.get('signals', {}) if name in breakdown['contributions']]
+    terms = (breakdown['contributions'][name].copy() for name in names)
+    breakdown['scores'] = _combine(terms, bonus, breakdown['excluded'], profile)
+    return breakdown
+
+
+def shared_tags(features, breakdown, name, pair):
+    """The tags of one component both movies of breakdown's pair-th pair have, sorted; the empty tag is left out."""
+    overlap = breakdown['overlaps'][name]
+    vocabulary = features['vocabularies'][name]
+    # Codes past the vocabulary stand for the empty tag of missing lists (see tag_matrix)
+    tags = (vocabulary[code] for code in overlap['codes'][overlap['offsets'][pair]:overlap['offsets'][pair + 1]].tolist()
+            if code < len(vocabulary))
+    return sorted(tag for tag in tags if tag)
+
+
+def _id_positions(df):
+    return {movie_id: position for position, movie_id in enumerate(df['id'].tolist())}
+
+
+def id_positions(df):
+    """Map of movie id to catalog position, built once per frame."""
+    return cached_for_frame(df, 'id_positions', _id_positions)
+
+
+def score_breakdowns(df, pairs, profile='recommendations'):
+    """Score breakdowns of (movie id, candidate movie id) pairs, as JSON-ready dicts in the order given.
+
+    Each holds the total 'score', the weighted contribution of each component, the title
+    bonus and the seed lists mentioning the candidate, whether the pair is excluded, and the
+    shared tags of every component.
+    Raises ValueError for an id that is not in the catalog.
+    """
+    features = get_features(df)
+    positions = id_positions(df)
+    missing = [movie_id for pair in pairs for movie_id in pair if movie_id not in positions]
+    if missing:
+        raise ValueError(f"Movie {missing[0]} is not in the catalog")
+    sources = np.array([positions[source] for source, _ in pairs], dtype=np.int64)
+    candidates = np.array([positions[candidate] for _, candidate in pairs], dtype=np.int64)
+    breakdown = pair_breakdowns(features, sources, candidates, profile)
+    return [{'movie_id': int(features['ids'][source]), 'candidate_id': int(features['ids'][candidate]),
+             'score': float(breakdown['scores'][i]),
+             'contributions': {name: float(values[i]) for name, values in breakdown['contributions'].items()},
+             'title_bonus': float(breakdown['title_bonus'][i]),
+             'mentions': {column: bool(values[i]) for column, values in breakdown['mentions'].items()},
+             'excluded': bool(breakdown['excluded'][i]),
+             'shared': {name: shared_tags(features, breakdown, name, i) for name in COMPONENTS}}
+            for i, (source, candidate) in enumerate(zip(sources.tolist(), candidates.tolist()))]
+
+
+def tag_set(value, limit=None):
+    """The tags of one comma-joined catalog value (the first limit), a missing value being the empty tag."""
+    return set(('' if pd.isna(value) else str(value)).split(', ')[:limit])
+
+
+def movie_similarity(movie1, movie2, profile='recommendations'):
+    """Score one pair of catalog rows, comma-joined columns as in the catalog, the way seed_scores does.
+
+    Signals are left out, as they need the catalog features. A list names movie2 when one of its
+    entries is movie2's title; in the catalog, a title several movies share names only one of them.
+    """
+    profile = _profile(profile)
+    if movie1['id'] == movie2['id'] or (pd.notna(movie1['belongs_to_id']) and pd.notna(movie2['belongs_to_id'])
+                                        and movie1['belongs_to_id'] == movie2['belongs_to_id']):
+        return profile['excluded_score']
+    score = 0
+    for name, weight in profile['weights'].items():
+        limit, kind = COMPONENTS[name]
+        tags1, tags2 = tag_set(movie1[name], limit), tag_set(movie2[name], limit)
+        if kind == 'exact':
+            similarity = 1 if tags1 == tags2 else 0
+        else:
+            similarity = len(tags1 & tags2) / len(tags1 | tags2)
+        score = score + weight * similarity
+    extra_points = 0
+    for column in LINK_COLUMNS:
+        if names_title(movie1[column], movie2['original_title']):
+            extra_points += 0.1
+    return score + extra_points
+
+
+def top_positions(scores, mask=None, groups=None, limit=7):
+    """Positions of the best scores (ties in catalog order), keeping only the first row of each group.
+
+    Only a partition of the score array is sorted; the partition grows until it holds
+    limit distinct groups or every candidate.
+    """
+    candidates = np.flatnonzero(mask) if mask is not None else np.arange(len(scores))
+    size = limit
+    while True:
+        size = min(size, len(candidates))
+        if size == 0:
+            return candidates[:0]
+        if size < len(candidates):
+            best = candidates[np.argpartition(-scores[candidates], size - 1)[:size]]
+        else:
+            best = candidates
+        best = best[np.lexsort((best, -scores[best]))]
+        if groups is not None:
+            _, first = np.unique(groups[best], return_index=True)
+            best = best[np.sort(first)]
+        if len(best) >= limit or size == len(candidates):
+            return best[:limit]
+        size *= 4
@@ -0,0 +1,104 @@
+import difflib
+import re
+from collections import Counter
+import numpy as np
+from scipy import sparse
+from catalog.lookup import recommendation_options
+from catalog.provider import cached_for_frame
+
+# Same cutoff upload_file used with difflib.get_close_matches
+CUTOFF = 0.6
+
+_YEAR_SUFFIX = re.compile(r'\s*\(\d{4}\)$')
+
+
+def normalize_title(text):
+    """Lower-case a title, drop a trailing "(Year)" and collapse whitespace."""
+    return ' '.join(_YEAR_SUFFIX.sub('', text.strip()).casefold().split())
+
+
+def build_title_matcher(keys):
+    """Index option keys for difflib-compatible closest-match lookups.
+
+    Besides exact and normalized-title hash maps, every key is stored as character counts
+    in a column-oriented sparse matrix (character -> keys posting lists). Summing
+    min(count in key, count in query) over the query's characters gives difflib's
+    quick_ratio for every key at once, an exact upper bound on ratio() used to skip
+    keys that cannot reach the cutoff.
+    """
+    keys = list(keys)
+    alphabet = {}
+    indptr = [0]
+    indices = []
+    counts = []
+    for key in keys:
+        for char, count in Counter(key).items():
+            indices.append(alphabet.setdefault(char, len(alphabet)))
+            counts.append(count)
+        indptr.append(len(indices))
+    char_counts = sparse.csr_matrix((np.asarray(counts, dtype=np.int32), np.asarray(indices, dtype=np.int32), indptr),
+                                    shape=(len(keys), len(alphabet))).tocsc()
+    normalized = {}
+    for position, key in enumerate(keys):
+        normalized.setdefault(normalize_title(key), []).append(position)
+    return {'keys': keys, 'fingerprint': hash(tuple(keys)), 'positions': {key: position for position, key in enumerate(keys)},
+            'normalized': normalized, 'alphabet': alphabet, 'char_counts': char_counts,
+            'lengths': np.array([len(key) for key in keys], dtype=np.float64)}
+
+
+def get_title_matcher(df):
+    """Return the matcher for the recommendation options of a catalog frame, built once per frame."""
+    return cached_for_frame(df, 'title_matcher', lambda frame: build_title_matcher(recommendation_options(frame)['movie_options']))
+
+
+def match_title(matcher, word, cutoff=CUTOFF):
+    """Return the same result as difflib.get_close_matches(word, keys, n=1, cutoff=cutoff), or None."""
+    if word in matcher['positions']:
+        return word  # ratio 1.0 is only reached by an identical key
+    keys = matcher['keys']
+    lengths = matcher['lengths']
+    total = lengths + len(word)
+    # real_quick_ratio: bound from the lengths alone
+    possible = 2.0 * np.minimum(lengths, len(word)) / np.where(total == 0, 1, total) >= cutoff
+    # quick_ratio: bound from the shared character counts
+    shared = np.zeros(len(keys))
+    char_counts = matcher['char_counts']
+    for char, count in Counter(word).items():
+        column = matcher['alphabet'].get(char)
+        if column is not None:
+            start, stop = char_counts.indptr[column], char_counts.indptr[column + 1]
+            shared[char_counts.indices[start:stop]] += np.minimum(char_counts.data[start:stop], count)
+    bound = np.where(total == 0, 1.0, 2.0 * shared / np.where(total == 0, 1, total))
+    candidates = np.flatnonzero(possible & (bound >= cutoff))
+    if not len(candidates):
+        return None
+
+    matcher_state = difflib.SequenceMatcher()
+    matcher_state.set_seq2(word)
+    best_ratio, best_key = -1.0, None
+
+    def consider(position):
+        nonlocal best_ratio, best_key
+        key = keys[position]
+        matcher_state.set_seq1(key)
+        ratio = matcher_state.ratio()
+        # get_close_matches breaks ties on the larger string
+        if ratio >= cutoff and (ratio, key) > (best_ratio, best_key or ''):
+            best_ratio, best_key = ratio, key
+
+    # Keys sharing the normalized title are likely winners; scoring them first tightens the bound early
+    for position in matcher['normalized'].get(normalize_title(word), []):
+        if possible[position] and bound[position] >= cutoff:
+            consider(position)
+    for position in candidates[np.argsort(-bound[candidates], kind='stable')]:
+        if bound[position] < best_ratio:
+            break
+        consider(position)
+    return best_key
+
+
+def match_titles(matcher, words, cutoff=CUTOFF):
+    """Match a batch of lines, scoring each distinct line once; returns one result (or None) per line."""
+    results = {}
+    return [results[word] if word in results else results.setdefault(word, match_title(matcher, word, cutoff))
+            for word in words]
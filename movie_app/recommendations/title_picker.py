@@ -0,0 +1,16 @@
+import streamlit as st
+from catalog.lookup import search_titles
+
+
+def title_picker(label, options, key, current=""):
+    """Search-as-you-type movie picker.
+
+    Only the titles matching the typed text (plus the current selection) are sent to the
+    browser, instead of the whole catalog for every select box.
+    """
+    query = st.text_input(label, key=f"{key}_query", placeholder="Type to search titles...")
+    choices = [""]
+    if current:
+        choices.append(current)
+    choices.extend(match for match in search_titles(options, query) if match != current)
+    return st.selectbox(label, choices, index=1 if current else 0, key=f"{key}_choice", label_visibility="collapsed")
@@ -0,0 +1,71 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+import numpy as np
+import pandas as pd
+from .server import DEFAULT_MOVIES_PATH
+
+
+async def _request(reader, writer, host, body):
+    writer.write((f"POST /recommendations HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n").encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def _client(host, port, movie_ids, seeds, deadline, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            body = json.dumps({'movie_ids': random.sample(movie_ids, seeds)}).encode()
+            start = time.perf_counter()
+            status = await _request(reader, writer, host, body)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def run(host, port, movie_ids, concurrency, duration, seeds):
+    """Keep concurrency connections busy for duration seconds; returns a summary dict."""
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, movie_ids, seeds, start + duration, latencies, errors)
+                           for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    milliseconds = np.array(latencies) * 1000
+    return {'requests': len(latencies), 'errors': len(errors), 'seconds': round(elapsed, 2),
+            'throughput_rps': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(float(np.percentile(milliseconds, 50)), 2) if len(latencies) else None,
+            'p99_ms': round(float(np.percentile(milliseconds, 99)), 2) if len(latencies) else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test a running recommendation service.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8600)
+    parser.add_argument('--movies', default=DEFAULT_MOVIES_PATH, help="catalog to sample seed ids from")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--seeds', type=int, default=3, help="seed movies per request")
+    args = parser.parse_args()
+    movie_ids = pd.read_parquet(args.movies, columns=['id'])['id'].tolist()
+    summary = asyncio.run(run(args.host, args.port, movie_ids, args.concurrency, args.duration, args.seeds))
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+import numpy as np
+from catalog.lazy import load_movies
+from individual_movies.neighbor_index import get_neighbors
+from instrumentation import trace
+from recommendations.core import recommend
+from recommendations.filter_index import FAME_LIMITS, get_filter_index
+from recommendations.similarity_engine import WEIGHT_PROFILES, get_features, id_positions, score_breakdowns, seed_scores, top_positions
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MOVIES_PATH = os.path.join(APP_DIR, 'movies_details.parquet')
+
+# Requests with a larger body are rejected
+MAX_BODY_BYTES = 64 * 1024
+
+# Most results a single request may ask for
+MAX_LIMIT = 100
+
+# Most pairs a single /explain request may ask for
+MAX_PAIRS = 1000
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+# Set in every worker process by _init_worker
+_movies_path = DEFAULT_MOVIES_PATH
+
+
+def _init_worker(movies_path):
+    """Load the catalog and build its scoring structures once per worker process."""
+    global _movies_path
+    _movies_path = movies_path
+    df = load_movies(movies_path)
+    get_features(df)
+    get_filter_index(df)
+
+
+def catalog_size_job():
+    return len(load_movies(_movies_path))
+
+
+def recommend_job(arguments):
+    """Run a multi-seed recommendation query in a worker process."""
+    with trace('recommendations', movie_ids=arguments['movie_ids']):
+        return recommend(load_movies(_movies_path), **arguments)
+
+
+def _scan_neighbors(df, position, limit):
+    """The limit best detail-page matches of the movie at position, scored from its own row."""
+    scores = seed_scores(get_features(df), [position], profile='details')[:, 0]
+    others = np.ones(len(scores), dtype=bool)
+    others[position] = False
+    return df.iloc[top_positions(scores, others, limit=limit)]
+
+
+def similar_job(movie_id, limit):
+    """Similar movies for one movie id, from the neighbor index or, when it holds fewer than limit, a live scan."""
+    with trace('similar', movie_id=movie_id):
+        df = load_movies(_movies_path)
+        position = id_positions(df).get(movie_id)
+        if position is None:
+            return None
+        recommendations = get_neighbors(df.iloc[position], df, limit)
+        if recommendations is None or len(recommendations) < limit:
+            recommendations = _scan_neighbors(df, position, limit)
+        return [{'id': int(row['id']), 'title': row['original_title'], 'year': int(row['release_year'])}
+                for _, row in recommendations.iterrows()]
+
+
+def explain_job(pairs, profile):
+    """Score breakdowns of (movie id, candidate id) pairs in a worker process."""
+    with trace('explain', pairs=len(pairs)):
+        return score_breakdowns(load_movies(_movies_path), pairs, profile)
+
+
+def _number(payload, name, default=None):
+    value = payload.get(name, default)
+    if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+        raise ValueError(f"'{name}' must be a number")
+    return value
+
+
+def _limit(payload, default):
+    limit = _number(payload, 'limit', default)
+    if not isinstance(limit, int) or not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f"'limit' must be an integer between 1 and {MAX_LIMIT}")
+    return limit
+
+
+def parse_recommendation_request(payload):
+    """Validate a /recommendations body and turn it into keyword arguments for recommend()."""
+    if not isinstance(payload, dict):
+        raise ValueError("The request body must be a JSON object")
+    movie_ids = payload.get('movie_ids')
+    if not isinstance(movie_ids, list) or not movie_ids or not all(isinstance(i, int) and not isinstance(i, bool) for i in movie_ids):
+        raise ValueError("'movie_ids' must be a non-empty list of integers")
+    fame_level = payload.get('fame_level', "Very Famous")
+    if fame_level not in FAME_LIMITS and fame_level != "Very Famous":
+        raise ValueError(f"'fame_level' must be one of {list(FAME_LIMITS) + ['Very Famous']}")
+    language_filter = payload.get('language', "")
+    if not isinstance(language_filter, str):
+        raise ValueError("'language' must be a string")
+    genre_filters = payload.get('genres', [])
+    if not isinstance(genre_filters, list) or not all(isinstance(genre, str) for genre in genre_filters):
+        raise ValueError("'genres' must be a list of strings")
+    release_year_range = payload.get('release_year_range')
+    if release_year_range is not None:
+        if not isinstance(release_year_range, list) or len(release_year_range) != 2:
+            raise ValueError("'release_year_range' must be a [first, last] pair")
+        release_year_range = tuple(_number({'year': year}, 'year') for year in release_year_range)
+    return {'movie_ids': movie_ids, 'star_rating': _number(payload, 'star_rating'), 'fame_level': fame_level,
+            'language_filter': language_filter, 'runtime_max': _number(payload, 'runtime_max'),
+            'release_year_range': release_year_range, 'genre_filters': genre_filters, 'limit': _limit(payload, 7)}
+
+
+def parse_explain_request(payload):
+    """Validate an /explain body; returns the id pairs and the weight profile name."""
+    pairs = payload.get('pairs') if isinstance(payload, dict) else None
+    if not isinstance(pairs, list) or not pairs or not all(
+            isinstance(pair, list) and len(pair) == 2 and all(isinstance(i, int) and not isinstance(i, bool) for i in pair)
+            for pair in pairs):
+        raise ValueError("'pairs' must be a non-empty list of [movie_id, candidate_id] integer pairs")
+    if len(pairs) > MAX_PAIRS:
+        raise ValueError(f"At most {MAX_PAIRS} pairs per request")
+    profile = payload.get('profile', 'details')
+    if profile not in WEIGHT_PROFILES:
+        raise ValueError(f"'profile' must be one of {list(WEIGHT_PROFILES)}")
+    return pairs, profile
+
+
+async def dispatch(pool, method, target, body):
+    """Route one request; returns (status, JSON-serializable payload)."""
+    loop = asyncio.get_running_loop()
+    path = urlsplit(target).path.rstrip('/')
+    routes = {'/health': 'GET', '/recommendations': 'POST', '/similar': 'POST', '/explain': 'POST'}
+    if path not in routes:
+        return 404, {'error': f"Unknown path {path}"}
+    if method != routes[path]:
+        return 405, {'error': f"{path} only accepts {routes[path]}"}
+    if path == '/health':
+        return 200, {'status': 'ok', 'movies': await loop.run_in_executor(pool, catalog_size_job)}
+
+    try:
+        payload = json.loads(body or b'{}')
+        if path == '/recommendations':
+            arguments = parse_recommendation_request(payload)
+            return 200, {'results': await loop.run_in_executor(pool, recommend_job, arguments)}
+        if path == '/explain':
+            return 200, {'results': await loop.run_in_executor(pool, explain_job, *parse_explain_request(payload))}
+        movie_id = payload.get('movie_id') if isinstance(payload, dict) else None
+        if not isinstance(movie_id, int) or isinstance(movie_id, bool):
+            raise ValueError("'movie_id' must be an integer")
+        results = await loop.run_in_executor(pool, similar_job, movie_id, _limit(payload, 5))
+    except ValueError as error:  # includes malformed JSON
+        return 400, {'error': str(error)}
+    if results is None:
+        return 404, {'error': f"Movie {movie_id} is not in the catalog"}
+    return 200, {'results': results}
+
+
+async def handle_connection(pool, reader, writer):
+    """Serve HTTP/1.1 requests on one connection, keeping it open between requests."""
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, target, version = request_line.decode('latin-1').split()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get('content-length', 0))
+            if length > MAX_BODY_BYTES:
+                status, payload = 413, {'error': f"Bodies are limited to {MAX_BODY_BYTES} bytes"}
+                keep_alive = False
+            else:
+                body = await reader.readexactly(length)
+                try:
+                    status, payload = await dispatch(pool, method, target, body)
+                except Exception as error:  # keep serving other requests
+                    status, payload = 500, {'error': repr(error)}
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+            data = json.dumps(payload).encode()
+            writer.write((f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                          f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                          f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode() + data)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass  # client went away or sent something that is not HTTP
+    finally:
+        writer.close()
+
+
+async def serve(host, port, workers, movies_path):
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(movies_path,))
+    loop = asyncio.get_running_loop()
+    # Start every worker now so the first requests do not pay for loading the catalog
+    await asyncio.gather(*(loop.run_in_executor(pool, catalog_size_job) for _ in range(workers)))
+    server = await asyncio.start_server(lambda reader, writer: handle_connection(pool, reader, writer), host, port)
+    print(f"Serving recommendations on http://{host}:{port} with {workers} workers", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless recommendation API (JSON over HTTP).")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8600)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--movies', default=DEFAULT_MOVIES_PATH)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, args.workers, args.movies))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+import os
+import sys
+import pytest
+
+# The app imports its packages from the movie_app directory (catalog, recommendations, ...)
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+from benchmarks.synthetic import generate_catalog
+
+
+@pytest.fixture(scope='session')
+def synthetic_tables():
+    """The (movies, people) Arrow tables of a small synthetic catalog, shared by every test."""
+    return generate_catalog(400, seed=3)
+
+
+@pytest.fixture
+def movies(synthetic_tables):
+    """A fresh movies frame per test, so structures cached per frame never leak between tests."""
+    return synthetic_tables[0].to_pandas()
@@ -0,0 +1,72 @@
+import json
+import os
+import subprocess
+import sys
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from catalog.lazy import load_movies
+from recommendations import cooccurrence
+from recommendations.batch import MANIFEST_NAME
+from recommendations.core import rank_recommendations
+from .conftest import APP_DIR
+
+# (star rating, fame level, language, max runtime, years, genres) of the recommendations tab
+FILTERS = (1, "Obscure", "", 300, (1915, 2025), [])
+
+
+@pytest.fixture
+def job(tmp_path, synthetic_tables):
+    """Paths of a catalog, a co-occurrence model built from listed watchlists and a watchlist file to score."""
+    movies_path = str(tmp_path / 'movies_details.parquet')
+    pq.write_table(synthetic_tables[0], movies_path)
+    ids = synthetic_tables[0].column('id').to_numpy()
+    rng = np.random.default_rng(11)
+    model_path = str(tmp_path / 'cooccurrence.npz')
+    cooccurrence.save_model(cooccurrence.build_model(
+        rng.choice(ids[:60], rng.integers(2, 8), replace=False).tolist() for _ in range(300)), model_path)
+    watchlists = [rng.choice(ids[:60], rng.integers(1, 5), replace=False).tolist() for _ in range(40)]
+    input_path = str(tmp_path / 'watchlists.parquet')
+    pd.DataFrame({'user_id': range(len(watchlists)), 'movie_ids': watchlists}).to_parquet(input_path)
+    return movies_path, model_path, input_path, watchlists
+
+
+def _run(job, output_dir, model_path=None):
+    """Run the batch job from the command line, as a scheduled job would, and read its parts in user order."""
+    movies_path, _, input_path, _ = job
+    star_rating, fame_level, language, runtime_max, (first, last), _ = FILTERS
+    env = dict(os.environ)
+    env.pop('MOVIEREX_COOCCURRENCE', None)
+    if model_path:
+        env['MOVIEREX_COOCCURRENCE'] = model_path
+    subprocess.run([sys.executable, '-m', 'recommendations.batch', input_path, output_dir, '--movies', movies_path,
+                    '--workers', '2', '--chunk-size', '15', '--star-rating', str(star_rating), '--fame-level', fame_level,
+                    '--language', language, '--runtime-max', str(runtime_max), '--years', str(first), str(last)],
+                   cwd=APP_DIR, env=env, check=True, capture_output=True)
+    return pd.read_parquet(output_dir).sort_values(['user_id', 'rank']).reset_index(drop=True)
+
+
+def _use_model(monkeypatch, model_path):
+    monkeypatch.setattr(cooccurrence, 'MODEL_PATH', model_path)
+    for name, value in {'model': None, 'pending': [], 'unsaved': [], 'source': None}.items():
+        monkeypatch.setitem(cooccurrence._state, name, value)
+
+
+def test_batch_scores_with_the_cooccurrence_signal(job, tmp_path, monkeypatch):
+    movies_path, model_path, _, watchlists = job
+    without = _run(job, str(tmp_path / 'without'))
+    result = _run(job, str(tmp_path / 'with'), model_path)
+    _use_model(monkeypatch, model_path)
+
+    df = load_movies(movies_path)
+    star_rating, fame_level, language, runtime_max, years, genres = FILTERS
+    for user, movie_ids in enumerate(watchlists):
+        positions, scores = rank_recommendations(movie_ids, star_rating, fame_level, df, language, runtime_max, years, genres)
+        rows = result[result['user_id'] == user]
+        np.testing.assert_array_equal(rows['movie_id'].to_numpy(), df['id'].to_numpy()[positions])
+        np.testing.assert_allclose(rows['score'].to_numpy(), scores, rtol=1e-12)
+    # The model changes the results, so the comparison above covers the signal
+    assert not without['score'].equals(result['score'])
+    with open(os.path.join(tmp_path, 'with', MANIFEST_NAME)) as file:
+        assert json.load(file)['cooccurrence'] == [os.path.abspath(model_path), cooccurrence.generation()]
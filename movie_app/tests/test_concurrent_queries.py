@@ -0,0 +1,75 @@
+import threading
+import numpy as np
+import pandas as pd
+from recommendations.core import get_recommendations_by_ids, rank_recommendations
+
+THREADS = 16
+
+# Filters of the recommendations tab: (star rating, fame level, language, max runtime, years, genres)
+FILTERS = [(1, "Very Famous", "", 300, (1915, 2025), []),
+           (3, "Famous", "en", 150, (1960, 2020), ["Drama"]),
+           (2, "Obscure", "", 120, (1990, 2025), ["Comedy", "Romance"])]
+
+
+def _queries(df, count):
+    rng = np.random.default_rng(5)
+    ids = df['id'].to_numpy()
+    return [(ids[rng.choice(len(ids), rng.integers(1, 6), replace=False)].tolist(), FILTERS[i % len(FILTERS)])
+            for i in range(count)]
+
+
+def _rank(df, query):
+    movie_ids, (star_rating, fame_level, language, runtime_max, years, genres) = query
+    return rank_recommendations(movie_ids, star_rating, fame_level, df, language, runtime_max, years, genres)
+
+
+def _run_threads(work):
+    """Run work(thread number) on THREADS threads released together; returns their results, re-raising any error."""
+    barrier = threading.Barrier(THREADS)
+    results, errors = [None] * THREADS, []
+
+    def run(number):
+        try:
+            barrier.wait()
+            results[number] = work(number)
+        except Exception as error:  # surfaced in the test thread below
+            errors.append(error)
+
+    threads = [threading.Thread(target=run, args=(number,)) for number in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return results
+
+
+def test_concurrent_rankings_match_serial_and_leave_the_frame_alone(movies):
+    before = movies.copy(deep=True)
+    queries = _queries(movies, THREADS * 4)
+    # Threads start on a cold frame, so the features and filter index are also built concurrently
+    results = _run_threads(lambda number: [_rank(movies, query) for query in queries[number::THREADS]])
+    serial = [_rank(movies, query) for query in queries]
+    for number, thread_results in enumerate(results):
+        for (positions, scores), (expected_positions, expected_scores) in zip(thread_results, serial[number::THREADS]):
+            np.testing.assert_array_equal(positions, expected_positions)
+            np.testing.assert_array_equal(scores, expected_scores)
+    assert list(movies.columns) == list(before.columns)
+    pd.testing.assert_series_equal(movies.dtypes, before.dtypes)
+    pd.testing.assert_frame_equal(movies, before)
+
+
+def test_concurrent_recommendation_frames_match_serial(movies):
+    before = movies.copy(deep=True)
+    queries = _queries(movies, THREADS)
+
+    def recommend(query):
+        movie_ids, (star_rating, fame_level, language, runtime_max, years, genres) = query
+        return get_recommendations_by_ids(movie_ids, star_rating, fame_level, movies, language, runtime_max, years, genres)
+
+    results = _run_threads(lambda number: recommend(queries[number]))
+    for result, query in zip(results, queries):
+        pd.testing.assert_frame_equal(result, recommend(query))
+    pd.testing.assert_series_equal(movies.dtypes, before.dtypes)
+    pd.testing.assert_frame_equal(movies, before)
@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+from recommendations import cooccurrence
+from .conftest import APP_DIR
+
+# Lists recorded by each process, and the movies each process lists
+LISTS = 40
+PROCESS_MOVIES = {0: [1, 2, 3], 1: [4, 5], 2: [1, 6]}
+
+RECORD = """
+import sys
+from recommendations import cooccurrence
+movie_ids = [int(value) for value in sys.argv[1:]]
+cooccurrence.current_model()
+for _ in range({lists}):
+    cooccurrence.record_watchlist(movie_ids)
+    cooccurrence.current_model()
+"""
+
+
+def _use_model(monkeypatch, path):
+    monkeypatch.setattr(cooccurrence, 'MODEL_PATH', path)
+    for name, value in {'model': None, 'pending': [], 'unsaved': [], 'source': None}.items():
+        monkeypatch.setitem(cooccurrence._state, name, value)
+
+
+def test_processes_recording_at_once_keep_each_others_counts(tmp_path):
+    path = str(tmp_path / 'cooccurrence.npz')
+    env = dict(os.environ, MOVIEREX_COOCCURRENCE=path)
+    # Every list folds and saves at once, so the processes keep writing over each other
+    script = "import recommendations.cooccurrence as c; c.FOLD_LISTS = 1; c.SAVE_SECONDS = 0\n" + RECORD.format(lists=LISTS)
+    processes = [subprocess.Popen([sys.executable, '-c', script] + [str(movie_id) for movie_id in movie_ids], cwd=APP_DIR, env=env)
+                 for movie_ids in PROCESS_MOVIES.values()]
+    assert all(process.wait() == 0 for process in processes)
+
+    model = cooccurrence.load_model(path)
+    assert model['lists'] == LISTS * len(PROCESS_MOVIES)
+    counts = model['counts']
+    assert counts[model['rows'][1], model['rows'][1]] == 2 * LISTS
+    assert counts[model['rows'][1], model['rows'][2]] == LISTS
+    assert counts[model['rows'][4], model['rows'][5]] == LISTS
+    assert counts[model['rows'][1], model['rows'][6]] == LISTS
+    assert not os.path.exists(f"{path}.lock")
+
+
+def test_lists_recorded_before_exit_are_saved(tmp_path):
+    path = str(tmp_path / 'cooccurrence.npz')
+    env = dict(os.environ, MOVIEREX_COOCCURRENCE=path)
+    subprocess.run([sys.executable, '-c', RECORD.format(lists=3), '7', '8'], cwd=APP_DIR, env=env, check=True)
+    model = cooccurrence.load_model(path)
+    assert model['lists'] == 3 and model['counts'][model['rows'][7], model['rows'][8]] == 3
+
+
+def test_model_saved_by_another_process_is_picked_up(tmp_path, monkeypatch):
+    path = str(tmp_path / 'cooccurrence.npz')
+    _use_model(monkeypatch, path)
+    monkeypatch.setattr(cooccurrence, 'FOLD_SECONDS', 0)
+    monkeypatch.setattr(cooccurrence, 'SAVE_SECONDS', 0)
+    cooccurrence.record_watchlist([1, 2])
+    before = cooccurrence.current_model()
+    assert before['lists'] == 1
+
+    env = dict(os.environ, MOVIEREX_COOCCURRENCE=path)
+    subprocess.run([sys.executable, '-c', RECORD.format(lists=2), '1', '3'], cwd=APP_DIR, env=env, check=True)
+    model = cooccurrence.current_model()
+    assert model['lists'] == 3
+    assert model['counts'][model['rows'][1], model['rows'][3]] == 2
+    assert model['generation'] > before['generation']
@@ -0,0 +1,54 @@
+import os
+import shutil
+import pandas as pd
+from catalog import lazy, provider
+from catalog.storage import compact_path, footprint_report, load_compact
+from catalog.updates import upsert
+
+
+def _write_sources(directory):
+    """The catalog file, freshly written, and an older file that will replace it with its mtime kept."""
+    path, older = os.path.join(directory, 'movies_details.parquet'), os.path.join(directory, 'older.parquet')
+    pd.DataFrame({'id': [1, 2], 'original_title': ["Old A", "Old B"]}).to_parquet(older)
+    os.utime(older, ns=(10 ** 18, 10 ** 18))
+    pd.DataFrame({'id': [1, 2, 3], 'original_title': ["New A", "New B", "New C"]}).to_parquet(path)
+    return path, older
+
+
+def test_arrow_copy_follows_a_source_replaced_by_an_older_file(tmp_path):
+    path, older = _write_sources(tmp_path)
+    assert provider._read(path, 'arrow', None)['original_title'].tolist() == ["New A", "New B", "New C"]
+    shutil.copy2(older, path)  # as cp -p, rsync -t or checking out an older revision do
+    assert provider._read(path, 'arrow', None)['original_title'].tolist() == ["Old A", "Old B"]
+
+
+def test_compact_file_follows_a_source_replaced_by_an_older_file(tmp_path):
+    path, older = _write_sources(tmp_path)
+    assert load_compact(path)['original_title'].tolist() == ["New A", "New B", "New C"]
+    shutil.copy2(older, path)
+    assert load_compact(path)['original_title'].tolist() == ["Old A", "Old B"]
+
+
+def test_compact_file_written_by_the_footprint_report_is_kept(tmp_path):
+    path, _ = _write_sources(tmp_path)
+    footprint_report(path)
+    written = os.stat(compact_path(path))
+    assert load_compact(path)['original_title'].tolist() == ["New A", "New B", "New C"]
+    assert (os.stat(compact_path(path)).st_ino, os.stat(compact_path(path)).st_mtime_ns) == (written.st_ino, written.st_mtime_ns)
+
+
+def test_details_file_follows_a_source_replaced_by_an_older_file(tmp_path):
+    path, older = _write_sources(tmp_path)
+    assert pd.read_parquet(lazy._details_file(path))['original_title'].tolist() == ["New A", "New B", "New C"]
+    shutil.copy2(older, path)
+    assert pd.read_parquet(lazy._details_file(path))['original_title'].tolist() == ["Old A", "Old B"]
+
+
+def test_details_file_refreshed_by_an_upsert_is_kept(tmp_path):
+    path, _ = _write_sources(tmp_path)
+    target = lazy._details_file(path)
+    upsert(path, pd.DataFrame({'id': [2, 4], 'original_title': ["Newer B", "New D"]}))
+    written = os.stat(target)
+    for _ in range(2):
+        assert pd.read_parquet(lazy._details_file(path))['original_title'].tolist() == ["New A", "Newer B", "New C", "New D"]
+        assert (os.stat(target).st_ino, os.stat(target).st_mtime_ns) == (written.st_ino, written.st_mtime_ns)
@@ -0,0 +1,96 @@
+import shutil
+import time
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from streamlit.testing.v1 import AppTest
+from benchmarks.images import poster_bytes, serve
+from catalog import images
+from .conftest import APP_DIR
+
+
+# Seconds a slow poster host takes per image, longer than a render may wait for it
+SLOW_LATENCY = 5
+
+
+@pytest.fixture
+def poster_server(request):
+    """The stand-in poster server; parametrize indirectly with its latency (fast by default)."""
+    latency = getattr(request, 'param', 0.02)
+    server, base = serve([poster_bytes(np.random.default_rng(0)) for _ in range(4)], latency=latency)
+    yield server, base
+    server.shutdown()
+
+
+@pytest.fixture
+def app_path(tmp_path, synthetic_tables, poster_server):
+    """The app script next to a synthetic catalog whose posters and portraits come from the stand-in server."""
+    _, base = poster_server
+    movies, people = synthetic_tables
+    movies = movies.set_column(movies.schema.get_field_index('poster_path'), 'poster_path',
+                               pa.array([f"{base}/w500/{index}.jpg" for index in range(len(movies))]))
+    people = people.set_column(people.schema.get_field_index('images'), 'images',
+                               pa.array([f"{base}/w185/p{index}.jpg" for index in range(len(people))]))
+    pq.write_table(movies, tmp_path / 'movies_details.parquet')
+    pq.write_table(people, tmp_path / 'people_details.parquet')
+    shutil.copy(f"{APP_DIR}/movie_streamlit.py", tmp_path)
+    return str(tmp_path / 'movie_streamlit.py'), movies
+
+
+def _image_urls(node):
+    """URLs of every image element under an AppTest tree node."""
+    if getattr(node, 'type', None) == 'image':
+        return [image.url for image in node.proto.imgs]
+    children = getattr(node, 'children', {})
+    return [url for child in children.values() for url in _image_urls(child)]
+
+
+def _labels(movies, positions):
+    titles, years = movies.column('original_title').to_pylist(), movies.column('release_year').to_pylist()
+    return [f"{titles[index]} ({years[index]})" for index in positions]
+
+
+def _render(path, labels):
+    at = AppTest.from_file(path, default_timeout=120)
+    at.query_params['movies'] = labels
+    at.run()
+    assert not at.exception
+    return _image_urls(at._tree)
+
+
+def test_second_render_serves_cached_thumbnails(app_path, poster_server, monkeypatch):
+    path, movies = app_path
+    server, base = poster_server
+    monkeypatch.setattr(images, 'DISK_PATH', None)
+    images.clear_image_cache()
+    labels = _labels(movies, (5, 9))
+
+    first = _render(path, labels)
+    downloads = len(server.requests)
+    assert first and downloads
+    # Served as thumbnail bytes through Streamlit's media store, not as links to the poster server
+    assert not [url for url in first if url.startswith(base)]
+
+    hits = images.image_stats()['hits']
+    second = _render(path, labels)
+    assert len(server.requests) == downloads
+    assert len(second) == len(first)
+    assert not [url for url in second if url.startswith(base)]
+    assert images.image_stats()['hits'] - hits >= len(second)
+
+
+@pytest.mark.parametrize('poster_server', [SLOW_LATENCY], indirect=True)
+def test_slow_poster_host_delays_a_render_by_at_most_the_wait(app_path, poster_server, monkeypatch):
+    path, movies = app_path
+    _, base = poster_server
+    monkeypatch.setattr(images, 'DISK_PATH', None)
+    images.clear_image_cache()
+
+    start = time.perf_counter()
+    urls = _render(path, _labels(movies, (5, 9)))
+    elapsed = time.perf_counter() - start
+    # One deadline for the whole grid, plus the rest of the render
+    assert elapsed < images.WAIT_SECONDS + 2 < SLOW_LATENCY
+    # The browser loads the posters the cache could not have in time
+    assert urls and all(url.startswith(base) for url in urls)
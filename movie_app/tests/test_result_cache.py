@@ -0,0 +1,43 @@
+import numpy as np
+import pyarrow.parquet as pq
+import pytest
+from catalog.lazy import load_movies
+from recommendations import result_cache
+from recommendations.core import rank_recommendations
+from recommendations.similarity_engine import SIGNALS, WEIGHT_PROFILES, scoring_fingerprint
+
+# (star rating, fame level, language, max runtime, years, genres) of the recommendations tab
+FILTERS = (1, "Very Famous", "", 300, (1915, 2025), [])
+
+
+@pytest.fixture
+def catalog(tmp_path, synthetic_tables, monkeypatch):
+    """A catalog served by load_dataset, so its results are cached, with the cache kept in a fresh SQLite file."""
+    path = str(tmp_path / 'movies_details.parquet')
+    pq.write_table(synthetic_tables[0], path)
+    monkeypatch.setattr(result_cache, 'DISK_PATH', str(tmp_path / 'results.sqlite'))
+    result_cache.clear_result_cache()
+    yield load_movies(path)
+    result_cache.clear_result_cache()
+
+
+def test_fingerprint_follows_weights_and_signals(monkeypatch):
+    before = {profile: scoring_fingerprint(profile) for profile in WEIGHT_PROFILES}
+    assert before['recommendations'] != before['details']
+    monkeypatch.setitem(WEIGHT_PROFILES['details']['weights'], 'genres', 0.5)
+    assert scoring_fingerprint('details') != before['details']
+    assert scoring_fingerprint('recommendations') == before['recommendations']
+    monkeypatch.setitem(SIGNALS, 'popularity', None)
+    assert scoring_fingerprint('recommendations') != before['recommendations']
+
+
+def test_results_cached_under_other_weights_are_not_served(catalog, monkeypatch):
+    movie_ids = catalog['id'].iloc[[3, 40, 77]].tolist()
+    cached = rank_recommendations(movie_ids, FILTERS[0], FILTERS[1], catalog, *FILTERS[2:])
+    monkeypatch.setitem(WEIGHT_PROFILES['recommendations']['weights'], 'genres', 0.9)
+    result_cache.clear_result_cache()  # only the SQLite store is left, as in a restarted process
+    positions, scores = rank_recommendations(movie_ids, FILTERS[0], FILTERS[1], catalog, *FILTERS[2:])
+    assert not np.array_equal(scores, cached[1])
+    fresh = rank_recommendations(movie_ids, FILTERS[0], FILTERS[1], catalog.copy(), *FILTERS[2:])
+    np.testing.assert_array_equal(positions, fresh[0])
+    np.testing.assert_allclose(scores, fresh[1])
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import pytest
+from recommendations.similarity_engine import EXCLUDED_SCORE, score_movies
+
+LIST_COLUMNS = ('genres', 'keywords', 'directors', 'cast', 'spoken_languages', 'recommendations', 'similar_movies')
+
+
+# The row-wise scoring the engine replaced, kept verbatim as the oracle
+def jaccard_similarity(list1, list2):
+    """Calculate Jaccard similarity between two lists."""
+    set1, set2 = set(list1), set(list2)
+    intersection = len(set1.intersection(set2))
+    union = len(set1.union(set2))
+    return intersection / union if union != 0 else 0
+
+
+def calculate_similarity(movie1, movie2):
+    """Calculate similarity score between two movies."""
+    if movie1['id'] == movie2['id'] or (pd.notna(movie1['belongs_to_id']) and pd.notna(movie2['belongs_to_id']) and movie1['belongs_to_id'] == movie2['belongs_to_id']):
+        return -1_000_000
+
+    genre_similarity = jaccard_similarity(movie1['genres'].split(', '), movie2['genres'].split(', '))
+    keyword_similarity = jaccard_similarity(movie1['keywords'].split(', '), movie2['keywords'].split(', '))
+    director_similarity = 1 if set(movie1['directors'].split(', ')) == set(movie2['directors'].split(', ')) else 0
+    cast_similarity = jaccard_similarity(movie1['cast'].split(', ')[:8], movie2['cast'].split(', ')[:8])
+    language_similarity = jaccard_similarity(movie1['spoken_languages'].split(', '), movie2['spoken_languages'].split(', '))
+
+    extra_points = 0
+    if movie2['original_title'] in movie1['recommendations']:
+        extra_points += 0.1
+    if movie2['original_title'] in movie1['similar_movies']:
+        extra_points += 0.1
+
+    similarity_score = (0.3 * genre_similarity +
+                        0.2 * keyword_similarity +
+                        0.2 * director_similarity +
+                        0.1 * cast_similarity +
+                        0.1 * language_similarity +
+                        extra_points)
+
+    return similarity_score
+
+
+@pytest.fixture
+def sample(movies):
+    """The synthetic catalog retitled so no title occurs inside another one or names two movies.
+
+    The oracle's substring test and the engine's exact list entries then agree on the title bonus.
+    """
+    rng = np.random.default_rng(11)
+    titles = [f"Movie {index:05d}" for index in range(len(movies))]
+    movies['original_title'] = titles
+    for column in ('recommendations', 'similar_movies'):
+        lists = [', '.join(titles[pick] for pick in rng.choice(len(titles), rng.integers(0, 8), replace=False))
+                 for _ in range(len(movies))]
+        movies[column] = [value or None for value in lists]
+    return movies
+
+
+def oracle_scores(df, movie_ids):
+    """The old tab's sum over the seeds of calculate_similarity(seed, movie), for every row of df."""
+    rows = df.assign(**{column: df[column].fillna('') for column in LIST_COLUMNS})
+    seeds = rows[rows['id'].isin(movie_ids)]
+    return np.array([sum(calculate_similarity(seed, movie) for _, seed in seeds.iterrows()) for _, movie in rows.iterrows()])
+
+
+@pytest.mark.parametrize('seed_count', [1, 3, 5])
+def test_scores_match_row_wise_oracle(sample, seed_count):
+    rng = np.random.default_rng(seed_count)
+    movie_ids = sample['id'].to_numpy()[rng.choice(len(sample), seed_count, replace=False)].tolist()
+    expected = oracle_scores(sample, movie_ids)
+    scores = score_movies(sample, movie_ids)
+    np.testing.assert_allclose(scores, expected, rtol=0, atol=1e-9)
+    # The same number of -1,000,000 penalties per row: each seed excludes itself and its collection
+    penalties = np.round(expected / EXCLUDED_SCORE)
+    assert penalties.sum() >= seed_count
+    np.testing.assert_array_equal(np.round(scores / EXCLUDED_SCORE), penalties)
+
+
+def test_single_seed_penalty_is_exact(sample):
+    in_collection = sample['belongs_to_id'].notna().to_numpy()
+    seed = int(sample['id'][np.flatnonzero(in_collection)[0]])
+    scores = score_movies(sample, [seed])
+    expected = oracle_scores(sample, [seed])
+    excluded = expected == -1_000_000
+    assert excluded.sum() >= 2  # the seed and at least one other member of its collection
+    assert (scores[excluded] == -1_000_000).all()
+    np.testing.assert_allclose(scores[~excluded], expected[~excluded], rtol=0, atol=1e-9)
+
+
+def test_row_subset_matches_oracle(sample):
+    movie_ids = sample['id'].head(2).tolist()
+    rows = np.arange(0, len(sample), 7)
+    np.testing.assert_allclose(score_movies(sample, movie_ids, rows), oracle_scores(sample, movie_ids)[rows], rtol=0, atol=1e-9)
@@ -0,0 +1,40 @@
+import numpy as np
+import pyarrow.parquet as pq
+import pytest
+from catalog.lazy import load_movies
+from recommendations.similarity_engine import get_features, seed_scores
+from service import server
+
+
+@pytest.fixture
+def catalog(tmp_path, synthetic_tables, monkeypatch):
+    """The synthetic catalog written where the service workers load it from."""
+    path = str(tmp_path / 'movies_details.parquet')
+    pq.write_table(synthetic_tables[0], path)
+    monkeypatch.setattr(server, '_movies_path', path)
+    return load_movies(path)
+
+
+def _expected(df, position, limit):
+    scores = seed_scores(get_features(df), [position], profile='details')[:, 0]
+    scores[position] = -np.inf
+    order = np.lexsort((np.arange(len(scores)), -scores))
+    return df['id'].to_numpy()[order[:limit]].tolist()
+
+
+def test_similar_ranks_the_requested_movie(catalog):
+    titles = catalog['original_title'].str.lower().tolist()
+    # Movies whose title also appears inside an earlier movie's title, which a title lookup would rank instead
+    shadowed = [j for j in range(len(titles)) if any(titles[j] in titles[i] for i in range(j))][:5]
+    assert shadowed
+    for position in shadowed:
+        movie_id = int(catalog['id'].iloc[position])
+        results = [result['id'] for result in server.similar_job(movie_id, 5)]
+        assert movie_id not in results
+        assert results == _expected(catalog, position, 5)
+
+
+def test_similar_returns_the_requested_number_of_movies(catalog):
+    movie_id = int(catalog['id'].iloc[0])
+    assert len(server.similar_job(movie_id, server.MAX_LIMIT)) == server.MAX_LIMIT
+    assert server.similar_job(-1, 5) is None
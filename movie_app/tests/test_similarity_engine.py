@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import pytest
+from recommendations.similarity_engine import EXCLUDED_SCORE, get_features, movie_similarity, pair_breakdowns, seed_scores
+
+ALIEN, ALIENS, BLADE_RUNNER, THE_THING, PREDATOR = range(5)
+
+# Expected scores of every movie against Alien, worked out by hand from the weights:
+# recommendations 0.3 genres, 0.2 keywords, 0.2 directors, 0.1 cast, 0.1 languages;
+# details 0.4 genres, 0.3 keywords, 0.2 directors, 0.1 cast; 0.1 per Alien list naming the movie
+AGAINST_ALIEN = {
+    'recommendations': [EXCLUDED_SCORE,   # Alien itself
+                        EXCLUDED_SCORE,   # Aliens, same collection
+                        0.3 / 3 + 0.2 + 0.1 + 0.1,   # Blade Runner: 1/3 genres, same director and language, recommended
+                        0.3 * 2 / 3 + 0.2 / 3 + 0.1 / 2 + 0.1,   # The Thing: 2/3 genres, 1/3 keywords, 1/2 languages, similar
+                        0.3 / 3 + 0.1],   # Predator: 1/3 genres, same language, missing keywords share nothing
+    'details': [0, 0,
+                0.4 / 3 + 0.2 + 0.1,
+                0.4 * 2 / 3 + 0.3 / 3 + 0.1,
+                0.4 / 3],
+}
+
+# Blade Runner against The Thing: 1/4 genres, 1/2 languages, no list naming it
+BLADE_RUNNER_THE_THING = {'recommendations': 0.3 / 4 + 0.1 / 2, 'details': 0.4 / 4}
+
+
+@pytest.fixture
+def catalog():
+    return pd.DataFrame({
+        'id': [10, 11, 12, 13, 14],
+        'original_title': ["Alien", "Aliens", "Blade Runner", "The Thing", "Predator"],
+        'release_year': [1979, 1986, 1982, 1982, 1987],
+        'genres': ["Horror, Science Fiction", "Action, Horror, Science Fiction", "Science Fiction, Drama",
+                   "Horror, Mystery, Science Fiction", "Action, Science Fiction"],
+        'keywords': ["space, monster", "space, monster, marines", "android, future", "monster, antarctica", None],
+        'cast': ["Sigourney Weaver, Tom Skerritt", "Sigourney Weaver, Michael Biehn", "Harrison Ford, Sean Young",
+                 "Kurt Russell", "Arnold Schwarzenegger"],
+        'directors': ["Ridley Scott", "James Cameron", "Ridley Scott", "John Carpenter", "John McTiernan"],
+        'spoken_languages': ["English", "English, Spanish", "English", "English, Norwegian", "English"],
+        'recommendations': ["Aliens, Blade Runner", "Alien", "Alien", None, "Aliens"],
+        'similar_movies': ["The Thing", "Predator", "Alien", "Alien, Aliens", None],
+        'belongs_to_id': [100.0, 100.0, np.nan, np.nan, np.nan],
+        'vote_average': [8.1, 7.9, 7.9, 8.0, 7.5],
+        'vote_count': [9000, 8000, 12000, 6000, 7000],
+        'runtime': [117, 137, 117, 109, 107],
+    })
+
+
+@pytest.mark.parametrize('profile', ['recommendations', 'details'])
+def test_seed_scores_against_one_seed(catalog, profile):
+    scores = seed_scores(get_features(catalog), [ALIEN], profile=profile)
+    assert scores.shape == (5, 1)
+    np.testing.assert_allclose(scores[:, 0], AGAINST_ALIEN[profile], rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize('profile', ['recommendations', 'details'])
+def test_seed_scores_keep_one_column_per_seed(catalog, profile):
+    scores = seed_scores(get_features(catalog), [ALIEN, BLADE_RUNNER], rows=np.array([THE_THING, BLADE_RUNNER]), profile=profile)
+    assert scores[0, 0] == pytest.approx(AGAINST_ALIEN[profile][THE_THING], abs=1e-12)
+    assert scores[0, 1] == pytest.approx(BLADE_RUNNER_THE_THING[profile], abs=1e-12)
+    # A seed scored against itself is excluded: -1,000,000 for recommendations, 0 on the detail page
+    assert scores[1, 1] == (EXCLUDED_SCORE if profile == 'recommendations' else 0)
+
+
+@pytest.mark.parametrize('profile', ['recommendations', 'details'])
+def test_movie_similarity_matches_pinned_scores(catalog, profile):
+    alien = catalog.iloc[ALIEN]
+    for position, expected in enumerate(AGAINST_ALIEN[profile]):
+        assert movie_similarity(alien, catalog.iloc[position], profile) == pytest.approx(expected, abs=1e-12)
+    assert movie_similarity(catalog.iloc[BLADE_RUNNER], catalog.iloc[THE_THING], profile) == \
+        pytest.approx(BLADE_RUNNER_THE_THING[profile], abs=1e-12)
+
+
+@pytest.mark.parametrize('profile', ['recommendations', 'details'])
+def test_pair_breakdowns_match_pinned_scores(catalog, profile):
+    candidates = np.arange(5)
+    breakdown = pair_breakdowns(get_features(catalog), np.full(5, ALIEN), candidates, profile)
+    np.testing.assert_allclose(breakdown['scores'], AGAINST_ALIEN[profile], rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(breakdown['excluded'], [True, True, False, False, False])
+    np.testing.assert_allclose(breakdown['title_bonus'], [0, 0.1, 0.1, 0.1, 0])  # the bonus still shows on excluded Aliens
+    np.testing.assert_array_equal(breakdown['mentions']['recommendations'], [False, True, True, False, False])
+    np.testing.assert_array_equal(breakdown['mentions']['similar_movies'], [False, False, False, True, False])
+
+
+def test_pair_breakdown_contributions(catalog):
+    breakdown = pair_breakdowns(get_features(catalog), [ALIEN], [BLADE_RUNNER], 'recommendations')
+    contributions = {name: float(values[0]) for name, values in breakdown['contributions'].items()}
+    assert contributions == pytest.approx({'genres': 0.1, 'keywords': 0, 'directors': 0.2, 'cast': 0, 'spoken_languages': 0.1})
+    details = pair_breakdowns(get_features(catalog), [ALIEN], [BLADE_RUNNER], 'details')
+    assert set(details['contributions']) == {'genres', 'keywords', 'directors', 'cast'}
+
+
+def test_title_bonus_counts_each_list(catalog):
+    # The Thing names Alien in similar_movies only; Blade Runner names it in both lists
+    features = get_features(catalog)
+    scores = seed_scores(features, [THE_THING, BLADE_RUNNER], rows=np.array([ALIEN]), profile='details')
+    breakdown = pair_breakdowns(features, [THE_THING, BLADE_RUNNER], [ALIEN, ALIEN], 'details')
+    np.testing.assert_allclose(breakdown['title_bonus'], [0.1, 0.2])
+    np.testing.assert_allclose(scores[0], breakdown['scores'], rtol=0, atol=1e-12)
@@ -0,0 +1,99 @@
+import difflib
+import numpy as np
+import pytest
+from catalog.lookup import recommendation_options
+from recommendations.title_matcher import CUTOFF, build_title_matcher, get_title_matcher, match_title, match_titles
+
+# Keys whose ratios to some queries tie; get_close_matches then returns the larger string
+TIED_KEYS = ["Star (1997)", "Star (1998)", "Stars (1998)", "Heat (1995)", "Heat (1986)", "Up (2009)", "Us (2019)",
+             "Alien (1979)", "Aliens (1986)", "It (2017)", "It (1990)", "Dune (1984)", "Dune (2001)", "Dune (2002)"]
+TIED_QUERIES = ["Star (1999)", "Star", "star", "Heat (1990)", "Heat", "Uz (2010)", "Alien (1986)", "Aliens",
+                "It (2000)", "It", "DUNE", "Dune (2000)", "Dune (1984)"]
+
+
+def title_corpus(movies, seed=0):
+    """(option keys, query lines) built from the synthetic catalog; the same seed always gives the same corpus.
+
+    Keys are "Title (Year)" labels as the recommendations tab lists them. Queries mix exact keys,
+    year-suffixed keys with another year, bare titles, casefold-only and whitespace variants,
+    typos and lines matching nothing.
+    """
+    rng = np.random.default_rng(seed)
+    keys = sorted({f"{title} ({year})" for title, year in zip(movies['original_title'], movies['release_year'])}) + TIED_KEYS
+    picks = [keys[i] for i in rng.integers(0, len(keys), 400)]
+    queries = list(TIED_QUERIES)
+    for i, key in enumerate(picks):
+        title, year = key.rsplit(' (', 1)
+        kind = i % 8
+        if kind == 0:
+            queries.append(key)
+        elif kind == 1:
+            queries.append(f"{title} ({int(year[:4]) + int(rng.integers(1, 5))})")
+        elif kind == 2:
+            queries.append(title)
+        elif kind == 3:
+            queries.append(key.upper() if i % 16 == 3 else key.casefold())
+        elif kind == 4:
+            queries.append(f"  {title}   ({year} ")
+        elif kind == 5:
+            position = int(rng.integers(0, len(key)))
+            queries.append(key[:position] + key[position + 1:])
+        elif kind == 6:
+            position = int(rng.integers(0, len(key)))
+            queries.append(key[:position] + 'x' + key[position:])
+        else:
+            queries.append(f"zz{rng.integers(1 << 20)} qq")
+    return keys, queries
+
+
+@pytest.fixture
+def corpus(movies):
+    return title_corpus(movies)
+
+
+def _difflib(keys, query):
+    matches = difflib.get_close_matches(query, keys, n=1, cutoff=CUTOFF)
+    return matches[0] if matches else None
+
+
+def test_matches_difflib_on_corpus(corpus):
+    keys, queries = corpus
+    matcher = build_title_matcher(keys)
+    mismatches = [(query, match_title(matcher, query), _difflib(keys, query)) for query in queries
+                  if match_title(matcher, query) != _difflib(keys, query)]
+    assert mismatches == []
+    # The corpus exercises both outcomes
+    results = [match_title(matcher, query) for query in queries]
+    assert sum(result is None for result in results) > 20
+    assert sum(result is not None for result in results) > 200
+
+
+@pytest.mark.parametrize('query, tied, larger', [("Star (1999)", "Star (1997)", "Star (1998)"),
+                                                  ("Uz (2010)", "Up (2009)", "Us (2019)"),
+                                                  ("Dune (2000)", "Dune (2001)", "Dune (2002)")])
+def test_ties_go_to_the_larger_key(corpus, query, tied, larger):
+    keys, _ = corpus
+    assert difflib.SequenceMatcher(None, query, tied).ratio() == difflib.SequenceMatcher(None, query, larger).ratio()
+    assert match_title(build_title_matcher(keys), query) == _difflib(keys, query) == larger
+
+
+def test_casefold_only_differences_follow_difflib(corpus):
+    keys, _ = corpus
+    matcher = build_title_matcher(keys)
+    for key in keys[::25]:
+        for query in (key.upper(), key.casefold(), key.swapcase()):
+            assert match_title(matcher, query) == _difflib(keys, query)
+
+
+def test_batch_matches_single_lookups(corpus):
+    keys, queries = corpus
+    matcher = build_title_matcher(keys)
+    lines = queries + queries[:50]
+    assert match_titles(matcher, lines) == [match_title(matcher, line) for line in lines]
+
+
+def test_matcher_is_built_once_per_catalog_frame(movies):
+    matcher = get_title_matcher(movies)
+    assert matcher['keys'] == list(recommendation_options(movies)['movie_options'])
+    assert get_title_matcher(movies) is matcher
+    assert get_title_matcher(movies.copy()) is not matcher